@@ -37,6 +37,9 @@ def create_app(config_name='default'):
     app = Flask(__name__)
     app.config.from_object(config[config_name])
     
+    # Real client IP / scheme when running behind a proxy
+    _apply_proxy_fix(app)
+    
     # Wire up extensions
     _init_extensions(app)
     
@@ -55,11 +58,6 @@ def create_app(config_name='default'):
     # Ensure upload directories exist
     _ensure_upload_dirs(app)
 
-    # Health check endpoint for load balancers / k8s probes
-    @app.route('/health')
-    def health_check():
-        return {'status': 'healthy', 'service': 'gocial-api', 'version': '1.0.0'}
-    
     @app.route('/')
     def index():
         return {'message': 'Welcome to Gocial API', 'docs': '/api/docs'}
@@ -67,13 +65,74 @@ def create_app(config_name='default'):
     return app
 
 
+def _apply_proxy_fix(app):
+    """
+    Trust X-Forwarded-For/-Proto from PROXY_FIX_HOPS proxies.
+
+    Without it every request seems to come from the load balancer, and
+    per-IP rate limits lump all anonymous clients together.
+    """
+    hops = app.config.get('PROXY_FIX_HOPS', 0)
+    if hops:
+        from werkzeug.middleware.proxy_fix import ProxyFix
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=hops, x_proto=hops)
+
+
 def _init_extensions(app):
     """Bind Flask extensions to the app instance."""
+    # Pool sizing, pre-ping, statement timeout... from the DB_* settings
+    from app.utils.database import configure_engine
+    configure_engine(app)
+    
     db.init_app(app)
     migrate.init_app(app, db)
     jwt.init_app(app)
     mail.init_app(app)
     
+    # GET requests read from REPLICA_DATABASE_URL (read-your-writes aware)
+    from app.utils.replicas import replica_router
+    replica_router.init_app(app)
+    
+    # Prometheus metrics on /metrics (if prometheus_client is installed)
+    from app.utils.metrics import metrics
+    metrics.init_app(app)
+    
+    # Per-request query count / DB time / N+1 detection (QUERY_PROFILING)
+    from app.utils.profiling import query_profiler
+    query_profiler.init_app(app)
+    
+    # Buffered activity view counter (flushed in the background)
+    from app.utils.view_counter import view_counter
+    view_counter.init_app(app)
+    
+    # Precomputed trending scores (refreshed in the background)
+    from app.utils.trending import trending_ranker
+    trending_ranker.init_app(app)
+    
+    # Write-behind last_seen / last_login + "online now"
+    from app.utils.presence import presence
+    presence.init_app(app)
+    
+    # Where uploads live (local folder or S3-compatible bucket)
+    from app.utils.storage import init_storage
+    init_storage(app)
+    
+    # Avatar / activity image variants (rendered in a thread pool)
+    from app.utils.images import image_pipeline
+    image_pipeline.init_app(app)
+    
+    # Current user loader + JWT flag claims
+    from app.utils.auth import init_auth
+    init_auth(app)
+    
+    # Readiness checks (DB, pool, storage, Redis) + draining on SIGTERM
+    from app.utils.health import health_checker
+    health_checker.init_app(app)
+    
+    # Rate limiting (RATELIMIT_DEFAULT on everything + per-route limits)
+    from app.utils.ratelimit import limiter
+    limiter.init_app(app)
+    
     # CORS setup - allow mobile app & web to hit our API
     raw_origins = app.config.get('CORS_ORIGINS', '*')
     if isinstance(raw_origins, str) and ',' in raw_origins:
@@ -91,6 +150,10 @@ def _init_extensions(app):
     def invalid_token_callback(error):
         return jsonify({'error': 'Token invalide', 'code': 'invalid_token'}), 401
 
+    @jwt.revoked_token_loader
+    def revoked_token_callback(jwt_header, jwt_payload):
+        return jsonify({'error': 'Session expirée, veuillez vous reconnecter', 'code': 'token_revoked'}), 401
+
     @jwt.unauthorized_loader
     def missing_token_callback(error):
         return jsonify({'error': 'Authentification requise', 'code': 'auth_required'}), 401
@@ -107,6 +170,9 @@ def _register_blueprints(app):
     from app.routes.friends import friends_bp
     from app.routes.messages import messages_bp
     from app.routes.notifications import notifications_bp
+    from app.routes.uploads import uploads_bp
+    from app.routes.media import media_bp
+    from app.routes.health import health_bp
     
     # All routes prefixed with /api for clarity
     blueprints = [
@@ -116,6 +182,11 @@ def _register_blueprints(app):
         (friends_bp, '/api/friends'),
         (messages_bp, '/api/messages'),
         (notifications_bp, '/api/notifications'),
+        (uploads_bp, '/api/uploads'),
+        # Uploaded files themselves (cache headers, nginx offload)
+        (media_bp, '/uploads'),
+        # Liveness / readiness probes for load balancers & k8s
+        (health_bp, '/health'),
     ]
     
     for blueprint, prefix in blueprints:
@@ -139,10 +210,19 @@ def _register_error_handlers(app):
     def method_not_allowed(e):
         return jsonify({'error': 'Méthode non autorisée'}), 405
 
+    # Password hashing pool is full (login storm) - tell the client to retry
+    from app.utils.passwords import PasswordHasherBusy
+
+    @app.errorhandler(PasswordHasherBusy)
+    def hasher_busy(e):
+        return jsonify({'error': 'Serveur surchargé, réessayez dans un instant'}), 503, {'Retry-After': '1'}
+
 
 def _ensure_upload_dirs(app):
-    """Create upload directories if they don't exist."""
+    """Create upload directories if they don't exist (local storage only)."""
     import os
+    if app.extensions['storage'].name != 'local':
+        return
     upload_folder = app.config.get('UPLOAD_FOLDER', 'uploads')
     for subfolder in ('avatars', 'activities'):
         os.makedirs(os.path.join(upload_folder, subfolder), exist_ok=True)
@@ -160,7 +240,7 @@ def _register_shell_context(app):
     
     Just run 'flask shell' and you can query the DB directly.
     """
-    from app.models import User, Role, Activity, Participation, Friendship, Message, Notification, Evaluation
+    from app.models import User, Role, Activity, Participation, Friendship, Message, Notification, Evaluation, UserRecommendation
     
     @app.shell_context_processor
     def make_shell_context():
@@ -174,4 +254,5 @@ def _register_shell_context(app):
             'Message': Message,
             'Notification': Notification,
             'Evaluation': Evaluation,
+            'UserRecommendation': UserRecommendation,
         }
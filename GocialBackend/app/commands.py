@@ -268,6 +268,309 @@ def create_admin(email, password):
     click.echo(f'✓ Admin user created: {email}')
 
 
+# ---------------------------------------------------------------------
+# Trending scores
+# ---------------------------------------------------------------------
+
+@click.command('refresh-trending')
+@with_appcontext
+def refresh_trending():
+    """
+    Recompute trending scores for every upcoming activity.
+    
+    The API workers already do this in the background; run it from cron
+    (or by hand) after bulk imports or when tweaking the weights.
+    """
+    from app.utils.trending import trending_ranker
+    
+    updated = trending_ranker.refresh_all()
+    click.echo(f'✓ Refreshed {updated} trending scores')
+
+
+# ---------------------------------------------------------------------
+# Recommendations
+# ---------------------------------------------------------------------
+
+@click.command('build-recommendations')
+@click.option('--top-n', default=50, help='Activities kept per user')
+@click.option('--batch-size', default=500, help='Users processed per batch')
+@with_appcontext
+def build_recommendations(top_n, batch_size):
+    """
+    Precompute "for you" activities for every active user.
+    
+    Meant for a nightly cron. Each batch commits on its own, so a crash
+    halfway just leaves the rest with yesterday's lists.
+    
+    Usage:
+        flask build-recommendations
+        flask build-recommendations --top-n 100 --batch-size 1000
+    """
+    from app.utils.recommendations import build_activity_recommendations
+    
+    processed = build_activity_recommendations(
+        top_n=top_n,
+        batch_size=batch_size,
+        progress=lambda n: click.echo(f'  ... {n} users'),
+    )
+    click.echo(f'✓ Built recommendations for {processed} users')
+
+
+@click.command('build-friend-suggestions')
+@click.option('--top-k', default=20, help='Suggestions kept per user')
+@click.option('--batch-size', default=500, help='Users processed per batch')
+@click.option('--incremental', is_flag=True, help='Only users whose friendships changed')
+@with_appcontext
+def build_friend_suggestions(top_k, batch_size, incremental):
+    """
+    Precompute "people you may know" for active users.
+    
+    Full run nightly, --incremental every few minutes to pick up
+    users whose friendships changed since.
+    
+    Usage:
+        flask build-friend-suggestions
+        flask build-friend-suggestions --incremental
+    """
+    from app.utils.friend_graph import build_friend_suggestions as build
+    
+    processed = build(
+        top_k=top_k,
+        batch_size=batch_size,
+        incremental=incremental,
+        progress=lambda n: click.echo(f'  ... {n} users'),
+    )
+    click.echo(f'✓ Built friend suggestions for {processed} users')
+
+
+# ---------------------------------------------------------------------
+# Uploads cleanup
+# ---------------------------------------------------------------------
+
+@click.command('gc-uploads')
+@click.option('--dry-run', is_flag=True, help='Only report what would be deleted')
+@click.option('--grace-hours', default=24, help='Never delete files younger than this')
+@click.option('--batch-size', default=5000, help='DB rows fetched per round trip')
+@with_appcontext
+def gc_uploads(dry_run, grace_hours, batch_size):
+    """
+    Delete uploaded files nothing points to any more.
+    
+    Old avatars / activity images, abandoned direct uploads, expired
+    resumable sessions. Meant for a daily cron.
+    
+    Usage:
+        flask gc-uploads --dry-run
+        flask gc-uploads --grace-hours 48
+    """
+    from app.utils.upload_gc import collect_garbage
+    
+    def report(stats):
+        click.echo(f'  ... {stats.scanned} files scanned, {stats.deleted} unreferenced')
+    
+    stats = collect_garbage(
+        grace_hours=grace_hours,
+        dry_run=dry_run,
+        batch_size=batch_size,
+        progress=report,
+    )
+    
+    verb = 'Would delete' if dry_run else 'Deleted'
+    click.echo(
+        f'✓ {verb} {stats.deleted} of {stats.scanned} files '
+        f'({stats.freed_bytes / (1024 * 1024):.1f} MB), kept {stats.kept}'
+    )
+
+
+# ---------------------------------------------------------------------
+# Index advisor
+# ---------------------------------------------------------------------
+
+@click.command('db-index-advisor')
+@click.option('--analyze', is_flag=True, help='EXPLAIN ANALYZE (PostgreSQL) - runs the queries')
+@click.option('--only', default=None, help='Only shapes whose name contains this')
+@click.option('--strict', is_flag=True, help='Exit with status 1 if a shape scans a whole table')
+@click.option('-v', '--verbose', is_flag=True, help='Print every plan, not just the full scans')
+@with_appcontext
+def db_index_advisor(analyze, only, strict, verbose):
+    """
+    Show query plans for the API's hot queries, flag full table scans.
+    
+    Run it after schema changes (or in CI with --strict) to check the
+    indexes still cover the queries. See app/utils/index_advisor.py.
+    
+    Usage:
+        flask db-index-advisor -v
+        flask db-index-advisor --only messages --analyze
+        flask db-index-advisor --strict
+    """
+    from app.utils.index_advisor import advise
+    
+    reports = advise(analyze=analyze, only=only)
+    scanning = [r for r in reports if r.full_scans]
+    
+    for report in reports:
+        if report.full_scans:
+            click.echo(f"✗ {report.name}: full scan of {', '.join(report.full_scans)}")
+        else:
+            click.echo(f'✓ {report.name}')
+        if verbose or report.full_scans:
+            for line in report.plan:
+                click.echo(f'    {line}')
+    
+    click.echo(f'{len(reports) - len(scanning)}/{len(reports)} query shapes use an index')
+    if strict and scanning:
+        sys.exit(1)
+
+
+# ---------------------------------------------------------------------
+# Partitions
+# ---------------------------------------------------------------------
+
+@click.command('db-partitions')
+@click.option('--months-ahead', default=None, type=int, help='Future months to create (default: PARTITION_MONTHS_AHEAD)')
+@click.option('--retention-months', default=None, type=int,
+              help='Notifications kept, 0 = forever (default: NOTIFICATION_RETENTION_MONTHS)')
+@click.option('--archive/--drop', default=None, help='Detach old notification partitions instead of dropping them')
+@with_appcontext
+def db_partitions(months_ahead, retention_months, archive):
+    """
+    Create upcoming monthly partitions, apply the notification retention.
+    
+    Messages and notifications are partitioned by month on PostgreSQL.
+    Meant for a daily cron (and runs on release). Elsewhere it only
+    deletes expired notifications.
+    
+    Usage:
+        flask db-partitions
+        flask db-partitions --retention-months 12 --archive
+    """
+    from app.utils.partitions import maintain_partitions
+    
+    summary = maintain_partitions(months_ahead, retention_months, archive)
+    
+    for table, result in summary.items():
+        created = ', '.join(result['created']) or 'none'
+        click.echo(f'✓ {table}: created {created}')
+        if result['removed'] or result['deleted']:
+            removed = ', '.join(result['removed']) or 'none'
+            click.echo(f"  removed partitions: {removed}, deleted {result['deleted']} old rows")
+
+
+# ---------------------------------------------------------------------
+# Activity archive
+# ---------------------------------------------------------------------
+
+@click.command('archive-activities')
+@click.option('--months', default=None, type=int, help='Archive activities ended this long ago (default: ARCHIVE_AFTER_MONTHS)')
+@click.option('--batch-size', default=None, type=int, help='Activities per transaction (default: ARCHIVE_BATCH_SIZE)')
+@click.option('--dry-run', is_flag=True, help='Only count what would be archived')
+@with_appcontext
+def archive_activities(months, batch_size, dry_run):
+    """
+    Move finished activities to cold storage.
+    
+    Participations, likes and evaluations go with them; ratings and
+    GET /api/activities/<id> keep working. Meant for a nightly cron -
+    safe to interrupt, the next run picks up where this one stopped.
+    
+    Usage:
+        flask archive-activities --dry-run
+        flask archive-activities --months 12
+    """
+    from app.utils.archive import archive_activities as archive
+    
+    def report(stats):
+        click.echo(f'  ... {stats.activities} activities')
+    
+    stats = archive(months=months, batch_size=batch_size, dry_run=dry_run, progress=report)
+    
+    verb = 'Would archive' if dry_run else 'Archived'
+    click.echo(
+        f'✓ {verb} {stats.activities} activities '
+        f'({stats.participations} participations, {stats.likes} likes, {stats.evaluations} evaluations)'
+    )
+
+
+# ---------------------------------------------------------------------
+# Rating aggregates
+# ---------------------------------------------------------------------
+
+@click.command('reconcile-ratings')
+@click.option('--batch-size', default=1000, help='Users processed per transaction')
+@with_appcontext
+def reconcile_ratings(batch_size):
+    """
+    Recompute every user's rating aggregate from the evaluations.
+    
+    Aggregates are kept up to date as evaluations come in - this fixes
+    any drift. Cheap enough for a weekly cron.
+    
+    Usage:
+        flask reconcile-ratings
+    """
+    from app.utils.ratings import reconcile_ratings as reconcile
+    
+    stats = reconcile(
+        batch_size=batch_size,
+        progress=lambda s: click.echo(f'  ... {s.users} users'),
+    )
+    click.echo(f'✓ Checked {stats.users} users: {stats.fixed} aggregates fixed, {stats.removed} removed')
+
+
+# ---------------------------------------------------------------------
+# Password hashing benchmark
+# ---------------------------------------------------------------------
+
+@click.command('bench-passwords')
+@click.option('--method', default=None, help='Werkzeug hash method (default: PASSWORD_HASH_METHOD)')
+@click.option('--seconds', default=5.0, help='Duration of each run')
+@click.option('--workers', default=0, help='Also measure a process pool of this size')
+@with_appcontext
+def bench_passwords(method, seconds, workers):
+    """
+    Measure password verifications (= logins) per second.
+    
+    Use it to pick PASSWORD_HASH_METHOD: aim for something that stays
+    around 50-100ms per hash on the production CPUs.
+    
+    Usage:
+        flask bench-passwords
+        flask bench-passwords --method pbkdf2:sha256:600000 --workers 4
+    """
+    import time
+    from concurrent.futures import ProcessPoolExecutor
+    from werkzeug.security import check_password_hash, generate_password_hash
+    from app.utils.passwords import password_hasher
+    
+    method = method or current_app.config.get('PASSWORD_HASH_METHOD')
+    stored = generate_password_hash('Bench123!', method, password_hasher.salt_length)
+    click.echo(f'Method: {password_hasher.canonical_method(method)}')
+    
+    done = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        check_password_hash(stored, 'Bench123!')
+        done += 1
+    elapsed = time.perf_counter() - start
+    click.echo(f'  1 core: {done / elapsed:.1f} logins/sec ({1000 * elapsed / done:.1f} ms each)')
+    
+    if workers > 0:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(check_password_hash, [stored] * workers, ['warmup'] * workers))
+            
+            done = 0
+            start = time.perf_counter()
+            while time.perf_counter() - start < seconds:
+                batch = workers * 4
+                list(pool.map(check_password_hash, [stored] * batch, ['Bench123!'] * batch))
+                done += batch
+            elapsed = time.perf_counter() - start
+        
+        rate = done / elapsed
+        click.echo(f'  {workers} processes: {rate:.1f} logins/sec ({rate / workers:.1f} per core)')
+
+
 # ---------------------------------------------------------------------
 # Register all commands with app
 # ---------------------------------------------------------------------
@@ -279,3 +582,12 @@ def register_commands(app):
     app.cli.add_command(seed)
     app.cli.add_command(reset_db)
     app.cli.add_command(create_admin)
+    app.cli.add_command(refresh_trending)
+    app.cli.add_command(build_recommendations)
+    app.cli.add_command(build_friend_suggestions)
+    app.cli.add_command(gc_uploads)
+    app.cli.add_command(db_index_advisor)
+    app.cli.add_command(db_partitions)
+    app.cli.add_command(archive_activities)
+    app.cli.add_command(reconcile_ratings)
+    app.cli.add_command(bench_passwords)
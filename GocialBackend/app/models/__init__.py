@@ -8,7 +8,9 @@ Import everything here so you can do:
 from app.models.base import CRUDMixin, PkModel, reference_col
 from app.models.user import User, Role
 from app.models.activity import Activity, Participation, ActivityLike
-from app.models.social import Friendship, Message, Notification, Report, Evaluation
+from app.models.social import Friendship, Message, Notification, Report, Evaluation, UserRatingAggregate
+from app.models.recommendation import UserRecommendation
+from app.models.archive import ArchivedActivity, ArchivedUserRating
 
 # What gets exported when you do "from app.models import *"
 __all__ = [
@@ -29,4 +31,10 @@ __all__ = [
     'Notification',
     'Report',
     'Evaluation',
+    'UserRatingAggregate',
+    # Recommendations
+    'UserRecommendation',
+    # Archive
+    'ArchivedActivity',
+    'ArchivedUserRating',
 ]
@@ -81,13 +81,16 @@ class Activity(db.Model):
     views_count = db.Column(db.Integer, default=0)
     shares_count = db.Column(db.Integer, default=0)
     
+    # Precomputed ranking for sort=trending (see app/utils/trending.py)
+    trending_score = db.Column(db.Float, default=0, nullable=False, server_default='0', index=True)
+    
     # === Status ===
     # draft: not yet published
     # published: active and visible
     # full: max participants reached
     # cancelled: host cancelled it
     # completed: activity has ended
-    status = db.Column(db.String(20), default='published', index=True)
+    status = db.Column(db.String(20), default='published')  # see ix_activities_status_type_date
     cancelled_reason = db.Column(db.String(255))
     
     # === Timestamps ===
@@ -110,6 +113,21 @@ class Activity(db.Model):
         cascade='all, delete-orphan'
     )
     
+    __table_args__ = (
+        # Scoped trending feeds ("hot in Lyon, sports")
+        db.Index('ix_activities_city_category_trending', 'city', 'category', 'trending_score'),
+        # Feed: published + type, upcoming first
+        db.Index('ix_activities_status_type_date', 'status', 'activity_type', 'date'),
+        # Feed without type filter - only published rows, a fraction of the table
+        db.Index(
+            'ix_activities_published_date', 'date',
+            postgresql_where=db.text("status = 'published'"),
+            sqlite_where=db.text("status = 'published'"),
+        ),
+        # "My hosted activities"
+        db.Index('ix_activities_host_date', 'host_id', 'date'),
+    )
+    
     # -------------------------------------------------------------------
     # Helpers
     # -------------------------------------------------------------------
@@ -143,6 +161,8 @@ class Activity(db.Model):
         
         viewer_id: if provided, includes viewer-specific info (liked, participating)
         """
+        from app.utils.images import variant_urls
+        
         data = {
             'id': self.id,
             'title': self.title,
@@ -167,6 +187,7 @@ class Activity(db.Model):
             'validation_type': self.validation_type,
             'visibility': self.visibility,
             'image_url': self.image_url,
+            'image_variants': variant_urls(self.image_url),
             'likes_count': self.likes_count,
             'status': self.status,
             'is_full': self.is_full,
@@ -186,6 +207,7 @@ class Activity(db.Model):
                 'pseudo': self.host.pseudo,
                 'first_name': self.host.first_name,
                 'avatar_url': self.host.avatar_url,
+                'avatar_variants': variant_urls(self.host.avatar_url),
                 'is_verified': self.host.is_verified,
                 'user_type': self.host.user_type,
             }
@@ -220,7 +242,7 @@ class Participation(db.Model):
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
-    activity_id = db.Column(db.Integer, db.ForeignKey('activities.id'), nullable=False, index=True)
+    activity_id = db.Column(db.Integer, db.ForeignKey('activities.id'), nullable=False)  # see ix_participations_activity_status
     
     status = db.Column(db.String(20), default='pending', index=True)
     
@@ -247,9 +269,11 @@ class Participation(db.Model):
     # When ratings were submitted
     rated_at = db.Column(db.DateTime)
     
-    # Ensure user can only participate once per activity
     __table_args__ = (
+        # Ensure user can only participate once per activity
         db.UniqueConstraint('user_id', 'activity_id', name='uq_user_activity'),
+        # Participants of an activity, by status
+        db.Index('ix_participations_activity_status', 'activity_id', 'status'),
     )
     
     def to_dict(self, include_user=False, include_activity=False):
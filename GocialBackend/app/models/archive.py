@@ -0,0 +1,119 @@
+"""
+Cold storage for finished activities
+
+`flask archive-activities` (app/utils/archive.py) moves activities that
+ended more than ARCHIVE_AFTER_MONTHS ago out of the hot tables: one
+ArchivedActivity row per activity, holding the activity and its
+participations, likes and evaluations as JSON. Nobody edits a finished
+activity, so a document per activity is all the archive needs - and it
+keeps the feed indexes sized by what's still happening.
+
+Ratings stay right: what archived evaluations contributed to a user's
+rating lives on in ArchivedUserRating, so `flask reconcile-ratings` can
+still rebuild UserRatingAggregate once they're gone from evaluations.
+
+No foreign keys here on purpose: an archive outlives the users it
+mentions.
+"""
+
+from datetime import datetime
+
+from app import db
+from app.models.social import RatingCountsMixin
+
+
+def dump_row(row):
+    """A table row ({column: value} mapping), JSON-ready (datetimes as ISO strings)."""
+    return {key: value.isoformat() if isinstance(value, datetime) else value for key, value in row.items()}
+
+
+def load_row(model, data):
+    """Inverse of dump_row: {column: python value}, unknown keys dropped."""
+    values = {}
+    for column in model.__table__.columns:
+        if column.key not in data:
+            continue
+        value = data[column.key]
+        if value is not None and isinstance(column.type, db.DateTime):
+            value = datetime.fromisoformat(value)
+        values[column.key] = value
+    return values
+
+
+class ArchivedActivity(db.Model):
+    __tablename__ = 'archived_activities'
+
+    # Same id as the activity had - old links and messages keep working
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    host_id = db.Column(db.Integer, nullable=False, index=True)
+    status = db.Column(db.String(20))
+    date = db.Column(db.DateTime, nullable=False)
+    image_url = db.Column(db.String(500))  # copied out of the JSON for gc-uploads
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    # The activity row, and lists of its children's rows (dump_row)
+    activity = db.Column(db.JSON, nullable=False)
+    participations = db.Column(db.JSON, nullable=False, default=list)
+    likes = db.Column(db.JSON, nullable=False, default=list)
+    evaluations = db.Column(db.JSON, nullable=False, default=list)
+
+    def to_activity(self):
+        """Transient (never added to the session) Activity rebuilt from the archive."""
+        from app.models.activity import Activity
+        return Activity(**load_row(Activity, self.activity))
+
+    def participation_of(self, user_id):
+        return next((p for p in self.participations if p['user_id'] == user_id), None)
+
+    def to_dict(self, viewer_id=None):
+        """Same shape as Activity.to_dict(), plus 'archived': True."""
+        from app.models.user import User
+        from app.utils.images import variant_urls
+
+        data = self.to_activity().to_dict(include_host=False, viewer_id=viewer_id)
+        data['archived'] = True
+        data['archived_at'] = self.archived_at.isoformat() if self.archived_at else None
+
+        host = db.session.get(User, self.host_id)
+        if host:
+            data['host'] = {
+                'id': host.id,
+                'pseudo': host.pseudo,
+                'first_name': host.first_name,
+                'avatar_url': host.avatar_url,
+                'avatar_variants': variant_urls(host.avatar_url),
+                'is_verified': host.is_verified,
+                'user_type': host.user_type,
+            }
+        return data
+
+    def evaluations_to_dict(self):
+        """Same shape as Evaluation.to_dict(), newest first."""
+        from app.models.user import User
+
+        user_ids = {ev['evaluator_id'] for ev in self.evaluations} | {ev['evaluated_id'] for ev in self.evaluations}
+        pseudos = dict(db.session.query(User.id, User.pseudo).filter(User.id.in_(user_ids))) if user_ids else {}
+
+        evaluations = sorted(self.evaluations, key=lambda ev: ev['created_at'] or '', reverse=True)
+        return [
+            dict(
+                {key: ev[key] for key in ('id', 'activity_id', 'evaluator_id', 'evaluated_id',
+                                          'rating', 'was_present', 'comment', 'created_at')},
+                evaluator_pseudo=pseudos.get(ev['evaluator_id']),
+                evaluated_pseudo=pseudos.get(ev['evaluated_id']),
+            )
+            for ev in evaluations
+        ]
+
+    def __repr__(self):
+        return f'<ArchivedActivity #{self.id}>'
+
+
+class ArchivedUserRating(RatingCountsMixin, db.Model):
+    """What archived evaluations add to a user's rating (one row per evaluated user)."""
+    __tablename__ = 'archived_user_ratings'
+
+    user_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+
+    def __repr__(self):
+        return f'<ArchivedUserRating user={self.user_id} count={self.rating_count}>'
@@ -0,0 +1,90 @@
+"""
+Precomputed recommendations
+
+One row per (user, kind) holding a ranked list of ids, computed offline
+by `flask build-recommendations` / `flask build-friend-suggestions`.
+Serving a "for you" screen is then a single primary-key-ish lookup
+instead of a pile of joins.
+
+Kinds:
+- activities: "for you" activity feed
+- friends: "people you may know"
+"""
+
+from datetime import datetime
+
+from sqlalchemy import insert, or_, select, union
+
+from app import db
+from app.models.base import PkModel
+
+
+class UserRecommendation(PkModel):
+    __tablename__ = 'user_recommendations'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    kind = db.Column(db.String(20), nullable=False)
+
+    # Ranked ids (best first) and their scores, same order
+    item_ids = db.Column(db.JSON, nullable=False, default=list)
+    scores = db.Column(db.JSON, nullable=False, default=list)
+
+    # Optional per-item extras, same order (e.g. mutual friend counts)
+    details = db.Column(db.JSON)
+
+    # Set when the inputs changed (new friendship...) - picked up by incremental rebuilds
+    is_stale = db.Column(db.Boolean, default=False, nullable=False, server_default='0')
+
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'kind', name='uq_user_recommendation'),
+    )
+
+    @classmethod
+    def ids_for(cls, user_id, kind):
+        """Ranked ids for a user, or None if nothing was computed yet."""
+        row = db.session.query(cls.item_ids).filter_by(user_id=user_id, kind=kind).first()
+        return row[0] if row else None
+
+    @classmethod
+    def replace_for(cls, kind, user_ids, rows):
+        """
+        Swap the stored lists of a batch of users in one go.
+
+        Delete + bulk insert is simpler than a portable upsert and the
+        batch commits as a whole, so readers never see a half-written list.
+        """
+        cls.query.filter(
+            cls.user_id.in_(user_ids),
+            cls.kind == kind,
+        ).delete(synchronize_session=False)
+
+        if rows:
+            db.session.execute(insert(cls), [dict(row, kind=kind) for row in rows])
+
+    @classmethod
+    def mark_friend_suggestions_stale(cls, *user_ids):
+        """
+        Flag friend suggestions touched by a friendship change.
+
+        When A and B become friends (or stop being friends, or block each
+        other), the friends-of-friends of A, B and all their friends
+        change - so all of those get rebuilt on the next incremental run.
+        """
+        from app.models.social import Friendship
+
+        affected = union(
+            select(Friendship.friend_id).where(
+                Friendship.user_id.in_(user_ids), Friendship.status == 'accepted'),
+            select(Friendship.user_id).where(
+                Friendship.friend_id.in_(user_ids), Friendship.status == 'accepted'),
+        )
+
+        cls.query.filter(
+            cls.kind == 'friends',
+            or_(cls.user_id.in_(user_ids), cls.user_id.in_(affected)),
+        ).update({'is_stale': True}, synchronize_session=False)
+
+    def __repr__(self):
+        return f'<UserRecommendation user={self.user_id} kind={self.kind}>'
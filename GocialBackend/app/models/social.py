@@ -26,8 +26,9 @@ class Friendship(db.Model):
     __tablename__ = 'friendships'
     
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
-    friend_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    # Indexed through the composites below
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    friend_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     
     status = db.Column(db.String(20), default='pending', index=True)
     
@@ -41,9 +42,12 @@ class Friendship(db.Model):
     # Relationships
     friend = db.relationship('User', foreign_keys=[friend_id], backref='friend_requests_received')
     
-    # Prevent duplicate friendship requests
     __table_args__ = (
+        # Prevent duplicate friendship requests
         db.UniqueConstraint('user_id', 'friend_id', name='uq_friendship'),
+        # Friend lists: (user_id = me OR friend_id = me) AND status = 'accepted'
+        db.Index('ix_friendships_user_status', 'user_id', 'status'),
+        db.Index('ix_friendships_friend_status', 'friend_id', 'status'),
     )
     
     def to_dict(self, perspective_user_id=None):
@@ -89,17 +93,20 @@ class Message(db.Model):
     (e.g., "hey about that hiking trip...").
     
     For now it's just text, but we might add images/attachments later.
+    
+    Partitioned by month on PostgreSQL - see app/utils/partitions.py.
     """
     __tablename__ = 'messages'
     
     id = db.Column(db.Integer, primary_key=True)
     sender_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
-    recipient_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    recipient_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)  # see ix_messages_recipient_unread
     
     content = db.Column(db.Text, nullable=False)
     
     # Optional: link to an activity for context
-    activity_id = db.Column(db.Integer, db.ForeignKey('activities.id'), index=True)
+    # No FK: the activity may have moved to archived_activities (same id)
+    activity_id = db.Column(db.Integer, index=True)
     
     # Message type for special messages
     # 'text': normal message
@@ -118,12 +125,21 @@ class Message(db.Model):
     deleted_by_sender = db.Column(db.Boolean, default=False)
     deleted_by_recipient = db.Column(db.Boolean, default=False)
     
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)  # partition key (PostgreSQL)
     
     # Relationships
     sender = db.relationship('User', foreign_keys=[sender_id], backref='sent_messages')
     recipient = db.relationship('User', foreign_keys=[recipient_id], backref='received_messages')
-    activity = db.relationship('Activity', backref='related_messages')
+    activity = db.relationship(
+        'Activity', primaryjoin='foreign(Message.activity_id) == Activity.id', backref='related_messages',
+    )
+    
+    __table_args__ = (
+        # Unread badge / inbox: recipient + is_read + not deleted
+        db.Index('ix_messages_recipient_unread', 'recipient_id', 'is_read', 'deleted_by_recipient'),
+        # A conversation, newest first (both directions = two range scans)
+        db.Index('ix_messages_thread', 'sender_id', 'recipient_id', 'created_at'),
+    )
     
     def mark_as_read(self):
         """Mark message as read with timestamp."""
@@ -170,11 +186,14 @@ class Notification(db.Model):
     - activity_reminder: activity starts soon
     - activity_cancelled: host cancelled
     - rate_reminder: please rate the activity you attended
+    
+    Partitioned by month on PostgreSQL, kept NOTIFICATION_RETENTION_MONTHS
+    - see app/utils/partitions.py.
     """
     __tablename__ = 'notifications'
     
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)  # see ix_notifications_user_read_created
     
     # Who triggered this notification (the person who did the action)
     actor_id = db.Column(db.Integer, db.ForeignKey('users.id'), index=True)
@@ -200,12 +219,17 @@ class Notification(db.Model):
     push_sent = db.Column(db.Boolean, default=False)
     push_sent_at = db.Column(db.DateTime)
     
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)  # partition key (PostgreSQL)
     
     # Relationship
     user = db.relationship('User', foreign_keys=[user_id], backref=db.backref('notifications', lazy='dynamic'))
     actor = db.relationship('User', foreign_keys=[actor_id])
     
+    __table_args__ = (
+        # Notification list (all or unread only), newest first
+        db.Index('ix_notifications_user_read_created', 'user_id', 'is_read', 'created_at'),
+    )
+    
     def mark_as_read(self):
         if not self.is_read:
             self.is_read = True
@@ -263,7 +287,41 @@ class Evaluation(PkModel):
         db.UniqueConstraint('activity_id', 'evaluator_id', 'evaluated_id', name='uq_evaluation'),
     )
 
-    def to_dict(self):
+    UNIQUE_COLUMNS = ('activity_id', 'evaluator_id', 'evaluated_id')
+
+    @classmethod
+    def insert_new(cls, rows):
+        """
+        Insert rows (dicts) in one statement, skipping the ones uq_evaluation
+        already has (ON CONFLICT DO NOTHING). Returns the Evaluations
+        actually inserted - fewer than rows means someone got there first.
+        Caller commits.
+        """
+        from app.utils.database import dialect_insert
+
+        if not rows:
+            return []
+
+        insert = dialect_insert(db.session)
+        if insert is None:
+            # No ON CONFLICT here: a duplicate raises IntegrityError at flush
+            evaluations = [cls(**row) for row in rows]
+            db.session.add_all(evaluations)
+            db.session.flush()
+            return evaluations
+
+        stmt = insert(cls).values(rows).on_conflict_do_nothing(index_elements=list(cls.UNIQUE_COLUMNS))
+        return db.session.scalars(stmt.returning(cls)).all()
+
+    def to_dict(self, pseudos=None):
+        """pseudos: {user_id: pseudo} when serializing a batch - no user lookups then."""
+        if pseudos is None:
+            evaluator_pseudo = self.evaluator.pseudo if self.evaluator else None
+            evaluated_pseudo = self.evaluated.pseudo if self.evaluated else None
+        else:
+            evaluator_pseudo = pseudos.get(self.evaluator_id)
+            evaluated_pseudo = pseudos.get(self.evaluated_id)
+
         return {
             'id': self.id,
             'activity_id': self.activity_id,
@@ -273,11 +331,165 @@ class Evaluation(PkModel):
             'was_present': self.was_present,
             'comment': self.comment,
             'created_at': self.created_at.isoformat() if self.created_at else None,
-            'evaluator_pseudo': self.evaluator.pseudo if self.evaluator else None,
-            'evaluated_pseudo': self.evaluated.pseudo if self.evaluated else None,
+            'evaluator_pseudo': evaluator_pseudo,
+            'evaluated_pseudo': evaluated_pseudo,
         }
 
 
+class RatingCountsMixin:
+    """
+    Rating totals for one user: count, sum, per-star histogram and
+    no-shows (was_present = False). Adding evaluations is just bumping
+    counters, and every figure the app shows derives from them.
+    """
+    COUNT_COLUMNS = ('rating_count', 'rating_sum', 'stars_1', 'stars_2', 'stars_3', 'stars_4', 'stars_5', 'absent_count')
+
+    rating_count = db.Column(db.Integer, nullable=False, default=0)
+    rating_sum = db.Column(db.Integer, nullable=False, default=0)
+    # Per-star histogram
+    stars_1 = db.Column(db.Integer, nullable=False, default=0)
+    stars_2 = db.Column(db.Integer, nullable=False, default=0)
+    stars_3 = db.Column(db.Integer, nullable=False, default=0)
+    stars_4 = db.Column(db.Integer, nullable=False, default=0)
+    stars_5 = db.Column(db.Integer, nullable=False, default=0)
+    # was_present = False
+    absent_count = db.Column(db.Integer, nullable=False, default=0)
+
+    @staticmethod
+    def deltas(rating, was_present=True):
+        """What one evaluation adds, {column: increment}."""
+        return {
+            'rating_count': 1,
+            'rating_sum': rating,
+            f'stars_{rating}': 1,
+            'absent_count': 1 if was_present is False else 0,
+        }
+
+    def add(self, rating, was_present=True):
+        for column, increment in self.deltas(rating, was_present).items():
+            setattr(self, column, (getattr(self, column) or 0) + increment)
+
+    def counts(self):
+        return {column: getattr(self, column) or 0 for column in self.COUNT_COLUMNS}
+
+
+def rating_summary(counts=None):
+    """API view of a RatingCountsMixin row (None = never rated)."""
+    count = counts.rating_count if counts else 0
+    if not count:
+        return {'avg_rating': None, 'total_evaluations': 0, 'histogram': {str(n): 0 for n in range(1, 6)},
+                'no_show_rate': None}
+
+    return {
+        'avg_rating': round(counts.rating_sum / count, 1),
+        'total_evaluations': count,
+        'histogram': {str(n): getattr(counts, f'stars_{n}') for n in range(1, 6)},
+        'no_show_rate': round(counts.absent_count / count, 3),
+    }
+
+
+class UserRatingAggregate(RatingCountsMixin, db.Model):
+    """
+    Precomputed rating of a user, over every evaluation they received
+    (archived ones included).
+
+    Kept up to date by evaluate_activity (add_evaluations, same
+    transaction as the evaluations) - `flask reconcile-ratings` rebuilds
+    it from scratch if it ever drifts. Reading it is a primary-key lookup,
+    or free with joinedload(User.rating_aggregate) on a list of users.
+    """
+    __tablename__ = 'user_rating_aggregates'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True,
+                        autoincrement=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    user = db.relationship(
+        'User', backref=db.backref('rating_aggregate', uselist=False, cascade='all, delete-orphan'),
+    )
+
+    @classmethod
+    def for_users(cls, user_ids):
+        """{user_id: aggregate} for a batch of users, one query (users never rated are missing)."""
+        if not user_ids:
+            return {}
+        return {row.user_id: row for row in cls.query.filter(cls.user_id.in_(set(user_ids)))}
+
+    @classmethod
+    def add_evaluations(cls, evaluations):
+        """
+        Fold new evaluations (anything with evaluated_id / rating /
+        was_present) into the aggregates. Atomic increments in the
+        database, so concurrent submissions don't overwrite each other;
+        the caller commits.
+        """
+        from app.utils.database import dialect_insert
+
+        totals = {}
+        for ev in evaluations:
+            row = totals.setdefault(ev.evaluated_id, dict.fromkeys(cls.COUNT_COLUMNS, 0))
+            for column, increment in cls.deltas(ev.rating, ev.was_present).items():
+                row[column] += increment
+        if not totals:
+            return
+
+        now = datetime.utcnow()
+        rows = [dict(counts, user_id=user_id, updated_at=now) for user_id, counts in totals.items()]
+        insert = dialect_insert(db.session)
+
+        if insert is not None:
+            stmt = insert(cls).values(rows)
+            increments = {column: getattr(cls, column) + getattr(stmt.excluded, column) for column in cls.COUNT_COLUMNS}
+            db.session.execute(stmt.on_conflict_do_update(
+                index_elements=[cls.user_id], set_=dict(increments, updated_at=now),
+            ))
+            return
+
+        # Other databases: UPDATE, INSERT when there was nothing to update
+        for row in rows:
+            increments = {column: getattr(cls, column) + row[column] for column in cls.COUNT_COLUMNS}
+            updated = cls.query.filter_by(user_id=row['user_id']).update(
+                dict(increments, updated_at=now), synchronize_session=False,
+            )
+            if not updated:
+                db.session.add(cls(**row))
+
+    @classmethod
+    def set_counts(cls, counts_by_user):
+        """
+        Write absolute counts ({user_id: {column: value}}), creating rows as
+        needed. An upsert, so a row inserted meanwhile by a concurrent
+        evaluation is overwritten rather than colliding; the caller commits.
+        """
+        from app.utils.database import dialect_insert
+
+        if not counts_by_user:
+            return
+
+        now = datetime.utcnow()
+        rows = [dict(counts, user_id=user_id, updated_at=now) for user_id, counts in counts_by_user.items()]
+        insert = dialect_insert(db.session)
+
+        if insert is not None:
+            stmt = insert(cls).values(rows)
+            values = {column: getattr(stmt.excluded, column) for column in cls.COUNT_COLUMNS}
+            db.session.execute(stmt.on_conflict_do_update(
+                index_elements=[cls.user_id], set_=dict(values, updated_at=now),
+            ))
+            return
+
+        # Other databases: UPDATE, INSERT when there was nothing to update
+        for row in rows:
+            updated = cls.query.filter_by(user_id=row['user_id']).update(
+                {key: value for key, value in row.items() if key != 'user_id'}, synchronize_session=False,
+            )
+            if not updated:
+                db.session.add(cls(**row))
+
+    def __repr__(self):
+        return f'<UserRatingAggregate user={self.user_id} count={self.rating_count}>'
+
+
 class Report(db.Model):
     """
     User reports for moderation.
@@ -293,8 +505,10 @@ class Report(db.Model):
     # What's being reported
     report_type = db.Column(db.String(20), nullable=False)  # 'user', 'activity', 'message'
     reported_user_id = db.Column(db.Integer, db.ForeignKey('users.id'), index=True)
-    reported_activity_id = db.Column(db.Integer, db.ForeignKey('activities.id'), index=True)
-    reported_message_id = db.Column(db.Integer, db.ForeignKey('messages.id'), index=True)
+    # No FK: the activity may have moved to archived_activities (same id)
+    reported_activity_id = db.Column(db.Integer, index=True)
+    # No FK: messages is partitioned on PostgreSQL, its id alone can't be referenced
+    reported_message_id = db.Column(db.Integer, index=True)
     
     # Reason categories
     # inappropriate, spam, harassment, fake, dangerous, other
@@ -315,5 +529,7 @@ class Report(db.Model):
     # Relationships
     reporter = db.relationship('User', foreign_keys=[reporter_id])
     reported_user = db.relationship('User', foreign_keys=[reported_user_id])
-    reported_activity = db.relationship('Activity')
-    reported_message = db.relationship('Message')
+    reported_activity = db.relationship('Activity', primaryjoin='foreign(Report.reported_activity_id) == Activity.id')
+    reported_message = db.relationship(
+        'Message', primaryjoin='foreign(Report.reported_message_id) == Message.id',
+    )
@@ -13,7 +13,6 @@ the overlap is like 80% and joins suck.
 
 from datetime import datetime
 from app import db
-from werkzeug.security import generate_password_hash, check_password_hash
 
 
 # Many-to-many relationship between users and roles
@@ -178,11 +177,24 @@ class User(db.Model):
     
     def set_password(self, password):
         """Hash and store password. Never store plaintext!"""
-        self.password_hash = generate_password_hash(password)
+        from app.utils.passwords import password_hasher
+        self.password_hash = password_hasher.hash(password)
     
     def check_password(self, password):
-        """Verify password against stored hash."""
-        return check_password_hash(self.password_hash, password)
+        """
+        Verify password against stored hash.
+        
+        If the hash was made with older settings (PASSWORD_HASH_METHOD
+        changed), it's upgraded in place - the caller's commit saves it.
+        """
+        from app.utils.passwords import password_hasher
+        
+        if not password_hasher.verify(self.password_hash, password):
+            return False
+        
+        if password_hasher.needs_rehash(self.password_hash):
+            self.password_hash = password_hasher.hash(password)
+        return True
     
     # -------------------------------------------------------------------
     # Role management
@@ -221,13 +233,17 @@ class User(db.Model):
     # Serialization
     # -------------------------------------------------------------------
     
-    def to_dict(self, include_private=False, include_settings=False):
+    def to_dict(self, include_private=False, include_settings=False, include_rating=False):
         """
         Convert user to dict for API response.
         
         include_private: add email, phone, etc. (only for own profile)
         include_settings: add notification prefs and such
+        include_rating: add the rating summary - for lists, load users with
+            joinedload(User.rating_aggregate) or it's one query per user
         """
+        from app.utils.images import variant_urls
+        
         data = {
             'id': self.id,
             'pseudo': self.pseudo,
@@ -235,6 +251,7 @@ class User(db.Model):
             'user_type': self.user_type,
             'city': self.city,
             'avatar_url': self.avatar_url,
+            'avatar_variants': variant_urls(self.avatar_url),
             'bio': self.bio,
             'is_verified': self.is_verified,
             'is_premium': self.is_premium,
@@ -300,6 +317,10 @@ class User(db.Model):
                 'notif_push_enabled': self.notif_push_enabled,
             })
         
+        if include_rating:
+            from app.models.social import rating_summary
+            data['rating'] = rating_summary(self.rating_aggregate)
+        
         return data
     
     def __repr__(self):
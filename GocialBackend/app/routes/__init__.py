@@ -10,6 +10,9 @@ from app.routes.activities import activities_bp
 from app.routes.friends import friends_bp
 from app.routes.messages import messages_bp
 from app.routes.notifications import notifications_bp
+from app.routes.uploads import uploads_bp
+from app.routes.media import media_bp
+from app.routes.health import health_bp
 
 __all__ = [
     'auth_bp',
@@ -18,4 +21,7 @@ __all__ = [
     'friends_bp',
     'messages_bp',
     'notifications_bp',
+    'uploads_bp',
+    'media_bp',
+    'health_bp',
 ]
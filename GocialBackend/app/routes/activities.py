@@ -8,13 +8,20 @@ Handles all the CRUD, filtering, participation requests, and likes.
 from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from datetime import datetime, timedelta
-from math import radians, cos, sin, asin, sqrt
-import os
-import uuid
-from werkzeug.utils import secure_filename
+from math import radians, cos
+from sqlalchemy.orm import joinedload
 
 from app import db
-from app.models import User, Activity, Participation, ActivityLike, Friendship, Evaluation
+from app.models import (
+    User, Activity, Participation, ActivityLike, Friendship, Evaluation, UserRecommendation, ArchivedActivity,
+    UserRatingAggregate,
+)
+from app.utils import haversine
+from app.utils.auth import current_user_flag, get_current_user
+from app.utils.images import InvalidImage, image_pipeline, restore_url, variant_urls
+from app.utils.trending import trending_ranker
+from app.utils.uploads import UploadTooLarge, limit_upload_size, stage_stream, too_large_response
+from app.utils.view_counter import view_counter
 
 activities_bp = Blueprint('activities', __name__)
 
@@ -25,21 +32,6 @@ def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in allowed
 
 
-def haversine(lon1, lat1, lon2, lat2):
-    """
-    Calculate distance in km between two points.
-    The classic haversine formula.
-    """
-    lon1, lat1, lon2, lat2 = map(radians, [lon1, lat1, lon2, lat2])
-    
-    dlon = lon2 - lon1
-    dlat = lat2 - lat1
-    a = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlon/2)**2
-    c = 2 * asin(sqrt(a))
-    
-    return 6371 * c  # Earth radius in km
-
-
 # ---------------------------------------------------------------------
 # Get activity feed
 # ---------------------------------------------------------------------
@@ -53,20 +45,22 @@ def get_activities():
     Query params:
     - type: real | visio (defaults to real)
     - category: activity category
+    - city: city filter (exact match)
     - date: specific date (YYYY-MM-DD)
     - lat, lng, radius: location-based filter (km)
     - search: text search on title and description
     - host_type: filter by host user type (person, pro, asso)
     - girls_only: filter women-only activities
     - free_only: show only free activities
+    - sort: date (default) | trending
     - page, per_page: pagination
     """
     current_user_id = int(get_jwt_identity())
-    current_user = User.query.get(current_user_id)
 
     # Parse all the filter params
     activity_type = request.args.get('type', 'real')
     category = request.args.get('category', '').strip()
+    city = request.args.get('city', '').strip()
     date_str = request.args.get('date', '').strip()
     
     lat = request.args.get('lat', type=float)
@@ -77,6 +71,7 @@ def get_activities():
 
     girls_only = request.args.get('girls_only', 'false').lower() == 'true'
     free_only = request.args.get('free_only', 'false').lower() == 'true'
+    sort = request.args.get('sort', 'date')
     
     page = request.args.get('page', 1, type=int)
     per_page = min(request.args.get('per_page', 20, type=int), 50)
@@ -99,6 +94,9 @@ def get_activities():
         else:
             query = query.filter(Activity.category == category)
 
+    if city:
+        query = query.filter(Activity.city == city)
+
     # Host type filter (person, pro, asso)
     host_type = request.args.get('host_type', '').strip()
     if host_type:
@@ -125,7 +123,7 @@ def get_activities():
             pass  # Ignore invalid dates
     
     # Girls only filter
-    if girls_only or (current_user and current_user.girls_only_mode):
+    if girls_only or current_user_flag('girls_only_mode'):
         query = query.filter(Activity.gender_restriction == 'female')
     
     # Free activities only
@@ -149,24 +147,17 @@ def get_activities():
         )
     
     # Visibility check - public activities or friends-only if we're friends
-    friend_ids = []
-    if current_user:
-        friendships = Friendship.query.filter(
-            ((Friendship.user_id == current_user_id) | (Friendship.friend_id == current_user_id)),
-            Friendship.status == 'accepted'
-        ).all()
-        
-        for f in friendships:
-            friend_ids.append(f.friend_id if f.user_id == current_user_id else f.user_id)
+    query = _visible_to(query, current_user_id)
     
-    query = query.filter(
-        (Activity.visibility == 'public') |
-        ((Activity.visibility == 'friends') & (Activity.host_id.in_(friend_ids))) |
-        (Activity.host_id == current_user_id)
-    )
+    # Hosts come with the page (one JOIN instead of one SELECT per card);
+    # their roles aren't shown, don't load them
+    query = query.options(joinedload(Activity.host).lazyload(User.roles))
     
-    # Sort by date
-    query = query.order_by(Activity.date.asc())
+    # Sort - trending uses the precomputed score (see app/utils/trending.py)
+    if sort == 'trending':
+        query = query.order_by(Activity.trending_score.desc(), Activity.date.asc())
+    else:
+        query = query.order_by(Activity.date.asc())
     
     # Paginate
     pagination = query.paginate(page=page, per_page=per_page, error_out=False)
@@ -210,19 +201,19 @@ def get_activity(activity_id):
 
     activity = Activity.query.get(activity_id)
     if not activity:
+        # Finished long ago? It lives in the archive now (app/utils/archive.py)
+        archived = db.session.get(ArchivedActivity, activity_id)
+        if archived:
+            return _archived_activity_response(archived, current_user_id)
         return jsonify({'error': 'Activité introuvable'}), 404
 
     # Check visibility
-    if activity.visibility == 'friends_only' and activity.host_id != current_user_id:
-        # Check if we're friends with host
-        friendship = Friendship.query.filter(
-            ((Friendship.user_id == current_user_id) & (Friendship.friend_id == activity.host_id)) |
-            ((Friendship.user_id == activity.host_id) & (Friendship.friend_id == current_user_id)),
-            Friendship.status == 'accepted'
-        ).first()
-        
-        if not friendship:
-            return jsonify({'error': 'Activité introuvable'}), 404
+    if not _can_view(activity.host_id, activity.visibility, current_user_id):
+        return jsonify({'error': 'Activité introuvable'}), 404
+    
+    # Count the view - buffered, flushed to the DB in batches
+    if activity.host_id != current_user_id:
+        view_counter.record(activity_id, current_user_id)
     
     # Get participant list if host or if already participating
     include_participants = False
@@ -254,13 +245,89 @@ def get_activity(activity_id):
             activity_id=activity_id,
             status='validated'
         ).all()
+        users = _users_with_ratings([p.user_id for p in participants])
         
         response['participants'] = [
             {
-                'user': User.query.get(p.user_id).to_dict(),
+                'user': users[p.user_id].to_dict(include_rating=True),
                 'joined_at': p.validated_at.isoformat() if p.validated_at else None
             }
-            for p in participants
+            for p in participants if p.user_id in users
+        ]
+    
+    return jsonify(response), 200
+
+
+def _users_with_ratings(user_ids):
+    """{id: User} with rating aggregates loaded, one query - for participant lists."""
+    if not user_ids:
+        return {}
+    users = User.query.options(joinedload(User.rating_aggregate)).filter(User.id.in_(set(user_ids)))
+    return {u.id: u for u in users}
+
+
+def _visible_to(query, user_id):
+    """Public activities, friends-only ones of our friends, and our own."""
+    friendships = Friendship.query.filter(
+        ((Friendship.user_id == user_id) | (Friendship.friend_id == user_id)),
+        Friendship.status == 'accepted'
+    ).all()
+    friend_ids = [f.friend_id if f.user_id == user_id else f.user_id for f in friendships]
+
+    return query.filter(
+        (Activity.visibility == 'public') |
+        ((Activity.visibility == 'friends') & (Activity.host_id.in_(friend_ids))) |
+        (Activity.host_id == user_id)
+    )
+
+
+def _gender_allowed(query, user):
+    """girls_only_mode like the feed, and women-only activities only for women (like the builder)."""
+    if current_user_flag('girls_only_mode'):
+        return query.filter(Activity.gender_restriction == 'female')
+    if user is None or user.gender != 'female':
+        query = query.filter(
+            (Activity.gender_restriction == None) | (Activity.gender_restriction != 'female')
+        )
+    return query
+
+
+def _can_view(host_id, visibility, user_id):
+    """friends_only activities are only visible to the host and their friends."""
+    if visibility != 'friends_only' or host_id == user_id:
+        return True
+    
+    friendship = Friendship.query.filter(
+        ((Friendship.user_id == user_id) & (Friendship.friend_id == host_id)) |
+        ((Friendship.user_id == host_id) & (Friendship.friend_id == user_id)),
+        Friendship.status == 'accepted'
+    ).first()
+    return friendship is not None
+
+
+def _archived_activity_response(archived, current_user_id):
+    """get_activity() for an archived activity - same rules, read from the archive."""
+    if not _can_view(archived.host_id, archived.activity.get('visibility'), current_user_id):
+        return jsonify({'error': 'Activité introuvable'}), 404
+    
+    response = archived.to_dict(viewer_id=current_user_id)
+    
+    current_participation = archived.participation_of(current_user_id)
+    if current_participation:
+        response['my_participation'] = {
+            'status': current_participation['status'],
+            'requested_at': current_participation['created_at'],
+        }
+    
+    is_validated = current_participation and current_participation['status'] == 'validated'
+    if archived.host_id == current_user_id or is_validated:
+        participants = [p for p in archived.participations if p['status'] == 'validated']
+        users = _users_with_ratings([p['user_id'] for p in participants])
+        
+        # Accounts deleted since then are left out
+        response['participants'] = [
+            {'user': users[p['user_id']].to_dict(include_rating=True), 'joined_at': p['validated_at']}
+            for p in participants if p['user_id'] in users
         ]
     
     return jsonify(response), 200
@@ -375,6 +442,8 @@ def create_activity():
         current_app.logger.exception("Erreur lors de la création d'activité")
         return jsonify({'error': "Erreur serveur lors de la création"}), 500
 
+    trending_ranker.mark_dirty(activity.id)
+
     return jsonify({
         'message': 'Activité créée',
         'activity': activity.to_dict(viewer_id=user_id)
@@ -460,12 +529,16 @@ def update_activity(activity_id):
 
 @activities_bp.route('/<int:activity_id>/image', methods=['POST'])
 @jwt_required()
+@limit_upload_size()
 def upload_activity_image(activity_id):
     """
     Upload an image for an activity.
 
     Only the host can upload an image.
-    Accepts multipart/form-data with 'image' field.
+    Accepts multipart/form-data with 'image' field. Bodies over
+    MAX_CONTENT_LENGTH are refused before being read. Resized WebP
+    variants are generated in the background (see app/utils/images.py).
+    For big files on bad networks, see the resumable /api/uploads.
     """
     user_id = int(get_jwt_identity())
 
@@ -487,47 +560,32 @@ def upload_activity_image(activity_id):
     if not allowed_file(file.filename):
         return jsonify({'error': 'Type de fichier non autorisé (JPEG, PNG, GIF, WebP acceptés)'}), 400
 
-    # Check file size (max 16 MB) — Flask MAX_CONTENT_LENGTH handles this
-    # at the request level, but we double-check here for safety
-    file.seek(0, os.SEEK_END)
-    file_size = file.tell()
-    file.seek(0)
-    max_size = 16 * 1024 * 1024  # 16 MB
-    if file_size > max_size:
-        return jsonify({'error': 'Le fichier est trop volumineux (max 16 Mo)'}), 400
-
-    # Generate a UUID-based filename
-    ext = file.filename.rsplit('.', 1)[1].lower()
-    filename = f'{uuid.uuid4().hex}.{ext}'
-    filename = secure_filename(filename)
-
-    # Get upload folder
-    upload_folder = current_app.config.get('UPLOAD_FOLDER', 'uploads')
-    activities_folder = os.path.join(upload_folder, 'activities')
-
-    # Create folder if it doesn't exist
-    os.makedirs(activities_folder, exist_ok=True)
-
-    # Save file
-    filepath = os.path.join(activities_folder, filename)
-    file.save(filepath)
+    # Streamed to a temp file in chunks, cut off past the size limit
+    try:
+        image_url = image_pipeline.process(
+            stage_stream(file.stream), 'activities',
+            on_failure=restore_url(Activity, activity.id, 'image_url', activity.image_url),
+        )
+    except UploadTooLarge as e:
+        return too_large_response(e.max_bytes)
+    except InvalidImage as e:
+        return jsonify({'error': str(e)}), 400
 
-    # Update activity image URL
-    activity.image_url = f'/uploads/activities/{filename}'
+    # Content-addressed files - nothing to clean up on DB error,
+    # unreferenced ones are collected later
+    activity.image_url = image_url
 
     try:
         db.session.commit()
     except Exception as e:
         db.session.rollback()
         current_app.logger.error(f'Activity image upload failed: {e}')
-        # Clean up saved file on DB error
-        if os.path.exists(filepath):
-            os.remove(filepath)
         return jsonify({'error': "Échec de la mise à jour de l'image"}), 500
 
     return jsonify({
         'message': 'Image mise à jour',
-        'image_url': activity.image_url
+        'image_url': activity.image_url,
+        'image_variants': variant_urls(activity.image_url),
     }), 200
 
 
@@ -626,6 +684,7 @@ def request_participation(activity_id):
     
     db.session.add(participation)
     db.session.commit()
+    trending_ranker.mark_dirty(activity_id)
     
     # TODO: Send notification to host
     
@@ -668,6 +727,7 @@ def cancel_participation(activity_id):
     
     db.session.delete(participation)
     db.session.commit()
+    trending_ranker.mark_dirty(activity_id)
     
     return jsonify({'message': 'Participation annulée'}), 200
 
@@ -724,6 +784,7 @@ def handle_participation(activity_id, user_id):
         return jsonify({'error': 'L\'action doit être "accept" ou "reject"'}), 400
     
     db.session.commit()
+    trending_ranker.mark_dirty(activity_id)
     
     # TODO: Notify user of decision
     
@@ -752,6 +813,7 @@ def get_participants(activity_id):
         return jsonify({'error': 'Non autorisé'}), 403
 
     participations = Participation.query.filter_by(activity_id=activity_id).all()
+    users = _users_with_ratings([p.user_id for p in participations])
     
     result = {
         'validated': [],
@@ -760,9 +822,9 @@ def get_participants(activity_id):
     }
     
     for p in participations:
-        user = User.query.get(p.user_id)
+        user = users.get(p.user_id)
         entry = {
-            'user': user.to_dict() if user else None,
+            'user': user.to_dict(include_rating=True) if user else None,
             'message': p.request_message,
             'requested_at': p.created_at.isoformat(),
             'validated_at': p.validated_at.isoformat() if p.validated_at else None,
@@ -800,6 +862,7 @@ def like_activity(activity_id):
     activity.likes_count = (activity.likes_count or 0) + 1
     db.session.add(like)
     db.session.commit()
+    trending_ranker.mark_dirty(activity_id)
 
     return jsonify({'message': 'Activité aimée'}), 201
 
@@ -825,6 +888,7 @@ def unlike_activity(activity_id):
         activity.likes_count = max(0, (activity.likes_count or 0) - 1)
     db.session.delete(like)
     db.session.commit()
+    trending_ranker.mark_dirty(activity_id)
     
     return jsonify({'message': 'Like retiré'}), 200
 
@@ -861,6 +925,61 @@ def get_liked_activities():
     }), 200
 
 
+# ---------------------------------------------------------------------
+# Recommended activities ("for you")
+# ---------------------------------------------------------------------
+
+@activities_bp.route('/recommended', methods=['GET'])
+@jwt_required()
+def get_recommended_activities():
+    """
+    Personalized "for you" activities.
+    
+    Lists are precomputed offline by `flask build-recommendations`, so this
+    is one lookup + one fetch. New users without a list yet get the
+    trending activities of their city instead.
+    
+    Query params:
+    - limit: how many activities (default 20, max 50)
+    """
+    user_id = int(get_jwt_identity())
+    limit = min(request.args.get('limit', 20, type=int), 50)
+    now = datetime.utcnow()
+    user = get_current_user()
+    
+    ranked_ids = UserRecommendation.ids_for(user_id, 'activities')
+    
+    if ranked_ids:
+        # The list can be a few hours old - drop what's gone full/past,
+        # friends-only or women-only since, same rules as the feed
+        query = Activity.query.filter(
+            Activity.id.in_(ranked_ids),
+            Activity.status == 'published',
+            Activity.date >= now
+        )
+        fresh = _gender_allowed(_visible_to(query, user_id), user).all()
+        by_id = {a.id: a for a in fresh}
+        activities = [by_id[i] for i in ranked_ids if i in by_id][:limit]
+        source = 'personalized'
+    else:
+        query = Activity.query.filter(
+            Activity.status == 'published',
+            Activity.visibility == 'public',
+            Activity.date >= now,
+            Activity.host_id != user_id
+        )
+        query = _gender_allowed(query, user)
+        if user and user.city:
+            query = query.filter(Activity.city == user.city)
+        activities = query.order_by(Activity.trending_score.desc()).limit(limit).all()
+        source = 'trending'
+    
+    return jsonify({
+        'activities': [a.to_dict(viewer_id=user_id) for a in activities],
+        'source': source,
+    }), 200
+
+
 # ---------------------------------------------------------------------
 # Get my activities (as host)
 # ---------------------------------------------------------------------
@@ -975,33 +1094,26 @@ def evaluate_activity(activity_id):
     if not is_completed:
         return jsonify({'error': "L'activité n'est pas encore terminée"}), 400
 
-    # Vérifier que l'utilisateur est l'hôte ou un participant validé
-    is_host = activity.host_id == current_user_id
-    is_participant = False
-    if not is_host:
-        participation = Participation.query.filter_by(
+    # Participants validés + l'hôte : les personnes évaluables (une seule requête)
+    valid_user_ids = {
+        user_id for user_id, in db.session.query(Participation.user_id).filter_by(
             activity_id=activity_id,
-            user_id=current_user_id,
             status='validated'
-        ).first()
-        is_participant = participation is not None
+        )
+    }
+    valid_user_ids.add(activity.host_id)
 
-    if not is_host and not is_participant:
+    # Vérifier que l'utilisateur est l'hôte ou un participant validé
+    if current_user_id not in valid_user_ids:
         return jsonify({'error': "Vous devez être l'hôte ou un participant validé pour évaluer"}), 403
 
     evaluations_data = data.get('evaluations', [])
     if not evaluations_data:
         return jsonify({'error': 'Aucune évaluation fournie'}), 400
 
-    # Récupérer les IDs des participants validés + l'hôte (les personnes évaluables)
-    validated_participations = Participation.query.filter_by(
-        activity_id=activity_id,
-        status='validated'
-    ).all()
-    valid_user_ids = {p.user_id for p in validated_participations}
-    valid_user_ids.add(activity.host_id)
-
-    created_evaluations = []
+    # Validations - tout le lot, avant d'écrire quoi que ce soit
+    now = datetime.utcnow()
+    rows = {}
 
     for eval_data in evaluations_data:
         evaluated_id = eval_data.get('user_id')
@@ -1009,7 +1121,6 @@ def evaluate_activity(activity_id):
         was_present = eval_data.get('was_present', True)
         comment = eval_data.get('comment', '').strip() if eval_data.get('comment') else None
 
-        # Validations
         if not evaluated_id:
             return jsonify({'error': "L'identifiant de l'utilisateur évalué est requis"}), 400
 
@@ -1022,28 +1133,43 @@ def evaluate_activity(activity_id):
         if rating is None or not isinstance(rating, int) or rating < 1 or rating > 5:
             return jsonify({'error': 'La note doit être un entier entre 1 et 5'}), 400
 
-        # Vérifier qu'on n'a pas déjà évalué cette personne pour cette activité
-        existing = Evaluation.query.filter_by(
-            activity_id=activity_id,
-            evaluator_id=current_user_id,
-            evaluated_id=evaluated_id
-        ).first()
-
-        if existing:
+        if evaluated_id in rows:
             return jsonify({'error': f"Vous avez déjà évalué l'utilisateur {evaluated_id} pour cette activité"}), 409
 
-        evaluation = Evaluation(
-            activity_id=activity_id,
-            evaluator_id=current_user_id,
-            evaluated_id=evaluated_id,
-            rating=rating,
-            was_present=was_present,
-            comment=comment
-        )
-        db.session.add(evaluation)
-        created_evaluations.append(evaluation)
+        rows[evaluated_id] = {
+            'activity_id': activity_id,
+            'evaluator_id': current_user_id,
+            'evaluated_id': evaluated_id,
+            'rating': rating,
+            'was_present': was_present,
+            'comment': comment,
+            'created_at': now,
+        }
+
+    # Déjà évalués pour cette activité : une requête pour tout le lot
+    already_rated = db.session.query(Evaluation.evaluated_id).filter(
+        Evaluation.activity_id == activity_id,
+        Evaluation.evaluator_id == current_user_id,
+        Evaluation.evaluated_id.in_(rows)
+    ).first()
+    if already_rated:
+        return jsonify({'error': f"Vous avez déjà évalué l'utilisateur {already_rated[0]} pour cette activité"}), 409
 
     try:
+        # One INSERT for the batch - ON CONFLICT on uq_evaluation covers a
+        # concurrent submission that slipped in after the check above
+        created_evaluations = Evaluation.insert_new(list(rows.values()))
+        if len(created_evaluations) < len(rows):
+            db.session.rollback()
+            return jsonify({'error': 'Ces évaluations ont déjà été enregistrées'}), 409
+
+        # Same transaction: the aggregates never disagree with the evaluations
+        UserRatingAggregate.add_evaluations(created_evaluations)
+
+        # Serialized before commit expires them - pseudos in one query
+        pseudos = dict(db.session.query(User.id, User.pseudo).filter(User.id.in_([current_user_id, *rows])))
+        evaluations = [ev.to_dict(pseudos) for ev in created_evaluations]
+
         db.session.commit()
     except Exception as e:
         db.session.rollback()
@@ -1052,7 +1178,7 @@ def evaluate_activity(activity_id):
 
     return jsonify({
         'message': 'Évaluations enregistrées',
-        'evaluations': [ev.to_dict() for ev in created_evaluations]
+        'evaluations': evaluations
     }), 201
 
 
@@ -1070,7 +1196,11 @@ def get_activity_evaluations(activity_id):
 
     activity = Activity.query.get(activity_id)
     if not activity:
-        return jsonify({'error': 'Activité introuvable'}), 404
+        archived = db.session.get(ArchivedActivity, activity_id)
+        if not archived:
+            return jsonify({'error': 'Activité introuvable'}), 404
+        evaluations = archived.evaluations_to_dict()
+        return jsonify({'evaluations': evaluations, 'total': len(evaluations)}), 200
 
     evaluations = Evaluation.query.filter_by(activity_id=activity_id).order_by(
         Evaluation.created_at.desc()
@@ -7,10 +7,7 @@ All the gatekeeping happens here.
 
 from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import (
-    create_access_token,
-    create_refresh_token,
     jwt_required,
-    get_jwt_identity,
     get_jwt
 )
 from datetime import datetime
@@ -18,6 +15,10 @@ import re
 
 from app import db
 from app.models import User
+from app.utils import rate_limit
+from app.utils.auth import get_current_user
+from app.utils.presence import presence
+from app.utils.revocation import issue_tokens, revocations
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -57,6 +58,7 @@ def validate_password(password):
 # ---------------------------------------------------------------------
 
 @auth_bp.route('/register', methods=['POST'])
+@rate_limit(10, 3600)
 def register():
     """
     Create a new user account.
@@ -139,8 +141,7 @@ def register():
         return jsonify({'error': "L'inscription a échoué. Veuillez réessayer."}), 500
     
     # Generate tokens
-    access_token = create_access_token(identity=str(user.id))
-    refresh_token = create_refresh_token(identity=str(user.id))
+    access_token, refresh_token = issue_tokens(user)
     
     return jsonify({
         'message': 'Compte créé avec succès',
@@ -155,6 +156,7 @@ def register():
 # ---------------------------------------------------------------------
 
 @auth_bp.route('/login', methods=['POST'])
+@rate_limit(10, 60)
 def login():
     """
     Authenticate and get tokens.
@@ -183,14 +185,15 @@ def login():
     if not user.is_active:
         return jsonify({'error': 'Ce compte est désactivé'}), 403
     
-    # Update last login timestamp
-    user.last_login = datetime.utcnow()
-    user.last_seen = datetime.utcnow()
-    db.session.commit()
+    # Last login / last seen are written in the background
+    presence.touch(user.id, login=True)
+    
+    # check_password may have upgraded the hash
+    if user in db.session.dirty:
+        db.session.commit()
     
     # Generate fresh tokens
-    access_token = create_access_token(identity=str(user.id))
-    refresh_token = create_refresh_token(identity=str(user.id))
+    access_token, refresh_token = issue_tokens(user)
     
     return jsonify({
         'message': 'Bon retour !',
@@ -208,24 +211,28 @@ def login():
 @jwt_required(refresh=True)
 def refresh_token():
     """
-    Get a new access token using refresh token.
+    Get a new token pair using the refresh token.
     
     Call this when the access token expires (or is about to).
+    The refresh token is single use: store the new one, the old one is
+    burnt (and replaying it logs the whole session out, after a short
+    grace window - see app/utils/revocation.py).
     """
-    user_id = int(get_jwt_identity())
+    claims = get_jwt()
 
     # Make sure user still exists and is active
-    user = User.query.get(user_id)
+    user = get_current_user()
     if not user or not user.is_active:
         return jsonify({'error': 'Session invalide'}), 401
 
-    # Update last seen
-    user.last_seen = datetime.utcnow()
-    db.session.commit()
+    # Burn the refresh token we just got
+    revocations.revoke_token(claims)
+    presence.touch(user.id)
 
-    new_token = create_access_token(identity=str(user_id))
+    # Fresh flags claim from the row - picks up admin/verified/girls-only changes
+    access_token, refresh_token = issue_tokens(user, family=claims.get('fam'))
     
-    return jsonify({'access_token': new_token}), 200
+    return jsonify({'access_token': access_token, 'refresh_token': refresh_token}), 200
 
 
 # ---------------------------------------------------------------------
@@ -240,16 +247,11 @@ def get_me():
     
     Includes private info since it's their own profile.
     """
-    user_id = int(get_jwt_identity())
-    user = User.query.get(user_id)
+    user = get_current_user()
 
     if not user:
         return jsonify({'error': 'Utilisateur introuvable'}), 404
 
-    # Update last seen
-    user.last_seen = datetime.utcnow()
-    db.session.commit()
-
     return jsonify({
         'user': user.to_dict(include_private=True, include_settings=True)
     }), 200
@@ -268,7 +270,6 @@ def change_password():
     Requires current password for verification.
     """
     data = request.get_json()
-    user_id = int(get_jwt_identity())
 
     old_password = data.get('old_password', '')
     new_password = data.get('new_password', '')
@@ -276,7 +277,7 @@ def change_password():
     if not old_password or not new_password:
         return jsonify({'error': "L'ancien et le nouveau mot de passe sont requis"}), 400
 
-    user = User.query.get(user_id)
+    user = get_current_user()
     if not user:
         return jsonify({'error': 'Utilisateur introuvable'}), 404
 
@@ -297,30 +298,32 @@ def change_password():
     user.set_password(new_password)
     db.session.commit()
 
-    return jsonify({'message': 'Mot de passe mis à jour'}), 200
+    # Log out every other session, keep this one going with fresh tokens
+    revocations.revoke_user(user.id)
+    access_token, refresh_token = issue_tokens(user)
+
+    return jsonify({
+        'message': 'Mot de passe mis à jour',
+        'access_token': access_token,
+        'refresh_token': refresh_token,
+    }), 200
 
 
 # ---------------------------------------------------------------------
-# Logout (optional - mainly for token blacklisting later)
+# Logout
 # ---------------------------------------------------------------------
 
 @auth_bp.route('/logout', methods=['POST'])
 @jwt_required()
 def logout():
     """
-    Logout - update last seen, potential future token blacklist.
-    
-    For now this is mostly informational since JWTs are stateless.
-    Real logout happens client-side by deleting tokens.
+    Logout - revoke this access token and its whole session
+    (the matching refresh token included).
     """
-    user_id = int(get_jwt_identity())
-    user = User.query.get(user_id)
-
-    if user:
-        user.last_seen = datetime.utcnow()
-        db.session.commit()
+    claims = get_jwt()
 
-    # TODO: Add token to blacklist when we implement that
+    revocations.revoke_token(claims)
+    revocations.revoke_family(claims.get('fam'))
 
     return jsonify({'message': 'Déconnecté avec succès'}), 200
 
@@ -330,6 +333,7 @@ def logout():
 # ---------------------------------------------------------------------
 
 @auth_bp.route('/check-email', methods=['POST'])
+@rate_limit(30, 60)
 def check_email():
     """
     Check if an email is available for registration.
@@ -358,6 +362,7 @@ def check_email():
 # ---------------------------------------------------------------------
 
 @auth_bp.route('/check-pseudo', methods=['POST'])
+@rate_limit(30, 60)
 def check_pseudo():
     """
     Check if a pseudo/username is available.
@@ -9,8 +9,12 @@ from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from datetime import datetime
 
+from sqlalchemy import and_, or_, select
+
 from app import db
-from app.models import User, Friendship
+from app.models import User, Friendship, UserRecommendation
+from app.utils.presence import presence
+from app.utils.replicas import read_only
 
 friends_bp = Blueprint('friends', __name__)
 
@@ -35,10 +39,12 @@ def get_friends():
         Friendship.status == 'accepted'
     ).paginate(page=page, per_page=per_page, error_out=False)
     
+    # Get the other user (not us) - online status comes from memory/Redis, not the DB
+    friend_ids = [f.friend_id if f.user_id == user_id else f.user_id for f in friendships.items]
+    online = presence.online_among(friend_ids)
+    
     friends = []
-    for f in friendships.items:
-        # Get the other user (not us)
-        friend_id = f.friend_id if f.user_id == user_id else f.user_id
+    for f, friend_id in zip(friendships.items, friend_ids):
         friend = User.query.get(friend_id)
         
         if friend and friend.is_active:
@@ -46,6 +52,7 @@ def get_friends():
                 'friendship_id': f.id,
                 'user': friend.to_dict(),
                 'since': f.updated_at.isoformat() if f.updated_at else f.created_at.isoformat(),
+                'is_online': friend_id in online,
             })
     
     return jsonify({
@@ -106,6 +113,59 @@ def get_friend_requests():
     }), 200
 
 
+# ---------------------------------------------------------------------
+# People you may know
+# ---------------------------------------------------------------------
+
+@friends_bp.route('/suggestions', methods=['GET'])
+@jwt_required()
+def get_friend_suggestions():
+    """
+    Friend suggestions (friends of friends, people met at activities).
+
+    Precomputed by `flask build-friend-suggestions`. Anyone we got a
+    relationship with since the last build (request sent, now friends,
+    blocked...) is filtered out here.
+    """
+    user_id = int(get_jwt_identity())
+    limit = min(request.args.get('limit', 20, type=int), 50)
+
+    row = UserRecommendation.query.filter_by(user_id=user_id, kind='friends').first()
+    if not row or not row.item_ids:
+        return jsonify({'suggestions': []}), 200
+
+    details = dict(zip(row.item_ids, row.details or []))
+
+    related = set()
+    for a, b in db.session.query(Friendship.user_id, Friendship.friend_id).filter(
+        ((Friendship.user_id == user_id) & Friendship.friend_id.in_(row.item_ids)) |
+        ((Friendship.friend_id == user_id) & Friendship.user_id.in_(row.item_ids))
+    ):
+        related.add(b if a == user_id else a)
+
+    wanted = [uid for uid in row.item_ids if uid not in related]
+    users = {u.id: u for u in User.query.filter(
+        User.id.in_(wanted),
+        User.is_active == True,
+        User.is_ghost_mode == False,
+    )}
+
+    suggestions = []
+    for uid in wanted:
+        if uid not in users:
+            continue
+        extra = details.get(uid) or {}
+        suggestions.append({
+            'user': users[uid].to_dict(),
+            'mutual_friends': extra.get('mutual_friends', 0),
+            'shared_activities': extra.get('shared_activities', 0),
+        })
+        if len(suggestions) >= limit:
+            break
+
+    return jsonify({'suggestions': suggestions}), 200
+
+
 # ---------------------------------------------------------------------
 # Send friend request
 # ---------------------------------------------------------------------
@@ -142,6 +202,7 @@ def send_friend_request(target_user_id):
                 existing.status = 'accepted'
                 existing.accepted_at = datetime.utcnow()
                 existing.updated_at = datetime.utcnow()
+                UserRecommendation.mark_friend_suggestions_stale(user_id, target_user_id)
                 db.session.commit()
                 return jsonify({'message': 'Demande d\'ami acceptée'}), 200
             else:
@@ -194,6 +255,7 @@ def accept_friend_request(friendship_id):
     friendship.status = 'accepted'
     friendship.accepted_at = datetime.utcnow()
     friendship.updated_at = datetime.utcnow()
+    UserRecommendation.mark_friend_suggestions_stale(friendship.user_id, friendship.friend_id)
     db.session.commit()
     
     # TODO: Notify the sender
@@ -281,6 +343,8 @@ def remove_friend(friend_id):
     if not friendship:
         return jsonify({'error': 'Vous n\'êtes pas amis'}), 404
 
+    # Before the delete, so their friends get flagged too
+    UserRecommendation.mark_friend_suggestions_stale(user_id, friend_id)
     db.session.delete(friendship)
     db.session.commit()
 
@@ -315,6 +379,9 @@ def block_user(target_user_id):
         ((Friendship.user_id == target_user_id) & (Friendship.friend_id == user_id))
     ).first()
     
+    # Blocking can break a friendship - flag before it changes
+    UserRecommendation.mark_friend_suggestions_stale(user_id, target_user_id)
+
     if friendship:
         if friendship.status == 'blocked':
             # Already blocked (could be by them or us)
@@ -361,6 +428,7 @@ def unblock_user(target_user_id):
     if not friendship:
         return jsonify({'error': "Cet utilisateur n'est pas bloqué"}), 404
 
+    UserRecommendation.mark_friend_suggestions_stale(user_id, target_user_id)
     db.session.delete(friendship)
     db.session.commit()
 
@@ -431,3 +499,96 @@ def get_friendship_status(target_user_id):
         'status': status,
         'friendship_id': friendship.id
     }), 200
+
+
+# ---------------------------------------------------------------------
+# Batch status + mutual friends (profile cards, search results)
+# ---------------------------------------------------------------------
+
+MAX_STATUS_BATCH = 100
+
+
+@friends_bp.route('/status', methods=['POST'])
+@jwt_required()
+@read_only()
+def get_friendship_statuses():
+    """
+    Friendship status and mutual friend count for many users at once.
+
+    Body: {"user_ids": [1, 2, 3]}  (max 100)
+
+    One query: our own edges (all of them, so we know our friends) plus
+    accepted edges between the targets and our friends.
+    """
+    user_id = int(get_jwt_identity())
+    data = request.get_json() or {}
+
+    target_ids = data.get('user_ids')
+    if not isinstance(target_ids, list) or not all(isinstance(i, int) for i in target_ids):
+        return jsonify({'error': 'user_ids doit être une liste d\'identifiants'}), 400
+    if len(target_ids) > MAX_STATUS_BATCH:
+        return jsonify({'error': f'Maximum {MAX_STATUS_BATCH} utilisateurs par requête'}), 400
+
+    targets = set(target_ids) - {user_id}
+    if not targets:
+        return jsonify({'statuses': {}}), 200
+
+    my_friends = select(Friendship.friend_id).where(
+        Friendship.user_id == user_id, Friendship.status == 'accepted'
+    ).union(select(Friendship.user_id).where(
+        Friendship.friend_id == user_id, Friendship.status == 'accepted'
+    ))
+
+    rows = db.session.query(
+        Friendship.id, Friendship.user_id, Friendship.friend_id, Friendship.status
+    ).filter(or_(
+        Friendship.user_id == user_id,
+        Friendship.friend_id == user_id,
+        and_(
+            Friendship.status == 'accepted',
+            or_(
+                and_(Friendship.user_id.in_(targets), Friendship.friend_id.in_(my_friends)),
+                and_(Friendship.friend_id.in_(targets), Friendship.user_id.in_(my_friends)),
+            ),
+        ),
+    )).all()
+
+    mine = {}
+    friends = set()
+    for row in rows:
+        if user_id in (row.user_id, row.friend_id):
+            other = row.friend_id if row.user_id == user_id else row.user_id
+            mine[other] = row
+            if row.status == 'accepted':
+                friends.add(other)
+
+    mutual = dict.fromkeys(targets, 0)
+    for row in rows:
+        if user_id in (row.user_id, row.friend_id):
+            continue
+        if row.user_id in targets and row.friend_id in friends:
+            mutual[row.user_id] += 1
+        if row.friend_id in targets and row.user_id in friends:
+            mutual[row.friend_id] += 1
+
+    statuses = {}
+    for target_id in targets:
+        edge = mine.get(target_id)
+        if edge is None:
+            status = 'none'
+        elif edge.status == 'accepted':
+            status = 'friends'
+        elif edge.status == 'blocked':
+            status = 'blocked'
+        elif edge.status == 'pending':
+            status = 'pending_sent' if edge.user_id == user_id else 'pending_received'
+        else:
+            status = 'none'
+
+        statuses[str(target_id)] = {
+            'status': status,
+            'friendship_id': edge.id if edge is not None else None,
+            'mutual_friends': 0 if status == 'blocked' else mutual[target_id],
+        }
+
+    return jsonify({'statuses': statuses}), 200
@@ -0,0 +1,43 @@
+"""
+Health probes
+
+- GET /health         liveness (kept for the load balancers already on it)
+- GET /health/live    liveness - the process answers, nothing else checked
+- GET /health/ready   readiness - DB, pool, storage, Redis; 503 when this
+                      pod shouldn't get traffic (or is draining)
+
+Kubernetes:
+
+    livenessProbe:  {httpGet: {path: /health/live, port: 5000}}
+    readinessProbe: {httpGet: {path: /health/ready, port: 5000}, periodSeconds: 5}
+    lifecycle:
+      preStop: {exec: {command: ["sh", "-c", "touch /tmp/gocial-drain && sleep 15"]}}
+
+with HEALTH_DRAIN_FILE=/tmp/gocial-drain.
+"""
+
+from flask import Blueprint, jsonify
+
+from app.utils.health import health_checker
+
+health_bp = Blueprint('health', __name__)
+
+SERVICE = {'service': 'gocial-api', 'version': '1.0.0'}
+
+
+@health_bp.route('')
+def health_check():
+    return {'status': 'healthy', **SERVICE}
+
+
+@health_bp.route('/live')
+def liveness():
+    return {'status': 'alive', **SERVICE}
+
+
+@health_bp.route('/ready')
+def readiness():
+    payload, ready = health_checker.readiness()
+    response = jsonify({**payload, **SERVICE})
+    response.headers['Cache-Control'] = 'no-store'
+    return response, 200 if ready else 503
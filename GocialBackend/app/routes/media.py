@@ -0,0 +1,82 @@
+"""
+Upload serving - /uploads/<key>
+
+Nothing served the /uploads URLs stored in the DB, so every client hit
+ended up re-downloading (or failing on) the same pictures. This route:
+
+- marks content-addressed files (<sha256>_<variant>.webp...) immutable,
+  cached for a year - a new picture always gets a new name
+- serves everything else with a short max-age + ETag/Last-Modified, so
+  clients revalidate with a cheap 304
+- handles Range requests and If-None-Match (send_file, conditional=True)
+- lets nginx do the actual transfer when UPLOADS_ACCEL_REDIRECT is set
+  (X-Accel-Redirect to an internal location), or Apache/lighttpd with
+  USE_X_SENDFILE. Otherwise the file goes out through wsgi.file_wrapper,
+  which gunicorn turns into sendfile().
+
+With STORAGE_BACKEND=s3 the files aren't here: old /uploads URLs
+redirect to the bucket / CDN.
+
+Example nginx config for the offload:
+
+    location /protected-uploads/ {
+        internal;
+        alias /app/uploads/;
+        expires max;
+    }
+"""
+
+import mimetypes
+import os
+import posixpath
+import re
+
+from flask import Blueprint, abort, current_app, redirect, send_file
+
+from app.utils.storage import IMMUTABLE_CACHE_CONTROL, get_storage
+
+media_bp = Blueprint('media', __name__)
+
+# <32 hex>[_variant].<ext> - written once, never changed
+CONTENT_ADDRESSED = re.compile(r'^[0-9a-f]{32}(?:_[a-z]+)?\.[a-z0-9]+$')
+
+# Not for the public: half-uploaded files, direct uploads waiting for processing
+PRIVATE_PREFIXES = ('.tmp/', 'incoming/')
+
+REVALIDATE_CACHE_CONTROL = 'public, max-age=3600'
+
+
+@media_bp.route('/<path:key>', methods=['GET'])
+def serve_upload(key):
+    # Normalized first: avatars/../.tmp/x, ./.tmp/x... are .tmp/x
+    key = posixpath.normpath(key)
+    if key.startswith(('..', '/')) or f'{key}/'.startswith(PRIVATE_PREFIXES):
+        abort(404)
+
+    storage = get_storage()
+    if storage.name != 'local':
+        return redirect(storage.url(key), 301)
+
+    try:
+        path = storage.path(key)
+    except ValueError:
+        abort(404)
+
+    if not os.path.isfile(path):
+        abort(404)
+
+    accel_prefix = current_app.config.get('UPLOADS_ACCEL_REDIRECT')
+    if accel_prefix:
+        # nginx streams the file (and deals with Range/ETag) itself
+        response = current_app.response_class()
+        response.headers['X-Accel-Redirect'] = f"{accel_prefix.rstrip('/')}/{key}"
+        response.headers['Content-Type'] = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    else:
+        response = send_file(path, conditional=True, etag=True)
+
+    if CONTENT_ADDRESSED.match(os.path.basename(key)):
+        response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    else:
+        response.headers['Cache-Control'] = REVALIDATE_CACHE_CONTROL
+
+    return response
@@ -12,10 +12,27 @@ from sqlalchemy import and_, or_, func
 
 from app import db
 from app.models import User, Message, Friendship
+from app.utils import rate_limit
+from app.utils.partitions import inbox_cutoff
 
 messages_bp = Blueprint('messages', __name__)
 
 
+def _in_inbox(query):
+    """
+    Bound an inbox query (conversation list, requests, unread counts) to
+    the last MESSAGE_INBOX_MONTHS - on PostgreSQL that's partition pruning,
+    only the recent monthly partitions get scanned.
+
+    The history with one partner (/with/<id>) stays unbounded: it's
+    paginated on that pair's index, and old messages must stay readable.
+    """
+    cutoff = inbox_cutoff()
+    if cutoff is not None:
+        query = query.filter(Message.created_at >= cutoff)
+    return query
+
+
 def can_message(sender_id, recipient_id):
     """
     Check if sender is allowed to message recipient.
@@ -59,13 +76,13 @@ def get_conversations():
     # This is a bit complex - need to get distinct conversations
     
     # Get all messages involving current user
-    sent_to = db.session.query(Message.recipient_id.distinct())\
+    sent_to = _in_inbox(db.session.query(Message.recipient_id.distinct())\
         .filter(Message.sender_id == user_id)\
-        .filter(Message.deleted_by_sender == False)
+        .filter(Message.deleted_by_sender == False))
     
-    received_from = db.session.query(Message.sender_id.distinct())\
+    received_from = _in_inbox(db.session.query(Message.sender_id.distinct())\
         .filter(Message.recipient_id == user_id)\
-        .filter(Message.deleted_by_recipient == False)
+        .filter(Message.deleted_by_recipient == False))
     
     # Combine unique user IDs
     partner_ids = set()
@@ -82,7 +99,7 @@ def get_conversations():
             continue
         
         # Get last message in this conversation
-        last_msg = Message.query.filter(
+        last_msg = _in_inbox(Message.query).filter(
             ((Message.sender_id == user_id) & (Message.recipient_id == partner_id)) |
             ((Message.sender_id == partner_id) & (Message.recipient_id == user_id))
         ).filter(
@@ -96,7 +113,7 @@ def get_conversations():
             continue
         
         # Count unread messages
-        unread = Message.query.filter(
+        unread = _in_inbox(Message.query).filter(
             Message.sender_id == partner_id,
             Message.recipient_id == user_id,
             Message.is_read == False,
@@ -155,7 +172,7 @@ def get_message_requests():
     friend_ids = [f.friend_id if f.user_id == user_id else f.user_id for f in friendships]
     
     # Get messages from non-friends
-    requests = Message.query.filter(
+    requests = _in_inbox(Message.query).filter(
         Message.recipient_id == user_id,
         Message.is_request == True,
         Message.deleted_by_recipient == False,
@@ -256,6 +273,7 @@ def get_messages(partner_id):
 
 @messages_bp.route('/send/<int:recipient_id>', methods=['POST'])
 @jwt_required()
+@rate_limit(30, 60, per='user')
 def send_message(recipient_id):
     """
     Send a message to someone.
@@ -442,20 +460,21 @@ def mark_conversation_read(partner_id):
 
 @messages_bp.route('/unread-count', methods=['GET'])
 @jwt_required()
+@rate_limit(60, 60, per='user')  # polled - exempt from RATELIMIT_DEFAULT
 def get_unread_count():
     """
     Get total unread message count.
     """
     user_id = int(get_jwt_identity())
     
-    count = Message.query.filter(
+    count = _in_inbox(Message.query).filter(
         Message.recipient_id == user_id,
         Message.is_read == False,
         Message.deleted_by_recipient == False
     ).count()
     
     # Also count message requests separately
-    requests_count = Message.query.filter(
+    requests_count = _in_inbox(Message.query).filter(
         Message.recipient_id == user_id,
         Message.is_read == False,
         Message.is_request == True,
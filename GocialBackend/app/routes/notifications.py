@@ -11,10 +11,27 @@ from datetime import datetime
 
 from app import db
 from app.models import Notification, User
+from app.utils import rate_limit
+from app.utils.auth import get_current_user
+from app.utils.partitions import notification_cutoff
 
 notifications_bp = Blueprint('notifications', __name__)
 
 
+def _user_notifications(user_id):
+    """
+    Notifications of a user still inside the retention window.
+
+    The created_at bound lets PostgreSQL skip the older monthly
+    partitions entirely (they're about to be dropped anyway).
+    """
+    query = Notification.query.filter(Notification.user_id == user_id)
+    cutoff = notification_cutoff()
+    if cutoff is not None:
+        query = query.filter(Notification.created_at >= cutoff)
+    return query
+
+
 # ---------------------------------------------------------------------
 # Get notifications
 # ---------------------------------------------------------------------
@@ -34,7 +51,7 @@ def get_notifications():
     page = request.args.get('page', 1, type=int)
     per_page = min(request.args.get('per_page', 30, type=int), 100)
     
-    query = Notification.query.filter_by(user_id=user_id)
+    query = _user_notifications(user_id)
     
     if unread_only:
         query = query.filter_by(is_read=False)
@@ -90,8 +107,7 @@ def mark_all_as_read():
     """
     user_id = int(get_jwt_identity())
     
-    updated = Notification.query.filter_by(
-        user_id=user_id,
+    updated = _user_notifications(user_id).filter_by(
         is_read=False
     ).update({
         'is_read': True,
@@ -140,7 +156,7 @@ def clear_all_notifications():
     """
     user_id = int(get_jwt_identity())
     
-    deleted = Notification.query.filter_by(user_id=user_id).delete()
+    deleted = _user_notifications(user_id).delete()
     db.session.commit()
     
     return jsonify({
@@ -155,6 +171,7 @@ def clear_all_notifications():
 
 @notifications_bp.route('/unread-count', methods=['GET'])
 @jwt_required()
+@rate_limit(60, 60, per='user')  # polled - exempt from RATELIMIT_DEFAULT
 def get_unread_count():
     """
     Get the number of unread notifications.
@@ -163,8 +180,7 @@ def get_unread_count():
     """
     user_id = int(get_jwt_identity())
     
-    count = Notification.query.filter_by(
-        user_id=user_id,
+    count = _user_notifications(user_id).filter_by(
         is_read=False
     ).count()
     
@@ -243,13 +259,12 @@ def update_fcm_token():
     """
     Update the user's FCM token for push notifications.
     """
-    user_id = int(get_jwt_identity())
     data = request.get_json()
 
     if not data or not data.get('token'):
         return jsonify({'error': 'Le token est requis'}), 400
 
-    user = User.query.get(user_id)
+    user = get_current_user()
     if not user:
         return jsonify({'error': 'Utilisateur introuvable'}), 404
 
@@ -0,0 +1,376 @@
+"""
+Resumable upload routes
+
+For big pictures on bad mobile networks: instead of one multipart POST
+that starts over from zero when the connection drops, the client opens
+an upload session, sends the raw bytes in chunks and asks where it got
+to after a failure.
+
+    POST   /api/uploads/                {purpose, size, activity_id?} -> session
+    GET    /api/uploads/<id>            current offset (also in Upload-Offset)
+    PATCH  /api/uploads/<id>            raw chunk, Upload-Offset header required
+    POST   /api/uploads/<id>/complete   run the image pipeline, apply the result
+    DELETE /api/uploads/<id>            give up
+
+Sessions live on the local disk of the container that created them
+(UPLOAD_FOLDER/.tmp/sessions), so they only exist with
+STORAGE_BACKEND=local - a single box. With s3 the API runs on several
+containers and a chunk could land on one that never saw the session:
+POST /api/uploads/ answers 409 direct_upload_required, and clients use
+the direct uploads below (the bucket itself handles the bytes).
+
+Direct uploads skip the API for the bytes: the client gets a presigned
+request (S3 POST, or a signed PUT on the API with local storage), sends
+the file to storage itself, then tells us it's there.
+
+    POST   /api/uploads/direct          {purpose, size, content_type, activity_id?}
+    POST   /api/uploads/direct/complete {upload_token}
+
+purpose is 'avatar' or 'activity' (then activity_id is required and the
+caller must be the host). The result is the same as the matching
+multipart route.
+"""
+
+import uuid
+from contextlib import closing
+
+from flask import Blueprint, request, jsonify, current_app
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+
+from app import db
+from app.models import User, Activity
+from app.utils import rate_limit
+from app.utils.images import InvalidImage, image_pipeline, restore_url, variant_urls
+from app.utils.storage import get_storage
+from app.utils.uploads import (
+    UploadSession, UploadSessionError, UploadTooLarge,
+    limit_upload_size, max_upload_bytes, stage_stream, too_large_response,
+)
+
+uploads_bp = Blueprint('uploads', __name__)
+
+PURPOSES = ('avatar', 'activity')
+CONTENT_TYPES = ('image/jpeg', 'image/png', 'image/gif', 'image/webp')
+
+
+def _get_session(upload_id, user_id):
+    """The caller's session, or None (someone else's looks like a missing one)."""
+    session = UploadSession.load(upload_id)
+    if session is None or session.user_id != user_id:
+        return None
+    return session
+
+
+def _offset_response(session, status=200):
+    response = jsonify(session.to_public_dict())
+    response.status_code = status
+    response.headers['Upload-Offset'] = str(session.offset)
+    response.headers['Upload-Length'] = str(session.size)
+    return response
+
+
+def _check_request(user_id, data):
+    """
+    Validate {purpose, size, activity_id} for a new upload.
+
+    Returns (purpose, size, target_id, None) or (..., error response).
+    """
+    purpose = data.get('purpose')
+    if purpose not in PURPOSES:
+        return None, None, None, (jsonify({'error': 'Type d\'upload invalide'}), 400)
+
+    try:
+        size = int(data.get('size'))
+    except (TypeError, ValueError):
+        size = 0
+
+    if size <= 0:
+        return None, None, None, (jsonify({'error': 'Taille requise'}), 400)
+
+    if size > max_upload_bytes():
+        return None, None, None, too_large_response(max_upload_bytes())
+
+    target_id = None
+    if purpose == 'activity':
+        try:
+            activity_id = int(data.get('activity_id'))
+        except (TypeError, ValueError):
+            return None, None, None, (jsonify({'error': 'activity_id requis'}), 400)
+
+        activity = Activity.query.get(activity_id)
+        if not activity:
+            return None, None, None, (jsonify({'error': 'Activité introuvable'}), 404)
+        if activity.host_id != user_id:
+            return None, None, None, (jsonify({'error': 'Non autorisé'}), 403)
+        target_id = activity.id
+
+    return purpose, size, target_id, None
+
+
+def _apply_image(user_id, purpose, target_id, staged):
+    """Run a staged file through the image pipeline and point the avatar / activity at it."""
+    if purpose == 'avatar':
+        target = User.query.get(user_id)
+        column, subfolder, key = 'avatar_url', 'avatars', 'avatar'
+    else:
+        target = Activity.query.get(target_id)
+        column, subfolder, key = 'image_url', 'activities', 'image'
+        if target is not None and target.host_id != user_id:
+            target = None
+
+    if target is None:
+        staged.discard()
+        return jsonify({'error': 'Ressource introuvable'}), 404
+
+    try:
+        url = image_pipeline.process(
+            staged, subfolder,
+            on_failure=restore_url(type(target), target.id, column, getattr(target, column)),
+        )
+    except InvalidImage as e:
+        return jsonify({'error': str(e)}), 400
+
+    setattr(target, column, url)
+
+    try:
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f'Upload for {purpose} {target.id} failed: {e}')
+        return jsonify({'error': "Échec de la mise à jour de l'image"}), 500
+
+    return jsonify({
+        'message': 'Image mise à jour',
+        f'{key}_url': url,
+        f'{key}_variants': variant_urls(url),
+    }), 200
+
+
+def _token_serializer():
+    return URLSafeTimedSerializer(current_app.config['SECRET_KEY'], salt='direct-upload')
+
+
+# ---------------------------------------------------------------------
+# Open a session
+# ---------------------------------------------------------------------
+
+@uploads_bp.route('/', methods=['POST'])
+@jwt_required()
+@rate_limit(30, 3600, per='user')
+def create_upload():
+    """
+    Start a resumable upload.
+
+    Body: {purpose: 'avatar' | 'activity', size: <bytes>, activity_id?}
+    """
+    user_id = int(get_jwt_identity())
+
+    # Sessions are on this container's disk - see the module docstring
+    if get_storage().name != 'local':
+        return jsonify({
+            'error': 'Upload par morceaux indisponible, utilisez /api/uploads/direct',
+            'code': 'direct_upload_required',
+        }), 409
+
+    purpose, size, target_id, error = _check_request(user_id, request.get_json() or {})
+    if error is not None:
+        return error
+
+    session = UploadSession.create(user_id, purpose, size, target_id)
+
+    response = _offset_response(session, 201)
+    response.headers['Location'] = f'/api/uploads/{session.id}'
+    return response
+
+
+# ---------------------------------------------------------------------
+# Where am I?
+# ---------------------------------------------------------------------
+
+@uploads_bp.route('/<upload_id>', methods=['GET'])
+@jwt_required()
+def get_upload(upload_id):
+    """Current offset - what the client calls after a dropped connection."""
+    session = _get_session(upload_id, int(get_jwt_identity()))
+    if session is None:
+        return jsonify({'error': 'Upload introuvable'}), 404
+
+    return _offset_response(session)
+
+
+# ---------------------------------------------------------------------
+# Send a chunk
+# ---------------------------------------------------------------------
+
+@uploads_bp.route('/<upload_id>', methods=['PATCH'])
+@jwt_required()
+@limit_upload_size()
+def upload_chunk(upload_id):
+    """
+    Append a chunk. The body is the raw bytes (no multipart), read
+    straight from the socket to disk.
+
+    Upload-Offset must match the current offset, otherwise 409 with the
+    offset to resume from.
+    """
+    session = _get_session(upload_id, int(get_jwt_identity()))
+    if session is None:
+        return jsonify({'error': 'Upload introuvable'}), 404
+
+    try:
+        offset = int(request.headers['Upload-Offset'])
+    except (KeyError, ValueError):
+        return jsonify({'error': 'En-tête Upload-Offset requis'}), 400
+
+    if request.content_length is not None and offset + request.content_length > session.size:
+        return jsonify({'error': 'Le morceau dépasse la taille annoncée'}), 413
+
+    try:
+        session.append(offset, request.stream)
+    except UploadSessionError as e:
+        response = jsonify({'error': str(e), 'offset': e.offset})
+        response.status_code = 409
+        response.headers['Upload-Offset'] = str(e.offset)
+        return response
+
+    return _offset_response(session)
+
+
+# ---------------------------------------------------------------------
+# Finish
+# ---------------------------------------------------------------------
+
+@uploads_bp.route('/<upload_id>/complete', methods=['POST'])
+@jwt_required()
+def complete_upload(upload_id):
+    """Run the received file through the image pipeline and apply it."""
+    user_id = int(get_jwt_identity())
+
+    session = _get_session(upload_id, user_id)
+    if session is None:
+        return jsonify({'error': 'Upload introuvable'}), 404
+
+    if not session.complete:
+        return _offset_response(session, 409)
+
+    try:
+        staged = session.finish()
+    except UploadSessionError as e:
+        return jsonify({'error': str(e)}), 409
+
+    return _apply_image(user_id, session.purpose, session.target_id, staged)
+
+
+# ---------------------------------------------------------------------
+# Cancel
+# ---------------------------------------------------------------------
+
+@uploads_bp.route('/<upload_id>', methods=['DELETE'])
+@jwt_required()
+def cancel_upload(upload_id):
+    session = _get_session(upload_id, int(get_jwt_identity()))
+    if session is None:
+        return jsonify({'error': 'Upload introuvable'}), 404
+
+    session.delete()
+    return jsonify({'message': 'Upload annulé'}), 200
+
+
+# ---------------------------------------------------------------------
+# Direct uploads
+# ---------------------------------------------------------------------
+
+@uploads_bp.route('/direct', methods=['POST'])
+@jwt_required()
+@rate_limit(30, 3600, per='user')
+def create_direct_upload():
+    """
+    Presign an upload straight to storage.
+
+    Body: {purpose, size, content_type, activity_id?}
+    Returns {upload: {method, url, fields, headers}, upload_token}: send
+    the file as described in upload, then POST upload_token to
+    /direct/complete.
+    """
+    user_id = int(get_jwt_identity())
+    data = request.get_json() or {}
+
+    purpose, size, target_id, error = _check_request(user_id, data)
+    if error is not None:
+        return error
+
+    content_type = data.get('content_type')
+    if content_type not in CONTENT_TYPES:
+        return jsonify({'error': 'Type de fichier non autorisé (JPEG, PNG, GIF, WebP acceptés)'}), 400
+
+    storage = get_storage()
+    key = f'incoming/{user_id}/{uuid.uuid4().hex}'
+
+    return jsonify({
+        'upload': storage.presign_upload(key, content_type, max_upload_bytes()),
+        'upload_token': _token_serializer().dumps({
+            'user_id': user_id, 'purpose': purpose, 'target_id': target_id, 'key': key,
+        }),
+        'expires_in': storage.presign_seconds,
+    }), 201
+
+
+@uploads_bp.route('/direct/<token>', methods=['PUT'])
+def put_direct(token):
+    """
+    Local storage stand-in for a presigned URL: the signed token is the
+    authorization, like on S3. The body is streamed to disk.
+    """
+    storage = get_storage()
+    signed = storage.verify_upload(token)
+    if signed is None:
+        return jsonify({'error': 'Lien d\'upload invalide ou expiré'}), 403
+
+    key, content_type, max_bytes = signed
+
+    if request.content_length is not None and request.content_length > max_bytes:
+        return too_large_response(max_bytes)
+
+    try:
+        staged = stage_stream(request.stream, max_bytes)
+    except UploadTooLarge as e:
+        return too_large_response(e.max_bytes)
+
+    storage.put_file(staged.path, key, content_type)
+    return '', 204
+
+
+@uploads_bp.route('/direct/complete', methods=['POST'])
+@jwt_required()
+def complete_direct_upload():
+    """The client says the file is in storage - process it."""
+    user_id = int(get_jwt_identity())
+    token = (request.get_json() or {}).get('upload_token', '')
+
+    try:
+        signed = _token_serializer().loads(
+            token, max_age=current_app.config.get('UPLOAD_SESSION_HOURS', 24) * 3600,
+        )
+    except BadSignature:
+        signed = None
+
+    if signed is None or signed['user_id'] != user_id:
+        return jsonify({'error': 'Upload introuvable'}), 404
+
+    storage = get_storage()
+    if not storage.exists(signed['key']):
+        return jsonify({'error': 'Fichier pas encore reçu'}), 409
+
+    # The pipeline needs the bytes locally anyway (rendering) - pull them
+    # once, then drop the incoming copy
+    try:
+        with closing(storage.open(signed['key'])) as source:
+            staged = stage_stream(source)
+    except UploadTooLarge as e:
+        storage.delete(signed['key'])
+        return too_large_response(e.max_bytes)
+
+    storage.delete(signed['key'])
+
+    return _apply_image(user_id, signed['purpose'], signed['target_id'], staged)
@@ -8,12 +8,15 @@ Basically everything user-related that isn't auth.
 from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from datetime import datetime
-import os
-from werkzeug.utils import secure_filename
 
 from app import db
-from app.models import User, Activity, Friendship, Evaluation
-from sqlalchemy import func
+from app.models import User, Activity, Friendship, UserRatingAggregate
+from app.models.social import rating_summary
+from app.utils.auth import get_current_user, user_flags
+from app.utils.images import InvalidImage, image_pipeline, restore_url, variant_urls
+from app.utils.revocation import reissue_access_token, revocations
+from app.utils.uploads import UploadTooLarge, limit_upload_size, stage_stream, too_large_response
+from sqlalchemy.orm import joinedload
 
 users_bp = Blueprint('users', __name__)
 
@@ -52,7 +55,8 @@ def get_user(user_id):
     response = {
         'user': user.to_dict(
             include_private=is_own_profile,
-            include_settings=is_own_profile
+            include_settings=is_own_profile,
+            include_rating=True
         )
     }
     
@@ -90,10 +94,12 @@ def update_profile():
     if not data:
         return jsonify({'error': 'Aucune donnée fournie'}), 400
 
-    user = User.query.get(user_id)
+    user = get_current_user()
     if not user:
         return jsonify({'error': 'Utilisateur introuvable'}), 404
     
+    flags_before = user_flags(user)
+    
     # Fields that can be updated
     allowed_fields = [
         'email', 'first_name', 'last_name', 'pseudo', 'phone', 'gender',
@@ -161,10 +167,16 @@ def update_profile():
         current_app.logger.error(f'Profile update failed: {e}')
         return jsonify({'error': 'Échec de la mise à jour'}), 500
 
-    return jsonify({
+    response = {
         'message': 'Profil mis à jour',
         'user': user.to_dict(include_private=True, include_settings=True)
-    }), 200
+    }
+    
+    # girls_only_mode lives in the token - old one is now rejected, hand out a new one
+    if user_flags(user) != flags_before:
+        response['access_token'] = reissue_access_token(user)
+    
+    return jsonify(response), 200
 
 
 # ---------------------------------------------------------------------
@@ -173,14 +185,16 @@ def update_profile():
 
 @users_bp.route('/profile/avatar', methods=['POST'])
 @jwt_required()
+@limit_upload_size()
 def upload_avatar():
     """
     Upload a new profile picture.
     
-    Accepts multipart/form-data with 'file' field.
+    Accepts multipart/form-data with 'file' field. The type is checked
+    from the file content; resized WebP variants are generated in the
+    background (see app/utils/images.py).
     """
-    user_id = int(get_jwt_identity())
-    user = User.query.get(user_id)
+    user = get_current_user()
 
     if not user:
         return jsonify({'error': 'Utilisateur introuvable'}), 404
@@ -196,30 +210,23 @@ def upload_avatar():
     if not allowed_file(file.filename):
         return jsonify({'error': 'Type de fichier non autorisé'}), 400
     
-    # Generate safe filename
-    ext = file.filename.rsplit('.', 1)[1].lower()
-    filename = f'avatar_{user_id}_{int(datetime.utcnow().timestamp())}.{ext}'
-    filename = secure_filename(filename)
-    
-    # Get upload folder
-    upload_folder = current_app.config.get('UPLOAD_FOLDER', 'uploads')
-    avatar_folder = os.path.join(upload_folder, 'avatars')
-    
-    # Create folder if it doesn't exist
-    os.makedirs(avatar_folder, exist_ok=True)
-    
-    # Save file
-    filepath = os.path.join(avatar_folder, filename)
-    file.save(filepath)
+    try:
+        avatar_url = image_pipeline.process(
+            stage_stream(file.stream), 'avatars',
+            on_failure=restore_url(User, user.id, 'avatar_url', user.avatar_url),
+        )
+    except UploadTooLarge as e:
+        return too_large_response(e.max_bytes)
+    except InvalidImage as e:
+        return jsonify({'error': str(e)}), 400
     
-    # Update user avatar URL
-    # In production, this would be a CDN URL
-    user.avatar_url = f'/uploads/avatars/{filename}'
+    user.avatar_url = avatar_url
     db.session.commit()
     
     return jsonify({
         'message': 'Avatar mis à jour',
-        'avatar_url': user.avatar_url
+        'avatar_url': user.avatar_url,
+        'avatar_variants': variant_urls(user.avatar_url),
     }), 200
 
 
@@ -273,6 +280,9 @@ def search_users():
     if city:
         query = query.filter(User.city.ilike(f'%{city}%'))
     
+    # Ratings come with the users (one join, no query per user)
+    query = query.options(joinedload(User.rating_aggregate))
+    
     # Order by verified first, then recent activity
     query = query.order_by(
         User.is_verified.desc(),
@@ -283,7 +293,7 @@ def search_users():
     pagination = query.paginate(page=page, per_page=per_page, error_out=False)
     
     return jsonify({
-        'users': [u.to_dict() for u in pagination.items],
+        'users': [u.to_dict(include_rating=True) for u in pagination.items],
         'total': pagination.total,
         'pages': pagination.pages,
         'current_page': page,
@@ -347,10 +357,9 @@ def deactivate_account():
     """
     Soft-delete account. Can be reactivated later.
     """
-    user_id = int(get_jwt_identity())
     data = request.get_json() or {}
 
-    user = User.query.get(user_id)
+    user = get_current_user()
     if not user:
         return jsonify({'error': 'Utilisateur introuvable'}), 404
 
@@ -362,6 +371,10 @@ def deactivate_account():
     user.is_active = False
     db.session.commit()
 
+    # Logged out everywhere - access tokens never hit the DB, and this
+    # also catches refreshes racing the commit above
+    revocations.revoke_user(user.id)
+
     return jsonify({'message': 'Compte désactivé'}), 200
 
 
@@ -380,7 +393,7 @@ def delete_account():
     user_id = int(get_jwt_identity())
     data = request.get_json() or {}
 
-    user = User.query.get(user_id)
+    user = get_current_user()
     if not user:
         return jsonify({'error': 'Utilisateur introuvable'}), 404
 
@@ -402,6 +415,8 @@ def delete_account():
         current_app.logger.error(f'Account deletion failed: {e}')
         return jsonify({'error': 'Échec de la suppression'}), 500
 
+    revocations.revoke_user(user_id)
+
     return jsonify({'message': 'Compte supprimé définitivement'}), 200
 
 
@@ -415,7 +430,9 @@ def get_user_rating(user_id):
     """
     Get the average rating for a user across all activities.
 
-    Returns avg_rating (1-5) and total number of evaluations received.
+    Returns avg_rating (1-5), total number of evaluations received,
+    per-star histogram and no_show_rate (share of evaluations where the
+    user didn't show up).
     """
     int(get_jwt_identity())  # Auth check
 
@@ -423,16 +440,7 @@ def get_user_rating(user_id):
     if not user:
         return jsonify({'error': 'Utilisateur introuvable'}), 404
 
-    result = db.session.query(
-        func.avg(Evaluation.rating),
-        func.count(Evaluation.id)
-    ).filter(Evaluation.evaluated_id == user_id).first()
+    # Precomputed, archived evaluations included (UserRatingAggregate)
+    summary = rating_summary(db.session.get(UserRatingAggregate, user_id))
 
-    avg_rating = round(float(result[0]), 1) if result[0] else None
-    total_evaluations = result[1] or 0
-
-    return jsonify({
-        'user_id': user_id,
-        'avg_rating': avg_rating,
-        'total_evaluations': total_evaluations
-    }), 200
+    return jsonify({'user_id': user_id, **summary}), 200
@@ -7,14 +7,16 @@ Random stuff that doesn't fit anywhere else.
 
 import re
 from functools import wraps
+from math import radians, cos, sin, asin, sqrt
 from flask import jsonify, request
-from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity
+from flask_jwt_extended import verify_jwt_in_request
 
-from app.models import User
+from app.utils.auth import get_current_user
+from app.utils.ratelimit import limit_route
 
 
 # ---------------------------------------------------------------------
-# Validators
+# Validators & geo
 # ---------------------------------------------------------------------
 
 def is_valid_email(email):
@@ -77,6 +79,21 @@ def is_valid_pseudo(pseudo):
     return True, None
 
 
+def haversine(lon1, lat1, lon2, lat2):
+    """
+    Calculate distance in km between two points.
+    The classic haversine formula.
+    """
+    lon1, lat1, lon2, lat2 = map(radians, [lon1, lat1, lon2, lat2])
+    
+    dlon = lon2 - lon1
+    dlat = lat2 - lat1
+    a = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlon/2)**2
+    c = 2 * asin(sqrt(a))
+    
+    return 6371 * c  # Earth radius in km
+
+
 # ---------------------------------------------------------------------
 # Decorators
 # ---------------------------------------------------------------------
@@ -86,13 +103,15 @@ def verified_required(f):
     Decorator that requires the current user to be verified.
     
     Use on routes that need verified accounts (like creating activities).
+    Checked against the user row, not the token claim - a claim can lag
+    behind a change made on another worker or straight in the database.
+    The row is cached for the request, so the route gets it for free.
     """
     @wraps(f)
     def decorated(*args, **kwargs):
         verify_jwt_in_request()
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
         
+        user = get_current_user()
         if not user:
             return jsonify({'error': 'User not found'}), 404
         
@@ -107,18 +126,17 @@ def admin_required(f):
     """
     Decorator that requires admin privileges.
     
-    For moderation and admin panel stuff.
+    For moderation and admin panel stuff. Same as verified_required:
+    the user row decides, never the token.
     """
     @wraps(f)
     def decorated(*args, **kwargs):
         verify_jwt_in_request()
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
         
+        user = get_current_user()
         if not user:
             return jsonify({'error': 'User not found'}), 404
         
-        # You'd add an is_admin field to User model for real
         if not getattr(user, 'is_admin', False):
             return jsonify({'error': 'Admin access required'}), 403
         
@@ -126,21 +144,15 @@ def admin_required(f):
     return decorated
 
 
-def rate_limit(max_requests, window_seconds=60):
+def rate_limit(max_requests, window_seconds=60, per='ip'):
     """
-    Simple rate limiting decorator.
+    Rate limiting decorator.
     
-    In production you'd use something like Flask-Limiter with Redis.
-    This is just a placeholder that always allows.
+    per='ip' for anonymous endpoints (login, register...), per='user' for
+    authenticated ones - put it under @jwt_required(). No-op when
+    RATELIMIT_ENABLED is off. See app/utils/ratelimit.py for the details.
     """
-    def decorator(f):
-        @wraps(f)
-        def decorated(*args, **kwargs):
-            # TODO: Implement actual rate limiting with Redis
-            # For now just pass through
-            return f(*args, **kwargs)
-        return decorated
-    return decorator
+    return limit_route(max_requests, window_seconds, per=per)
 
 
 # ---------------------------------------------------------------------
@@ -0,0 +1,168 @@
+"""
+Activity archiver - `flask archive-activities`
+
+Finished activities, with their participations, likes and evaluations,
+used to stay in the hot tables forever and every feed index carried
+them. This moves activities that ended before the cutoff (ARCHIVE_AFTER_MONTHS
+ago, whole months) into archived_activities - see app/models/archive.py:
+
+- keyset batches of ARCHIVE_BATCH_SIZE activities, oldest id first,
+  read with a handful of IN queries - memory is bounded by the batch
+- each batch is one short transaction: archive rows written, rating
+  summaries bumped and hot rows deleted together. Kill it at any point
+  and nothing is lost or duplicated; the next run simply carries on
+  with what's still in the hot tables
+- evaluations leave the hot table too; what they add to each user's
+  rating goes to archived_user_ratings
+
+Anything that ended before the cutoff counts as finished (completed,
+cancelled, or just past - nothing flips the status to completed).
+Messages and reports keep pointing at archived ids, and
+GET /api/activities/<id> falls back to the archive.
+"""
+
+from collections import defaultdict, namedtuple
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import delete, func, select
+
+from app import db
+from app.models import Activity, ActivityLike, Evaluation, Participation
+from app.models.archive import ArchivedActivity, ArchivedUserRating, dump_row
+from app.utils.partitions import retention_cutoff
+
+
+ArchiveStats = namedtuple('ArchiveStats', 'activities participations likes evaluations')
+
+# Child tables moved with their activity: ArchivedActivity attribute -> model
+CHILDREN = (
+    ('participations', Participation),
+    ('likes', ActivityLike),
+    ('evaluations', Evaluation),
+)
+
+
+def archive_cutoff(months=None, now=None):
+    """Activities that ended before this are archived (None = archiving off)."""
+    if months is None:
+        months = current_app.config.get('ARCHIVE_AFTER_MONTHS', 0)
+    return retention_cutoff(months, now)
+
+
+def _finished_before(cutoff):
+    return func.coalesce(Activity.end_date, Activity.date) < cutoff
+
+
+def archive_activities(months=None, batch_size=None, dry_run=False, now=None, progress=None):
+    """
+    Archive every activity that ended before the cutoff.
+
+    progress: optional callable(ArchiveStats so far), called after each batch.
+    Returns ArchiveStats (what would be archived, with dry_run).
+    """
+    cutoff = archive_cutoff(months, now)
+    if cutoff is None:
+        return ArchiveStats(0, 0, 0, 0)
+    batch_size = batch_size or current_app.config.get('ARCHIVE_BATCH_SIZE', 500)
+
+    totals = ArchiveStats(0, 0, 0, 0)
+    last_id = 0
+
+    while True:
+        ids = db.session.scalars(
+            select(Activity.id)
+            .where(Activity.id > last_id, _finished_before(cutoff))
+            .order_by(Activity.id)
+            .limit(batch_size)
+        ).all()
+        if not ids:
+            break
+
+        if dry_run:
+            stats = _count_batch(ids)
+            db.session.rollback()
+        else:
+            stats = _archive_batch(ids)
+            db.session.commit()
+
+        totals = ArchiveStats(*(a + b for a, b in zip(totals, stats)))
+        last_id = ids[-1]
+        if progress:
+            progress(totals)
+
+    return totals
+
+
+def _count_batch(ids):
+    counts = [
+        db.session.scalar(select(func.count()).select_from(model).where(model.activity_id.in_(ids)))
+        for _, model in CHILDREN
+    ]
+    return ArchiveStats(len(ids), *counts)
+
+
+def _archive_batch(ids):
+    """Move one batch (caller commits)."""
+    # Plain table rows rather than ORM objects: nothing stale is left in
+    # the session once the bulk deletes below have run
+    children = {}
+    for attribute, model in CHILDREN:
+        grouped = defaultdict(list)
+        for row in _rows(model, model.activity_id.in_(ids)):
+            grouped[row['activity_id']].append(row)
+        children[attribute] = grouped
+
+    activities = _rows(Activity, Activity.id.in_(ids))
+    now = datetime.utcnow()
+
+    for activity in activities:
+        db.session.add(ArchivedActivity(
+            id=activity['id'],
+            host_id=activity['host_id'],
+            status=activity['status'],
+            date=activity['date'],
+            image_url=activity['image_url'],
+            archived_at=now,
+            activity=dump_row(activity),
+            **{
+                attribute: [dump_row(row) for row in grouped[activity['id']]]
+                for attribute, grouped in children.items()
+            },
+        ))
+
+    evaluations = [ev for rows in children['evaluations'].values() for ev in rows]
+    _add_to_rating_summaries(evaluations)
+
+    # Children first (foreign keys), all in the same transaction as the inserts
+    for _, model in CHILDREN:
+        db.session.execute(delete(model).where(model.activity_id.in_(ids)))
+    db.session.execute(delete(Activity).where(Activity.id.in_(ids)))
+
+    return ArchiveStats(
+        len(activities),
+        *(sum(len(rows) for rows in children[attribute].values()) for attribute, _ in CHILDREN),
+    )
+
+
+def _rows(model, criterion):
+    return db.session.execute(select(model.__table__).where(criterion)).mappings().all()
+
+
+def _add_to_rating_summaries(evaluations):
+    user_ids = {ev['evaluated_id'] for ev in evaluations}
+    if not user_ids:
+        return
+
+    summaries = {
+        summary.user_id: summary
+        for summary in db.session.scalars(
+            select(ArchivedUserRating).where(ArchivedUserRating.user_id.in_(user_ids))
+        )
+    }
+    for ev in evaluations:
+        summary = summaries.get(ev['evaluated_id'])
+        if summary is None:
+            summary = summaries[ev['evaluated_id']] = ArchivedUserRating(user_id=ev['evaluated_id'])
+            db.session.add(summary)
+        summary.add(ev['rating'], ev['was_present'])
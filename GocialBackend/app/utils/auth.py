@@ -0,0 +1,213 @@
+"""
+Current user & JWT claims
+
+Most routes need "who's calling" and a couple of flags. Before this,
+every route (and every decorator on top of it) did its own
+User.query.get(get_jwt_identity()) - two or three identical SELECTs
+for one request.
+
+- get_current_user() loads the caller once per request (cached on g),
+  and is also what flask_jwt_extended's current_user resolves to
+- hot flags (HOT_FLAGS) travel inside the access token as a 'flags'
+  claim, for hot paths that only need a preference (girls_only_mode on
+  the feed). Authorization (verified_required, admin_required) always
+  reads the user row: the claim is only as fresh as the token
+- when one of those flags changes, tokens carrying the old values are
+  rejected (401 token_revoked) - the client refreshes and gets the new
+  ones. Best effort: without Redis only the worker that made the change
+  knows, and CLI / raw SQL changes go unnoticed
+
+Tokens are minted with identity=user (issue_tokens / reissue_access_token
+in app/utils/revocation.py) so the claims loader can read the flags
+straight off the object, no extra query.
+"""
+
+import json
+import threading
+import time
+
+from flask import g
+from flask_jwt_extended import get_jwt, get_jwt_identity
+from sqlalchemy import event, inspect
+from werkzeug.local import LocalProxy
+
+from app import db, jwt
+from app.models import User
+from app.utils.redis_client import get_redis
+from app.utils.revocation import revocations
+
+
+# Flags checked on hot paths - carried in the access token
+HOT_FLAGS = ('is_admin', 'is_verified', 'girls_only_mode')
+
+
+# ---------------------------------------------------------------------
+# Current user
+# ---------------------------------------------------------------------
+
+def get_current_user():
+    """
+    The authenticated User for this request, or None.
+
+    One SELECT per request at most, whoever asks first.
+    """
+    if '_current_user' not in g:
+        identity = get_jwt_identity()
+        g._current_user = db.session.get(User, int(identity)) if identity is not None else None
+    return g._current_user
+
+
+def current_user_flag(name):
+    """
+    Read a hot flag of the caller, from the token when possible.
+
+    Older tokens (no 'flags' claim) fall back to the user row.
+    """
+    from app.utils.metrics import metrics
+
+    flags = get_jwt().get('flags')
+    if flags is not None and name in flags:
+        metrics.record_cache('jwt_flags', True)
+        return bool(flags[name])
+
+    metrics.record_cache('jwt_flags', False)
+    user = get_current_user()
+    return bool(user is not None and getattr(user, name, False))
+
+
+def user_flags(user):
+    """Snapshot of the hot flags of a user, as stored in the token."""
+    return {name: bool(getattr(user, name, False)) for name in HOT_FLAGS}
+
+
+# ---------------------------------------------------------------------
+# Flag changes
+# ---------------------------------------------------------------------
+
+class FlagChanges:
+    """
+    Remembers the current flags of users whose flags changed recently.
+
+    Entries live as long as an access token does: after that, every
+    token carrying the old values has expired anyway. In-memory per
+    process, or shared through Redis when configured.
+    """
+
+    KEY = 'auth:flags:{user_id}'
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flags = {}
+        self._redis = None
+        self.ttl = 3600
+
+    def init_app(self, app):
+        expires = app.config.get('JWT_ACCESS_TOKEN_EXPIRES')
+        self.ttl = int(expires.total_seconds()) if expires else 3600
+        self._redis = get_redis(app)
+        with self._lock:
+            self._flags.clear()
+
+    def record(self, user_id, flags):
+        if self._redis is not None:
+            try:
+                self._redis.set(self.KEY.format(user_id=user_id), json.dumps(flags), ex=self.ttl)
+                return
+            except Exception:
+                pass
+
+        now = time.monotonic()
+        with self._lock:
+            self._flags = {k: v for k, v in self._flags.items() if v[1] > now}
+            self._flags[user_id] = (flags, now + self.ttl)
+
+    def current(self, user_id):
+        """Latest flags if they changed recently, else None."""
+        if self._redis is not None:
+            try:
+                raw = self._redis.get(self.KEY.format(user_id=user_id))
+                if raw is not None:
+                    return json.loads(raw)
+            except Exception:
+                pass
+
+        entry = self._flags.get(user_id)
+        if entry and entry[1] > time.monotonic():
+            return entry[0]
+        return None
+
+
+flag_changes = FlagChanges()
+
+
+def has_stale_flags(jwt_payload):
+    """True if an access token carries flags that changed since it was issued."""
+    if jwt_payload.get('type') != 'access' or 'flags' not in jwt_payload:
+        return False
+
+    latest = flag_changes.current(int(jwt_payload['sub']))
+    return latest is not None and latest != jwt_payload['flags']
+
+
+def _collect_flag_changes(session, flush_context, instances):
+    """before_flush: note users whose hot flags are about to change."""
+    for obj in session.dirty:
+        if not isinstance(obj, User):
+            continue
+        state = inspect(obj)
+        if any(state.attrs[name].history.has_changes() for name in HOT_FLAGS):
+            session.info.setdefault('flag_changes', {})[obj.id] = user_flags(obj)
+
+
+def _publish_flag_changes(session):
+    """after_commit: the change is real now, invalidate old tokens."""
+    for user_id, flags in session.info.pop('flag_changes', {}).items():
+        flag_changes.record(user_id, flags)
+
+
+def _discard_flag_changes(session):
+    session.info.pop('flag_changes', None)
+
+
+# ---------------------------------------------------------------------
+# Wiring
+# ---------------------------------------------------------------------
+
+def init_auth(app):
+    """Bind the token stores and the flag-change listeners (loaders below register on import)."""
+    flag_changes.init_app(app)
+    revocations.init_app(app)
+
+    # db.session is shared by every app instance - listen only once
+    if not event.contains(db.session, 'before_flush', _collect_flag_changes):
+        event.listen(db.session, 'before_flush', _collect_flag_changes)
+        event.listen(db.session, 'after_commit', _publish_flag_changes)
+        event.listen(db.session, 'after_rollback', _discard_flag_changes)
+
+
+@jwt.user_identity_loader
+def _identity(identity):
+    """Accept a User or an id; the 'sub' claim is always a string."""
+    if isinstance(identity, User):
+        return str(identity.id)
+    return str(identity)
+
+
+@jwt.additional_claims_loader
+def _claims(identity):
+    """Embed hot flags when the token is minted from a User object."""
+    if isinstance(identity, User):
+        return {'flags': user_flags(identity)}
+    return {}
+
+
+@jwt.user_lookup_loader
+def _lookup(jwt_header, jwt_payload):
+    """Lazy: flask_jwt_extended.current_user only hits the DB when used."""
+    return LocalProxy(get_current_user)
+
+
+@jwt.token_in_blocklist_loader
+def _is_revoked(jwt_header, jwt_payload):
+    """Runs on every authenticated request - in-memory / Redis lookups only."""
+    return revocations.is_revoked(jwt_payload) or has_stale_flags(jwt_payload)
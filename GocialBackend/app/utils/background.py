@@ -0,0 +1,59 @@
+"""
+Background helpers
+
+Tiny in-process scheduler for the "buffer in memory, flush every N seconds"
+jobs (view counters, presence, etc.). No Celery needed for that kind of stuff.
+
+Each gunicorn worker runs its own threads - that's fine since every job
+here is written to be safe when several workers flush at the same time.
+"""
+
+import atexit
+import threading
+
+
+class PeriodicWorker:
+    """
+    Run a callable every `interval` seconds on a daemon thread.
+
+    The callable runs inside an app context so it can use db.session.
+    On interpreter shutdown we run it one last time, so buffered data
+    isn't lost when a worker is recycled.
+
+    interval <= 0 disables both the thread and the shutdown hook
+    (tests call the job by hand).
+    """
+
+    def __init__(self, app, func, interval, name='periodic-worker'):
+        self.app = app
+        self.func = func
+        self.interval = interval
+        self.name = name
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start the thread and register the flush-on-shutdown hook."""
+        if self.interval <= 0 or self._thread is not None:
+            return
+
+        atexit.register(self.shutdown)
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def run_once(self):
+        """Run the job now, logging (not raising) any error."""
+        with self.app.app_context():
+            try:
+                self.func()
+            except Exception:
+                self.app.logger.exception(f'{self.name}: job failed')
+
+    def shutdown(self):
+        """Stop the loop and run a final pass."""
+        self._stop.set()
+        self.run_once()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.run_once()
@@ -0,0 +1,119 @@
+"""
+Database engine settings
+
+Without SQLALCHEMY_ENGINE_OPTIONS every worker got SQLAlchemy's defaults:
+no pre-ping (stale connections after a Postgres failover blow up the next
+request), no recycle, no statement timeout. engine_options() builds them
+from the DB_* settings in config.py:
+
+- DB_POOL_SIZE / DB_MAX_OVERFLOW / DB_POOL_TIMEOUT / DB_POOL_RECYCLE /
+  DB_POOL_PRE_PING
+- DB_STATEMENT_TIMEOUT_MS: server-side cap on every statement (0 = none)
+- DB_APPLICATION_NAME: shows up in pg_stat_activity, so you can tell the
+  API from migrations or a psql session
+- DB_PGBOUNCER: PgBouncer in transaction mode. No startup `options`
+  (PgBouncer refuses them - set the timeout on the role instead:
+  ALTER ROLE gocial SET statement_timeout = '30s') and no server-side
+  prepared statements (psycopg 3; psycopg2 never uses them)
+
+Sizing: each gunicorn worker has its own pool, so the database sees up to
+workers x (DB_POOL_SIZE + DB_MAX_OVERFLOW) connections. Keep DB_POOL_SIZE
+at least the number of threads per worker.
+
+SQLite (dev, tests) keeps Flask-SQLAlchemy's defaults - none of this
+applies to it.
+"""
+
+import time
+
+from sqlalchemy import create_engine, exc, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+
+from app.utils.metrics import metrics
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool reporting how long requests wait for a connection (gocial_db_pool_wait_seconds)."""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            metrics.record_pool_timeout()
+            raise
+        finally:
+            metrics.record_pool_wait(time.perf_counter() - start)
+
+
+def engine_options(config):
+    """SQLALCHEMY_ENGINE_OPTIONS for config. Values already set there win."""
+    options = dict(config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    url = make_url(config['SQLALCHEMY_DATABASE_URI'])
+    if url.get_backend_name() == 'sqlite':
+        return options
+
+    options.setdefault('poolclass', TimedQueuePool)
+    options.setdefault('pool_size', config.get('DB_POOL_SIZE', 5))
+    options.setdefault('max_overflow', config.get('DB_MAX_OVERFLOW', 5))
+    options.setdefault('pool_timeout', config.get('DB_POOL_TIMEOUT', 10))
+    options.setdefault('pool_recycle', config.get('DB_POOL_RECYCLE', 1800))
+    options.setdefault('pool_pre_ping', config.get('DB_POOL_PRE_PING', True))
+
+    if url.get_backend_name() == 'postgresql':
+        connect_args = dict(options.get('connect_args') or {})
+        pgbouncer = config.get('DB_PGBOUNCER', False)
+
+        if config.get('DB_APPLICATION_NAME'):
+            connect_args.setdefault('application_name', config['DB_APPLICATION_NAME'])
+
+        timeout = config.get('DB_STATEMENT_TIMEOUT_MS') or 0
+        if timeout and not pgbouncer:
+            connect_args.setdefault('options', f'-c statement_timeout={int(timeout)}')
+
+        if pgbouncer and url.get_driver_name() == 'psycopg':
+            connect_args.setdefault('prepare_threshold', None)
+
+        options['connect_args'] = connect_args
+
+    return options
+
+
+def configure_engine(app):
+    """Fill SQLALCHEMY_ENGINE_OPTIONS - call before db.init_app()."""
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config)
+
+
+def create_replica_engine(config, url):
+    """Engine for a read replica, same pool / timeout settings as the primary."""
+    options = engine_options({**config, 'SQLALCHEMY_DATABASE_URI': url, 'SQLALCHEMY_ENGINE_OPTIONS': None})
+    return create_engine(url, **options)
+
+
+def set_statement_timeout(conn, ms):
+    """
+    Override the statement timeout until the end of the current transaction
+    (0 = no limit). conn is a Connection or a Session. No-op off PostgreSQL.
+
+    For the few jobs that legitimately run long (CLI commands, big scans).
+    """
+    bind = conn.get_bind() if hasattr(conn, 'get_bind') else conn
+    if bind.dialect.name == 'postgresql':
+        conn.execute(text(f'SET LOCAL statement_timeout = {int(ms)}'))
+
+
+def dialect_insert(session):
+    """
+    The dialect's insert() construct for the session's database, the one
+    with on_conflict_do_nothing() / on_conflict_do_update() - PostgreSQL
+    and SQLite (3.24+). None elsewhere: callers fall back to plain SQL.
+    """
+    name = session.get_bind().dialect.name
+    if name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+        return insert
+    if name == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+        return insert
+    return None
@@ -0,0 +1,224 @@
+"""
+"People you may know" - friend-of-friend suggestions
+
+Built offline (`flask build-friend-suggestions`) and stored in
+UserRecommendation (kind='friends'), so GET /api/friends/suggestions is
+one lookup instead of a multi-way self-join on friendships.
+
+How it works:
+- accepted friendships are loaded once into a compact adjacency index
+  (CSR layout: one sorted array of user ids, one offsets array, one flat
+  neighbors array - a few bytes per edge instead of a dict of sets)
+- for each user, walking friends-of-friends gives mutual friend counts
+- one GROUP BY per batch gives shared activity counts (both validated)
+- candidates that are already friends, pending, blocked (either way),
+  ghost or deactivated are dropped
+
+Incremental mode only rebuilds users flagged stale by a friendship change
+(see UserRecommendation.mark_friend_suggestions_stale) and users that have
+no suggestions yet.
+"""
+
+import heapq
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
+from datetime import datetime
+
+from sqlalchemy import func, or_
+from sqlalchemy.orm import aliased
+
+from app import db
+from app.models import Friendship, Participation, User, UserRecommendation
+
+
+KIND = 'friends'
+TOP_K = 20
+USER_BATCH_SIZE = 500
+
+MUTUAL_WEIGHT = 1.0
+SHARED_ACTIVITY_WEIGHT = 0.5
+
+
+class FriendGraph:
+    """
+    Read-only adjacency index over accepted friendships.
+
+    Friendships are stored one way (requester -> recipient), the index
+    is symmetric.
+    """
+
+    def __init__(self, edges):
+        adjacency = defaultdict(list)
+        for a, b in edges:
+            if a == b:
+                continue
+            adjacency[a].append(b)
+            adjacency[b].append(a)
+
+        self.ids = array('i', sorted(adjacency))
+        self.offsets = array('l', [0])
+        self.neighbors = array('i')
+
+        for user_id in self.ids:
+            self.neighbors.extend(sorted(set(adjacency[user_id])))
+            self.offsets.append(len(self.neighbors))
+
+    @classmethod
+    def load(cls):
+        """Build the index from accepted friendships between active users."""
+        requester = aliased(User)
+        recipient = aliased(User)
+
+        edges = db.session.query(Friendship.user_id, Friendship.friend_id).join(
+            requester, requester.id == Friendship.user_id
+        ).join(
+            recipient, recipient.id == Friendship.friend_id
+        ).filter(
+            Friendship.status == 'accepted',
+            requester.is_active == True,
+            recipient.is_active == True,
+        ).yield_per(10000)
+
+        return cls(edges)
+
+    def friends_of(self, user_id):
+        """Friend ids of a user (empty if unknown)."""
+        i = bisect_left(self.ids, user_id)
+        if i == len(self.ids) or self.ids[i] != user_id:
+            return self.neighbors[0:0]
+        return self.neighbors[self.offsets[i]:self.offsets[i + 1]]
+
+    def mutual_counts(self, user_id):
+        """candidate_id -> number of mutual friends, friends-of-friends only."""
+        friends = self.friends_of(user_id)
+        counts = defaultdict(int)
+        for friend_id in friends:
+            for candidate_id in self.friends_of(friend_id):
+                counts[candidate_id] += 1
+
+        counts.pop(user_id, None)
+        for friend_id in friends:
+            counts.pop(friend_id, None)
+        return counts
+
+    def __len__(self):
+        return len(self.ids)
+
+
+def build_friend_suggestions(top_k=TOP_K, batch_size=USER_BATCH_SIZE, incremental=False,
+                             now=None, progress=None):
+    """
+    Recompute friend suggestions.
+
+    incremental: only users flagged stale or without suggestions yet.
+    progress: optional callable(processed_users) for CLI output.
+    Returns the number of users processed.
+    """
+    now = now or datetime.utcnow()
+    graph = FriendGraph.load()
+
+    # Never suggest these people to anyone
+    hidden = {row[0] for row in db.session.query(User.id).filter(
+        or_(User.is_active == False, User.is_ghost_mode == True)
+    )}
+
+    processed = 0
+    last_id = 0
+
+    while True:
+        query = db.session.query(User.id).filter(
+            User.id > last_id,
+            User.is_active == True,
+        )
+        if incremental:
+            up_to_date = db.session.query(UserRecommendation.user_id).filter(
+                UserRecommendation.kind == KIND,
+                UserRecommendation.is_stale == False,
+            )
+            query = query.filter(User.id.notin_(up_to_date))
+
+        user_ids = [row[0] for row in query.order_by(User.id).limit(batch_size)]
+        if not user_ids:
+            break
+
+        _build_batch(user_ids, graph, hidden, top_k, now)
+
+        processed += len(user_ids)
+        last_id = user_ids[-1]
+        if progress:
+            progress(processed)
+
+    return processed
+
+
+def _build_batch(user_ids, graph, hidden, top_k, now):
+    """Score one batch of users and replace their stored suggestions."""
+    shared = _shared_activity_counts(user_ids)
+    excluded = _existing_relations(user_ids)
+
+    rows = []
+    for user_id in user_ids:
+        candidates = graph.mutual_counts(user_id)
+        for candidate_id in shared.get(user_id, {}):
+            candidates.setdefault(candidate_id, 0)
+
+        skip = excluded.get(user_id, set())
+        scored = []
+        for candidate_id, mutual in candidates.items():
+            if candidate_id == user_id or candidate_id in skip or candidate_id in hidden:
+                continue
+            activities = shared.get(user_id, {}).get(candidate_id, 0)
+            score = MUTUAL_WEIGHT * mutual + SHARED_ACTIVITY_WEIGHT * activities
+            scored.append((score, mutual, activities, candidate_id))
+
+        ranked = heapq.nlargest(top_k, scored)
+        rows.append({
+            'user_id': user_id,
+            'item_ids': [candidate_id for _, _, _, candidate_id in ranked],
+            'scores': [round(score, 4) for score, _, _, _ in ranked],
+            'details': [{'mutual_friends': m, 'shared_activities': s} for _, m, s, _ in ranked],
+            'is_stale': False,
+            'computed_at': now,
+        })
+
+    UserRecommendation.replace_for(KIND, user_ids, rows)
+    db.session.commit()
+
+
+def _shared_activity_counts(user_ids):
+    """user_id -> {other_id: activities both took part in}."""
+    mine = aliased(Participation)
+    theirs = aliased(Participation)
+
+    rows = db.session.query(
+        mine.user_id, theirs.user_id, func.count(mine.activity_id)
+    ).join(
+        theirs, theirs.activity_id == mine.activity_id
+    ).filter(
+        mine.user_id.in_(user_ids),
+        theirs.user_id != mine.user_id,
+        mine.status == 'validated',
+        theirs.status == 'validated',
+    ).group_by(mine.user_id, theirs.user_id)
+
+    counts = defaultdict(dict)
+    for user_id, other_id, n in rows:
+        counts[user_id][other_id] = n
+    return counts
+
+
+def _existing_relations(user_ids):
+    """user_id -> ids they already have any friendship row with (any status)."""
+    wanted = set(user_ids)
+    related = defaultdict(set)
+
+    rows = db.session.query(Friendship.user_id, Friendship.friend_id).filter(
+        or_(Friendship.user_id.in_(user_ids), Friendship.friend_id.in_(user_ids)),
+    )
+    for a, b in rows:
+        if a in wanted:
+            related[a].add(b)
+        if b in wanted:
+            related[b].add(a)
+    return related
@@ -0,0 +1,230 @@
+"""
+Health & readiness
+
+/health used to answer "healthy" no matter what, so a pod stuck on an
+exhausted connection pool kept getting traffic. Now there are two probes:
+
+- liveness (/health/live, and /health for the load balancers already
+  using it): the process answers. No dependency checks - a DB outage
+  must not get every pod restarted.
+- readiness (/health/ready): should this pod get traffic? Checks
+  * database: SELECT 1, bounded by HEALTH_CHECK_TIMEOUT
+  * pool: how many connections are in use; exhausted = not ready
+    (and we don't even try the DB, that would just wait in line)
+  * storage: uploads can be written (local folder / bucket reachable)
+  * redis: reachable when configured - not critical, everything falls
+    back to memory, so it only makes the status "degraded"
+  * replica: same - reads fall back to the primary
+
+Results are cached HEALTH_CACHE_SECONDS per process, so probes from
+kubelet + load balancer don't turn into DB load. Checks run in a small
+thread pool: a hung DB makes the probe fail after the timeout instead of
+hanging the probe itself.
+
+Draining: after SIGTERM (or once HEALTH_DRAIN_FILE exists, for a k8s
+preStop hook like `touch /tmp/drain && sleep 15`) readiness fails right
+away, while requests in flight finish normally.
+"""
+
+import os
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from flask import current_app
+from sqlalchemy import text
+
+from app import db
+from app.utils.database import set_statement_timeout
+from app.utils.redis_client import get_redis
+from app.utils.replicas import replica_router
+from app.utils.storage import get_storage
+
+
+class HealthChecker:
+    """
+    Usage:
+        health_checker.readiness()        # -> (payload, ready)
+        health_checker.start_draining()
+    """
+
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='health')
+        self._draining = threading.Event()
+        self._cached = None
+        self._cached_at = 0.0
+        self._signal_installed = False
+        self.timeout = 2.0
+        self.cache_seconds = 5.0
+        self.drain_file = None
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.timeout = app.config.get('HEALTH_CHECK_TIMEOUT', 2.0)
+        self.cache_seconds = app.config.get('HEALTH_CACHE_SECONDS', 5.0)
+        self.drain_file = app.config.get('HEALTH_DRAIN_FILE')
+        self._draining.clear()
+        self._cached = None
+
+        if app.config.get('HEALTH_DRAIN_ON_SIGTERM', True):
+            self._install_signal_handler()
+
+        app.extensions['health'] = self
+
+    # -----------------------------------------------------------------
+    # Draining
+    # -----------------------------------------------------------------
+
+    @property
+    def draining(self):
+        return self._draining.is_set() or bool(self.drain_file and os.path.exists(self.drain_file))
+
+    def start_draining(self):
+        self._draining.set()
+
+    def _install_signal_handler(self):
+        """Fail readiness on SIGTERM, then let the previous handler (gunicorn's) do its job."""
+        if self._signal_installed or threading.current_thread() is not threading.main_thread():
+            return
+
+        previous = signal.getsignal(signal.SIGTERM)
+
+        def on_sigterm(signum, frame):
+            self.start_draining()
+            if callable(previous):
+                previous(signum, frame)
+            elif previous == signal.SIG_DFL:
+                raise SystemExit(0)
+
+        signal.signal(signal.SIGTERM, on_sigterm)
+        self._signal_installed = True
+
+    # -----------------------------------------------------------------
+    # Readiness
+    # -----------------------------------------------------------------
+
+    def readiness(self):
+        """(payload, ready) - cached for cache_seconds."""
+        if self.draining:
+            return {'status': 'draining'}, False
+
+        with self._lock:
+            if self._cached is not None and time.monotonic() - self._cached_at < self.cache_seconds:
+                return self._cached
+
+            self._cached = self._run_checks()
+            self._cached_at = time.monotonic()
+            return self._cached
+
+    def _run_checks(self):
+        app = current_app._get_current_object()
+        checks = {}
+
+        pool = pool_status()
+        checks['pool'] = pool
+
+        probes = {
+            'storage': (_check_storage, True),
+            'redis': (_check_redis, False),
+            'replica': (_check_replica, False),
+        }
+        if pool['ok']:
+            probes['database'] = (_check_database, True)
+        else:
+            checks['database'] = {'ok': False, 'critical': True, 'error': 'pool exhausted'}
+
+        futures = {
+            name: self._executor.submit(_timed, app, probe, self.timeout)
+            for name, (probe, _) in probes.items()
+        }
+        wait(futures.values(), timeout=self.timeout)
+
+        for name, future in futures.items():
+            critical = probes[name][1]
+            if future.done():
+                checks[name] = dict(future.result(), critical=critical)
+            else:
+                checks[name] = {'ok': False, 'critical': critical, 'error': f'timeout after {self.timeout}s'}
+
+        ready = all(check['ok'] for check in checks.values() if check.get('critical', True))
+        degraded = not all(check['ok'] for check in checks.values())
+
+        status = 'not_ready' if not ready else ('degraded' if degraded else 'ready')
+        return {'status': status, 'checks': checks}, ready
+
+
+def _timed(app, probe, timeout):
+    """Run a probe in an app context, report ok/error and duration."""
+    start = time.perf_counter()
+    with app.app_context():
+        try:
+            details = probe(timeout) or {}
+            result = {'ok': True, **details}
+        except Exception as e:
+            result = {'ok': False, 'error': f'{type(e).__name__}: {e}'}
+        finally:
+            db.session.remove()
+    result['ms'] = round((time.perf_counter() - start) * 1000, 1)
+    return result
+
+
+# ---------------------------------------------------------------------
+# Checks
+# ---------------------------------------------------------------------
+
+def pool_status():
+    """Connections in use vs. what the pool can hand out."""
+    pool = db.engine.pool
+    if not hasattr(pool, 'overflow'):
+        return {'ok': True, 'type': type(pool).__name__}
+
+    capacity = pool.size() + max(0, pool._max_overflow)
+    in_use = pool.checkedout()
+    saturation = in_use / capacity if capacity else 0.0
+    threshold = current_app.config.get('HEALTH_POOL_SATURATION', 1.0)
+
+    return {
+        'ok': saturation < threshold,
+        'critical': True,
+        'in_use': in_use,
+        'capacity': capacity,
+        'saturation': round(saturation, 2),
+    }
+
+
+def _check_database(timeout):
+    with db.engine.connect() as conn:
+        set_statement_timeout(conn, timeout * 1000)
+        conn.execute(text('SELECT 1'))
+
+
+def _check_replica(timeout):
+    engine = replica_router.engine
+    if engine is None:
+        return {'configured': False}
+    with engine.connect() as conn:
+        set_statement_timeout(conn, timeout * 1000)
+        conn.execute(text('SELECT 1'))
+    return {'configured': True}
+
+
+def _check_storage(timeout):
+    storage = get_storage()
+    storage.check()
+    return {'backend': storage.name}
+
+
+def _check_redis(timeout):
+    client = get_redis(current_app)
+    if client is None:
+        return {'configured': False}
+    client.ping()
+    return {'configured': True}
+
+
+# Shared instance - bound to the app in create_app()
+health_checker = HealthChecker()
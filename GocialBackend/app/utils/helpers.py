@@ -1,11 +1,10 @@
 """
 External service helpers
 
-Push notifications, email sending, file storage.
+Push notifications, email sending, file storage (see app/utils/storage.py).
 All the stuff that talks to third-party services.
 """
 
-import os
 from flask import current_app
 from flask_mail import Message
 
@@ -137,21 +136,15 @@ def send_batch_push_notifications(tokens, title, body, data=None):
 
 def save_upload(file, subfolder='', filename=None):
     """
-    Save an uploaded file.
+    Save an uploaded file to the storage backend.
     
-    Returns the relative path where file was saved.
+    Returns the relative path (storage key) where file was saved.
+    Images should go through app.utils.images.image_pipeline instead.
     """
     from werkzeug.utils import secure_filename
     import uuid
-    
-    upload_folder = current_app.config.get('UPLOAD_FOLDER', 'uploads')
-    
-    if subfolder:
-        target_folder = os.path.join(upload_folder, subfolder)
-    else:
-        target_folder = upload_folder
-    
-    os.makedirs(target_folder, exist_ok=True)
+    from app.utils.storage import get_storage
+    from app.utils.uploads import stage_stream
     
     # Generate filename if not provided
     if not filename:
@@ -159,40 +152,31 @@ def save_upload(file, subfolder='', filename=None):
         filename = f'{uuid.uuid4().hex}.{ext}' if ext else uuid.uuid4().hex
     
     filename = secure_filename(filename)
-    filepath = os.path.join(target_folder, filename)
+    key = f'{subfolder}/{filename}' if subfolder else filename
     
-    file.save(filepath)
-    
-    # Return relative path from uploads root
-    if subfolder:
-        return f'{subfolder}/{filename}'
-    return filename
+    staged = stage_stream(file.stream)
+    return get_storage().put_file(staged.path, key, file.mimetype)
 
 
 def delete_upload(relative_path):
     """
-    Delete an uploaded file.
+    Delete an uploaded file from the storage backend.
     """
-    upload_folder = current_app.config.get('UPLOAD_FOLDER', 'uploads')
-    filepath = os.path.join(upload_folder, relative_path)
-    
-    if os.path.exists(filepath):
-        os.remove(filepath)
-        return True
-    return False
+    from app.utils.storage import get_storage
+    return get_storage().delete(relative_path)
 
 
 def get_upload_url(relative_path):
     """
     Get full URL for an uploaded file.
     
-    In production this would return a CDN URL or signed S3 URL.
+    Local path, S3 URL or CDN URL (CDN_URL) depending on the storage backend.
     """
     if not relative_path:
         return None
     
-    base_url = current_app.config.get('UPLOADS_URL', '/uploads')
-    return f'{base_url}/{relative_path}'
+    from app.utils.storage import get_storage
+    return get_storage().url(relative_path)
 
 
 # ---------------------------------------------------------------------
@@ -0,0 +1,256 @@
+"""
+Image pipeline for avatars and activity images
+
+Uploads used to be stored as-is (up to 16 MB, EXIF and GPS included)
+and the app downloaded full-size originals to draw 60px thumbnails.
+Now every upload:
+
+- is validated by its magic bytes, not its file extension
+- gets EXIF orientation applied, then all metadata dropped
+- is rendered to WebP variants (VARIANTS: thumb / card / full)
+- is named after its content hash, so the same picture uploaded twice
+  is stored (and processed) once
+
+Only <key>_full.webp goes in the DB column; variant_urls() derives the
+other sizes from it, so no schema change and old URLs keep working.
+
+The pipeline works on files staged by app/utils/uploads.py (streamed to
+disk, already hashed), never on the whole upload in memory, and hands
+the results to the storage backend (app/utils/storage.py).
+
+Rendering runs in a small thread pool (Pillow releases the GIL while
+resizing/encoding) so the request returns right away with the final
+URLs; the files show up a few hundred ms later. IMAGE_WORKERS = 0 renders
+inline (tests). Without Pillow installed we still validate and
+deduplicate, but move the original into place untouched.
+"""
+
+import os
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+
+from app import db
+from app.utils.metrics import metrics
+from app.utils.storage import get_storage
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # pragma: no cover - Pillow is optional
+    Image = None
+
+
+# name -> longest side in pixels
+VARIANTS = (
+    ('thumb', 160),
+    ('card', 640),
+    ('full', 1600),
+)
+MAIN_VARIANT = 'full'
+WEBP_QUALITY = 80
+
+# Refuse decompression bombs (a tiny PNG that decodes to 50k x 50k)
+MAX_PIXELS = 40_000_000
+
+_MAGIC = (
+    (b'\xff\xd8\xff', 'jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'GIF87a', 'gif'),
+    (b'GIF89a', 'gif'),
+)
+
+EXTENSIONS = {'jpeg': 'jpg', 'png': 'png', 'gif': 'gif', 'webp': 'webp'}
+
+
+class InvalidImage(ValueError):
+    """Upload isn't an image we accept."""
+
+
+def sniff_image_type(head):
+    """'jpeg' / 'png' / 'gif' / 'webp' from the first bytes, or None."""
+    for magic, kind in _MAGIC:
+        if head.startswith(magic):
+            return kind
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'webp'
+    return None
+
+
+def variant_urls(url):
+    """
+    {'thumb': ..., 'card': ..., 'full': ...} for a stored image URL.
+
+    Images from before the pipeline only have one file - every variant
+    points to it.
+    """
+    if not url:
+        return None
+
+    suffix = f'_{MAIN_VARIANT}.webp'
+    if url.endswith(suffix):
+        base = url[:-len(suffix)]
+        return {name: f'{base}_{name}.webp' for name, _ in VARIANTS}
+    return {name: url for name, _ in VARIANTS}
+
+
+# ---------------------------------------------------------------------
+# Rendering (runs in the pool)
+# ---------------------------------------------------------------------
+
+def render_variants(source, folder, key):
+    """
+    Decode once, write every WebP variant into folder.
+
+    source: a path or a binary file object.
+    Returns [(variant name, path)], in VARIANTS order.
+    """
+    image = Image.open(source)
+    if image.width * image.height > MAX_PIXELS:
+        raise InvalidImage('Image trop grande')
+
+    image.seek(0)  # first frame of animated GIF/WebP
+    image = ImageOps.exif_transpose(image)
+
+    has_alpha = image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
+    image = image.convert('RGBA' if has_alpha else 'RGB')
+
+    written = []
+    for name, size in VARIANTS:
+        variant = image.copy()
+        variant.thumbnail((size, size), Image.LANCZOS)
+
+        # Never pass exif= here - metadata is intentionally dropped
+        path = os.path.join(folder, f'{key}_{name}.webp')
+        variant.save(path, 'WEBP', quality=WEBP_QUALITY, method=4)
+        written.append((name, path))
+
+    return written
+
+
+# ---------------------------------------------------------------------
+# Pipeline
+# ---------------------------------------------------------------------
+
+class ImagePipeline:
+    """
+    Usage:
+        upload = stage_stream(file.stream)
+        url = image_pipeline.process(upload, 'avatars', on_failure=...)
+        user.avatar_url = url
+    """
+
+    def __init__(self, app=None):
+        self._app = None
+        self._executor = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self._app = app
+        workers = app.config.get('IMAGE_WORKERS', 2)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='images') if workers > 0 else None
+        app.extensions['image_pipeline'] = self
+
+    def process(self, upload, subfolder, on_failure=None):
+        """
+        Validate a staged upload and schedule its variants.
+
+        Takes ownership of upload (a StagedFile): its temp file ends up in
+        storage or gets removed once we're done with it.
+
+        Returns the URL to store (the 'full' variant). Raises InvalidImage.
+        on_failure: called with the URL (in an app context) if background
+        rendering fails, to roll back whatever pointed at it.
+        """
+        kind = sniff_image_type(upload.head)
+        if kind is None:
+            upload.discard()
+            raise InvalidImage('Type de fichier non autorisé (JPEG, PNG, GIF, WebP acceptés)')
+
+        storage = get_storage()
+        key = upload.digest[:32]
+
+        if Image is None:
+            # No Pillow - at least dedupe and never trust the client's extension
+            storage_key = f'{subfolder}/{key}.{EXTENSIONS[kind]}'
+            if storage.exists(storage_key):
+                upload.discard()
+            else:
+                storage.put_file(upload.path, storage_key, f'image/{kind}')
+            return storage.url(storage_key)
+
+        main_key = f'{subfolder}/{key}_{MAIN_VARIANT}.webp'
+        url = storage.url(main_key)
+
+        if storage.exists(main_key):
+            metrics.record_cache('image_variants', True)
+            upload.discard()
+            return url  # same picture already processed
+
+        metrics.record_cache('image_variants', False)
+
+        if self._executor is None:
+            self._render(upload, storage, subfolder, key)
+        else:
+            self._executor.submit(self._render_in_background, upload, storage, subfolder, key, url, on_failure)
+
+        return url
+
+    def _render(self, upload, storage, subfolder, key):
+        """Render into a private scratch folder, then hand the files to storage."""
+        scratch = tempfile.mkdtemp(dir=os.path.dirname(upload.path))
+        try:
+            try:
+                written = render_variants(upload.path, scratch, key)
+            except InvalidImage:
+                raise
+            except Exception as e:
+                raise InvalidImage('Image illisible') from e
+
+            # 'full' goes last: once it exists, every variant does (dedupe check)
+            for name, path in written:
+                storage.put_file(path, f'{subfolder}/{key}_{name}.webp', 'image/webp')
+        finally:
+            shutil.rmtree(scratch, ignore_errors=True)
+            upload.discard()
+
+    def _render_in_background(self, upload, storage, subfolder, key, url, on_failure):
+        with self._app.app_context():
+            try:
+                self._render(upload, storage, subfolder, key)
+            except Exception as e:
+                current_app.logger.warning(f'Image processing failed for {key}: {e}')
+                if on_failure is not None:
+                    try:
+                        on_failure(url)
+                    except Exception:
+                        db.session.rollback()
+                        current_app.logger.exception('Image rollback failed')
+
+    @property
+    def pending_count(self):
+        """Images waiting for a rendering thread."""
+        return self._executor._work_queue.qsize() if self._executor is not None else 0
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+
+
+def restore_url(model, row_id, column, previous_url):
+    """
+    on_failure helper: put previous_url back, unless the row moved on since.
+    """
+    def rollback(failed_url):
+        model.query.filter(
+            model.id == row_id,
+            getattr(model, column) == failed_url,
+        ).update({column: previous_url}, synchronize_session=False)
+        db.session.commit()
+    return rollback
+
+
+# Shared instance - bound to the app in create_app()
+image_pipeline = ImagePipeline()
@@ -0,0 +1,169 @@
+"""
+Index advisor - `flask db-index-advisor`
+
+Replays the query shapes the API runs most (feed, inbox, notifications,
+participants, friend lists...) and prints the database's plan for each,
+flagging the ones that scan a whole table instead of using an index.
+
+The shapes mirror the route queries (same filters and ordering, sample
+ids taken from the data). When a route's query changes, change its shape
+here too - that's what keeps the index coverage check honest.
+
+PostgreSQL: plans come from EXPLAIN with enable_seqscan off, so a small
+dev/CI table still tells whether a usable index exists (the planner
+would rightly prefer a seq scan on 10 rows otherwise). --analyze runs
+EXPLAIN (ANALYZE, BUFFERS) with normal planner settings, for a real
+copy of production.
+
+SQLite: EXPLAIN QUERY PLAN, "SCAN <table>" without an index = full scan.
+"""
+
+import re
+from collections import namedtuple
+from datetime import datetime
+
+from sqlalchemy import and_, func, or_, select
+
+from app import db
+from app.models import (
+    Activity, Evaluation, Friendship, Message, Notification, Participation, User, UserRatingAggregate,
+)
+from app.utils.partitions import inbox_cutoff, notification_cutoff
+
+
+ShapeReport = namedtuple('ShapeReport', 'name plan full_scans')
+
+
+# ---------------------------------------------------------------------
+# Query shapes (keep in sync with the routes)
+# ---------------------------------------------------------------------
+
+def _sample_ids():
+    """A real user / activity id when there is data, so plans use real statistics."""
+    user_id = db.session.scalar(select(func.min(User.id))) or 1
+    other_id = db.session.scalar(select(func.max(User.id))) or 2
+    activity_id = db.session.scalar(select(func.min(Activity.id))) or 1
+    return user_id, other_id, activity_id
+
+
+def query_shapes():
+    """[(name, statement)] - one per hot API query."""
+    user_id, other_id, activity_id = _sample_ids()
+    now = datetime.utcnow()
+
+    published_upcoming = (Activity.status == 'published', Activity.date >= now)
+    # Retention window bound, as in routes/notifications.py (partition pruning)
+    user_notifications = [Notification.user_id == user_id]
+    cutoff = notification_cutoff()
+    if cutoff is not None:
+        user_notifications.append(Notification.created_at >= cutoff)
+    # Inbox window, as in routes/messages.py _in_inbox()
+    unread_messages = [
+        Message.recipient_id == user_id, Message.is_read == False,  # noqa: E712
+        Message.deleted_by_recipient == False,  # noqa: E712
+    ]
+    cutoff = inbox_cutoff()
+    if cutoff is not None:
+        unread_messages.append(Message.created_at >= cutoff)
+    thread = or_(
+        and_(Message.sender_id == user_id, Message.recipient_id == other_id),
+        and_(Message.sender_id == other_id, Message.recipient_id == user_id),
+    )
+
+    return [
+        # GET /api/activities/
+        ('activities.feed', select(Activity).where(*published_upcoming).order_by(Activity.date).limit(20)),
+        ('activities.feed_by_type', select(Activity).where(
+            *published_upcoming, Activity.activity_type == 'real',
+        ).order_by(Activity.date).limit(20)),
+        # GET /api/activities/hosting
+        ('activities.hosting', select(Activity).where(
+            Activity.host_id == user_id, Activity.status != 'cancelled', Activity.date >= now,
+        ).order_by(Activity.date).limit(20)),
+        # GET /api/activities/<id> - participants
+        ('participations.accepted', select(Participation).where(
+            Participation.activity_id == activity_id, Participation.status == 'accepted',
+        )),
+        # Visibility check in the feed, friend lists
+        ('friendships.accepted', select(Friendship).where(
+            or_(Friendship.user_id == user_id, Friendship.friend_id == user_id),
+            Friendship.status == 'accepted',
+        )),
+        # GET /api/messages/with/<id>
+        ('messages.thread', select(Message).where(thread).order_by(Message.created_at.desc()).limit(50)),
+        # GET /api/messages/unread-count
+        ('messages.unread_count', select(func.count(Message.id)).where(*unread_messages)),
+        # GET /api/notifications/?unread_only=true
+        ('notifications.unread', select(Notification).where(
+            *user_notifications, Notification.is_read == False,  # noqa: E712
+        ).order_by(Notification.created_at.desc()).limit(20)),
+        # GET /api/notifications/
+        ('notifications.list', select(Notification).where(
+            *user_notifications,
+        ).order_by(Notification.created_at.desc()).limit(20)),
+        # GET /api/users/<id>/rating
+        ('ratings.user', select(UserRatingAggregate).where(UserRatingAggregate.user_id == user_id)),
+        # flask reconcile-ratings
+        ('evaluations.by_user', select(Evaluation.evaluated_id, func.count(Evaluation.id)).where(
+            Evaluation.evaluated_id.in_([user_id, other_id]),
+        ).group_by(Evaluation.evaluated_id)),
+    ]
+
+
+# ---------------------------------------------------------------------
+# EXPLAIN
+# ---------------------------------------------------------------------
+
+_PG_SEQ_SCAN = re.compile(r'Seq Scan on (\w+)')
+_SQLITE_SCAN = re.compile(r'^SCAN (\w+)(?!.*\bUSING\b)')
+
+
+def _driver_sql(conn, statement):
+    """Statement -> (sql, params) as the driver wants them (IN lists expanded)."""
+    compiled = statement.compile(dialect=conn.dialect, compile_kwargs={'render_postcompile': True})
+    params = compiled.construct_params()
+    if compiled.positional:
+        params = tuple(params[name] for name in compiled.positiontup)
+    return str(compiled), params
+
+
+def explain(conn, statement, analyze=False):
+    """Plan lines for statement on conn."""
+    sql, params = _driver_sql(conn, statement)
+
+    if conn.dialect.name == 'postgresql':
+        prefix = 'EXPLAIN (ANALYZE, BUFFERS) ' if analyze else 'EXPLAIN '
+        return [row[0] for row in conn.exec_driver_sql(prefix + sql, params)]
+
+    if conn.dialect.name == 'sqlite':
+        return [row[3] for row in conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + sql, params)]
+
+    return [str(row[0]) for row in conn.exec_driver_sql('EXPLAIN ' + sql, params)]
+
+
+def full_scans(dialect_name, plan):
+    """Tables read in full according to plan."""
+    pattern = _PG_SEQ_SCAN if dialect_name == 'postgresql' else _SQLITE_SCAN
+    return sorted({match.group(1) for line in plan for match in [pattern.search(line.strip())] if match})
+
+
+def advise(analyze=False, only=None):
+    """ShapeReport for every shape (whose name contains only, if given)."""
+    reports = []
+
+    with db.engine.connect() as conn:
+        pg = conn.dialect.name == 'postgresql'
+
+        for name, statement in query_shapes():
+            if only and only not in name:
+                continue
+
+            with conn.begin() as tx:
+                if pg and not analyze:
+                    conn.exec_driver_sql('SET LOCAL enable_seqscan = off')
+                plan = explain(conn, statement, analyze=analyze)
+                tx.rollback()  # EXPLAIN ANALYZE really runs the query
+
+            reports.append(ShapeReport(name, plan, full_scans(conn.dialect.name, plan)))
+
+    return reports
@@ -0,0 +1,226 @@
+"""
+Prometheus metrics - GET /metrics
+
+What we export (all prefixed gocial_):
+
+- http_request_duration_seconds{blueprint,endpoint,method}  histogram
+- http_requests_total{blueprint,endpoint,method,status}
+- http_requests_in_progress
+- db_pool_checkouts_total, db_pool_connects_total, db_pool_checked_out,
+  db_pool_size, db_pool_overflow
+- db_pool_wait_seconds, db_pool_timeouts_total   time spent waiting for a
+  connection (PostgreSQL, see app/utils/database.py)
+- cache_requests_total{cache,result}      hit ratio = hit / (hit + miss)
+- worker_queue_depth{queue}               buffered views, dirty trending
+  scores, presence timestamps, images waiting to be rendered
+
+Gunicorn: every worker has its own counters. Set PROMETHEUS_MULTIPROC_DIR
+to an empty directory (wiped at each deploy) and prometheus_client keeps
+the values in mmap'd files there; /metrics then adds up every worker,
+whichever one answers the scrape. gunicorn.conf.py cleans up after dead
+workers.
+
+prometheus_client is optional - without it /metrics doesn't exist and
+the record_* helpers do nothing. METRICS_TOKEN, when set, has to come as
+a Bearer token (keep /metrics off the public internet anyway).
+"""
+
+import os
+import time
+
+from flask import Response, current_app, g, request
+from sqlalchemy import event
+from sqlalchemy.pool import Pool
+
+from app import db
+from app.utils.background import PeriodicWorker
+
+try:
+    from prometheus_client import (
+        CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram,
+        generate_latest, multiprocess,
+    )
+except ImportError:  # pragma: no cover - prometheus_client is optional
+    Counter = None
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+POOL_WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30)
+
+# Not worth a time series of their own
+SKIP_PATHS = ('/metrics', '/uploads/', '/health')
+
+
+class Metrics:
+    """
+    Usage:
+        metrics.init_app(app)                      # in create_app()
+        metrics.record_cache('jwt_flags', hit)     # anywhere, no-op when disabled
+    """
+
+    def __init__(self, app=None):
+        self.enabled = False
+        self._defined = False
+        self._sampler = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if not app.config.get('METRICS_ENABLED', True):
+            return
+        if Counter is None:
+            app.logger.info('prometheus_client not installed - /metrics disabled')
+            return
+
+        self._define()
+        self.enabled = True
+
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        app.teardown_request(self._teardown)
+        app.add_url_rule('/metrics', 'metrics', self._metrics_view)
+
+        self._sampler = PeriodicWorker(
+            app, self.sample,
+            interval=app.config.get('METRICS_SAMPLE_SECONDS', 15),
+            name='metrics-sampler',
+        )
+        self._sampler.start()
+        app.extensions['metrics'] = self
+
+    def _define(self):
+        """Metric objects are process-wide - create them once, whatever the number of apps."""
+        if self._defined:
+            return
+
+        self.latency = Histogram(
+            'gocial_http_request_duration_seconds', 'Request latency',
+            ['blueprint', 'endpoint', 'method'], buckets=LATENCY_BUCKETS,
+        )
+        self.requests = Counter(
+            'gocial_http_requests', 'Requests by status code',
+            ['blueprint', 'endpoint', 'method', 'status'],
+        )
+        self.in_progress = Gauge(
+            'gocial_http_requests_in_progress', 'Requests being handled',
+            multiprocess_mode='livesum',
+        )
+
+        self.pool_checkouts = Counter('gocial_db_pool_checkouts', 'Connections taken from the pool')
+        self.pool_connects = Counter('gocial_db_pool_connects', 'New DB connections opened')
+        self.pool_checked_out = Gauge(
+            'gocial_db_pool_checked_out', 'Connections currently in use', multiprocess_mode='livesum',
+        )
+        self.pool_size = Gauge('gocial_db_pool_size', 'Pool size', multiprocess_mode='livesum')
+        self.pool_overflow = Gauge(
+            'gocial_db_pool_overflow', 'Connections opened past the pool size', multiprocess_mode='livesum',
+        )
+        self.pool_wait = Histogram(
+            'gocial_db_pool_wait_seconds', 'Time waiting for a pool connection', buckets=POOL_WAIT_BUCKETS,
+        )
+        self.pool_timeouts = Counter('gocial_db_pool_timeouts', 'Gave up waiting for a pool connection')
+
+        self.cache = Counter('gocial_cache_requests', 'Cache lookups', ['cache', 'result'])
+        self.queue_depth = Gauge(
+            'gocial_worker_queue_depth', 'Items waiting for a background worker',
+            ['queue'], multiprocess_mode='livesum',
+        )
+
+        # Class-level: covers every engine (replicas too) and pools recreated on dispose()
+        event.listen(Pool, 'checkout', self._on_checkout)
+        event.listen(Pool, 'checkin', self._on_checkin)
+        event.listen(Pool, 'connect', self._on_connect)
+
+        self._defined = True
+
+    # -----------------------------------------------------------------
+    # Recording
+    # -----------------------------------------------------------------
+
+    def record_cache(self, cache, hit):
+        if self.enabled:
+            self.cache.labels(cache, 'hit' if hit else 'miss').inc()
+
+    def record_pool_wait(self, seconds):
+        if self.enabled:
+            self.pool_wait.observe(seconds)
+
+    def record_pool_timeout(self):
+        if self.enabled:
+            self.pool_timeouts.inc()
+
+    def _start(self):
+        if request.path.startswith(SKIP_PATHS):
+            return
+        g._metrics_started = time.perf_counter()
+        self.in_progress.inc()
+
+    def _finish(self, response):
+        started = g.pop('_metrics_started', None)
+        if started is None:
+            return response
+
+        labels = (request.blueprint or '', request.endpoint or 'unknown', request.method)
+        self.latency.labels(*labels).observe(time.perf_counter() - started)
+        self.requests.labels(*labels, str(response.status_code)).inc()
+        self.in_progress.dec()
+        return response
+
+    def _teardown(self, exc=None):
+        # Unhandled exception: after_request never ran
+        if g.pop('_metrics_started', None) is not None:
+            self.in_progress.dec()
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        if self.enabled:
+            self.pool_checkouts.inc()
+            self.pool_checked_out.inc()
+
+    def _on_checkin(self, dbapi_connection, connection_record):
+        if self.enabled:
+            self.pool_checked_out.dec()
+
+    def _on_connect(self, dbapi_connection, connection_record):
+        if self.enabled:
+            self.pool_connects.inc()
+
+    def sample(self):
+        """
+        Read gauges that nobody pushes (pool occupancy, queue depths).
+        Runs every METRICS_SAMPLE_SECONDS in each worker.
+        """
+        from app.utils.images import image_pipeline
+        from app.utils.presence import presence
+        from app.utils.trending import trending_ranker
+        from app.utils.view_counter import view_counter
+
+        pool = db.engine.pool
+        if hasattr(pool, 'overflow'):  # QueuePool - SQLite in-memory has no sizing
+            self.pool_size.set(pool.size())
+            self.pool_overflow.set(max(0, pool.overflow()))
+
+        self.queue_depth.labels('views').set(view_counter.pending_count)
+        self.queue_depth.labels('trending').set(trending_ranker.pending_count)
+        self.queue_depth.labels('presence').set(presence.pending_count)
+        self.queue_depth.labels('images').set(image_pipeline.pending_count)
+
+    # -----------------------------------------------------------------
+    # Exposition
+    # -----------------------------------------------------------------
+
+    def _metrics_view(self):
+        token = current_app.config.get('METRICS_TOKEN')
+        if token and request.headers.get('Authorization') != f'Bearer {token}':
+            return Response('Unauthorized\n', status=401, mimetype='text/plain')
+
+        if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+        else:
+            registry = REGISTRY
+
+        return Response(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
+
+
+# Shared instance - bound to the app in create_app()
+metrics = Metrics()
@@ -0,0 +1,216 @@
+"""
+Monthly partitions for messages & notifications (PostgreSQL)
+
+Both tables only ever grow, and their indexes stopped fitting in RAM.
+Migration 9c4f1e2a7b53 turns them into tables partitioned by month on
+created_at (messages_p2026_10, notifications_p2026_10..., plus a
+*_default partition catching anything outside the known months). Then:
+
+- each month's indexes are small, and queries bounded on created_at only
+  touch the months they need (partition pruning) - the notification
+  list is bounded by the retention window below, the message inbox
+  (conversation list, requests, unread counts) by MESSAGE_INBOX_MONTHS
+- `flask db-partitions` (daily cron, also run on release) creates the
+  coming PARTITION_MONTHS_AHEAD months, and applies the notification
+  retention: partitions entirely older than NOTIFICATION_RETENTION_MONTHS
+  are dropped - or detached and kept as archive_notifications_pYYYY_MM
+  tables with NOTIFICATION_ARCHIVE, ready for pg_dump
+
+Anything else (SQLite in dev/tests, an unpartitioned table) gets the
+same retention through batched DELETEs, so behaviour doesn't depend on
+the database.
+"""
+
+import re
+from collections import namedtuple
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import text
+
+from app import db
+
+
+PARTITIONED_TABLES = ('messages', 'notifications')
+PARTITION_KEY = 'created_at'
+
+Partition = namedtuple('Partition', 'name start end')
+
+_BOUND_RE = re.compile(r"FROM \('([^']+)'\) TO \('([^']+)'\)")
+
+
+# ---------------------------------------------------------------------
+# Months
+# ---------------------------------------------------------------------
+
+def month_floor(dt):
+    return dt.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+
+def partition_name(table, month):
+    return f'{table}_p{month:%Y_%m}'
+
+
+def retention_cutoff(months, now=None):
+    """
+    First day of the oldest month still kept, or None (keep everything).
+
+    Month-aligned on purpose: a query bounded by it prunes exactly the
+    partitions retention is about to drop.
+    """
+    if not months:
+        return None
+    return add_months(month_floor(now or datetime.utcnow()), -months)
+
+
+def notification_cutoff():
+    return retention_cutoff(current_app.config.get('NOTIFICATION_RETENTION_MONTHS', 0))
+
+
+def inbox_cutoff():
+    """
+    Oldest month the message inbox looks at, or None.
+
+    Messages are never deleted - a conversation older than this just
+    drops off the list; its history stays reachable by partner.
+    """
+    return retention_cutoff(current_app.config.get('MESSAGE_INBOX_MONTHS', 0))
+
+
+# ---------------------------------------------------------------------
+# Introspection
+# ---------------------------------------------------------------------
+
+def is_partitioned(conn, table):
+    if conn.dialect.name != 'postgresql':
+        return False
+    return bool(conn.execute(text(
+        'SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid '
+        'WHERE c.relname = :table'
+    ), {'table': table}).scalar())
+
+
+def list_partitions(conn, table):
+    """Month partitions of table, oldest first (the default partition isn't listed)."""
+    rows = conn.execute(text(
+        'SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) '
+        'FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid '
+        'JOIN pg_class p ON p.oid = i.inhparent WHERE p.relname = :table'
+    ), {'table': table})
+
+    partitions = []
+    for name, bound in rows:
+        match = _BOUND_RE.search(bound or '')
+        if match:
+            start, end = (datetime.fromisoformat(value) for value in match.groups())
+            partitions.append(Partition(name, start, end))
+    return sorted(partitions, key=lambda p: p.start)
+
+
+# ---------------------------------------------------------------------
+# Maintenance
+# ---------------------------------------------------------------------
+
+def ensure_partitions(conn, table, months_ahead=3, now=None):
+    """
+    Create the month partitions from now to now + months_ahead.
+
+    Rows that already landed in the default partition for one of those
+    months are moved into the new partition first (ATTACH refuses
+    otherwise). Returns the names created.
+    """
+    existing = {p.name for p in list_partitions(conn, table)}
+    current = month_floor(now or datetime.utcnow())
+    created = []
+
+    for offset in range(months_ahead + 1):
+        start = add_months(current, offset)
+        name = partition_name(table, start)
+        if name in existing:
+            continue
+
+        bounds = {'start': start, 'end': add_months(start, 1)}
+        conn.execute(text(f'CREATE TABLE {name} (LIKE {table} INCLUDING DEFAULTS)'))
+        conn.execute(text(
+            f'WITH moved AS (DELETE FROM {table}_default '
+            f'WHERE {PARTITION_KEY} >= :start AND {PARTITION_KEY} < :end RETURNING *) '
+            f'INSERT INTO {name} SELECT * FROM moved'
+        ), bounds)
+        conn.execute(text(
+            f"ALTER TABLE {table} ATTACH PARTITION {name} "
+            f"FOR VALUES FROM ('{start:%Y-%m-%d}') TO ('{bounds['end']:%Y-%m-%d}')"
+        ))
+        created.append(name)
+
+    return created
+
+
+def apply_retention(conn, table, keep_months, archive=False, batch_size=10000, now=None):
+    """
+    Remove rows of table older than keep_months (whole months).
+
+    Partitioned: drop (or detach + rename to archive_*) the old month
+    partitions, then clean the default partition. Otherwise: DELETE in
+    batches, so no single statement holds locks for long.
+    Returns (partitions removed, rows deleted).
+    """
+    cutoff = retention_cutoff(keep_months, now)
+    if cutoff is None:
+        return [], 0
+
+    removed = []
+    if is_partitioned(conn, table):
+        for partition in list_partitions(conn, table):
+            if partition.end > cutoff:
+                break
+            if archive:
+                conn.execute(text(f'ALTER TABLE {table} DETACH PARTITION {partition.name}'))
+                conn.execute(text(f'ALTER TABLE {partition.name} RENAME TO archive_{partition.name}'))
+            else:
+                conn.execute(text(f'DROP TABLE {partition.name}'))
+            removed.append(partition.name)
+
+    deleted = 0
+    while True:
+        result = conn.execute(text(
+            f'DELETE FROM {table} WHERE id IN '
+            f'(SELECT id FROM {table} WHERE {PARTITION_KEY} < :cutoff LIMIT :limit)'
+        ), {'cutoff': cutoff, 'limit': batch_size})
+        conn.commit()
+        deleted += result.rowcount
+        if result.rowcount < batch_size:
+            break
+
+    return removed, deleted
+
+
+def maintain_partitions(months_ahead=None, retention_months=None, archive=None):
+    """
+    What `flask db-partitions` runs: future partitions for every table,
+    then the notification retention. Returns {table: summary}.
+    """
+    config = current_app.config
+    months_ahead = config.get('PARTITION_MONTHS_AHEAD', 3) if months_ahead is None else months_ahead
+    if retention_months is None:
+        retention_months = config.get('NOTIFICATION_RETENTION_MONTHS', 0)
+    if archive is None:
+        archive = config.get('NOTIFICATION_ARCHIVE', False)
+
+    summary = {}
+    with db.engine.connect() as conn:
+        for table in PARTITIONED_TABLES:
+            created = []
+            if is_partitioned(conn, table):
+                created = ensure_partitions(conn, table, months_ahead)
+                conn.commit()
+            summary[table] = {'created': created, 'removed': [], 'deleted': 0}
+
+        removed, deleted = apply_retention(conn, 'notifications', retention_months, archive)
+        summary['notifications'].update(removed=removed, deleted=deleted)
+
+    return summary
@@ -0,0 +1,164 @@
+"""
+Password hashing
+
+Thin layer over werkzeug.security so that:
+- algorithm and cost come from config (PASSWORD_HASH_METHOD)
+- hashes made with older settings are upgraded on the next successful
+  login (User.check_password rehashes, the login commit saves it)
+- hashing can run in a small process pool (PASSWORD_HASH_WORKERS) so a
+  login storm doesn't hold the GIL and starve every other request on
+  the worker. The pool is bounded: past PASSWORD_HASH_MAX_PENDING jobs
+  in flight we fail fast with PasswordHasherBusy instead of queueing
+  forever. A hash that takes longer than PASSWORD_HASH_TIMEOUT (or a
+  pool that died) is PasswordHasherBusy too - its slot is only given
+  back once the job really finishes, so the cap holds.
+
+`flask bench-passwords` measures hashes/sec per core for a given method.
+"""
+
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+from flask import current_app, has_app_context
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+DEFAULT_METHOD = 'scrypt'
+DEFAULT_SALT_LENGTH = 16
+
+
+class PasswordHasherBusy(Exception):
+    """Too many hashes in flight - the caller should answer 503."""
+
+
+class PasswordHasher:
+    """
+    Usage:
+        password_hasher.hash(password)
+        password_hasher.verify(stored_hash, password)
+        password_hasher.needs_rehash(stored_hash)
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pool = None
+        self._pool_pid = None
+        self._slots = None
+        self._canonical = {}
+
+    # -----------------------------------------------------------------
+    # Settings (read from the current app, defaults outside of one)
+    # -----------------------------------------------------------------
+
+    @staticmethod
+    def _config(key, default):
+        if has_app_context():
+            return current_app.config.get(key, default)
+        return default
+
+    @property
+    def method(self):
+        return self._config('PASSWORD_HASH_METHOD', DEFAULT_METHOD)
+
+    @property
+    def salt_length(self):
+        return self._config('PASSWORD_HASH_SALT_LENGTH', DEFAULT_SALT_LENGTH)
+
+    @property
+    def workers(self):
+        return self._config('PASSWORD_HASH_WORKERS', 0)
+
+    @property
+    def timeout(self):
+        return self._config('PASSWORD_HASH_TIMEOUT', 5)
+
+    # -----------------------------------------------------------------
+    # API
+    # -----------------------------------------------------------------
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method, self.salt_length)
+
+    def verify(self, stored_hash, password):
+        if not stored_hash:
+            return False
+        return self._run(check_password_hash, stored_hash, password)
+
+    def needs_rehash(self, stored_hash):
+        """True if stored_hash was made with another method or cost."""
+        return stored_hash.split('$', 1)[0] != self.canonical_method(self.method)
+
+    def canonical_method(self, method):
+        """
+        'scrypt' -> 'scrypt:32768:8:1' - werkzeug fills in default costs,
+        so compare against what it actually writes in the hash prefix.
+        """
+        if method not in self._canonical:
+            self._canonical[method] = generate_password_hash('', method, salt_length=1).split('$', 1)[0]
+        return self._canonical[method]
+
+    # -----------------------------------------------------------------
+    # Process pool
+    # -----------------------------------------------------------------
+
+    def _run(self, func, *args):
+        workers = self.workers
+        if workers <= 0:
+            return func(*args)
+
+        pool, slots = self._get_pool(workers)
+        if not slots.acquire(blocking=False):
+            raise PasswordHasherBusy()
+
+        try:
+            future = pool.submit(func, *args)
+        except (BrokenProcessPool, RuntimeError):
+            slots.release()
+            self._discard_pool(pool)
+            raise PasswordHasherBusy() from None
+
+        # Freed when the job is done, not when we stop waiting for it
+        future.add_done_callback(lambda _: slots.release())
+
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            raise PasswordHasherBusy() from None
+        except BrokenProcessPool:
+            self._discard_pool(pool)
+            raise PasswordHasherBusy() from None
+
+    def _get_pool(self, workers):
+        """
+        One pool per process - created lazily, so gunicorn workers each get
+        their own after the fork instead of sharing the master's.
+        """
+        pid = os.getpid()
+        with self._lock:
+            if self._pool is None or self._pool_pid != pid:
+                self._pool = ProcessPoolExecutor(max_workers=workers)
+                self._pool_pid = pid
+                self._slots = threading.BoundedSemaphore(
+                    self._config('PASSWORD_HASH_MAX_PENDING', workers * 8)
+                )
+            return self._pool, self._slots
+
+    def _discard_pool(self, pool):
+        """A worker died - the next call builds a fresh pool."""
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+                self._pool_pid = None
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None and self._pool_pid == os.getpid():
+                self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+            self._pool_pid = None
+
+
+# Shared instance
+password_hasher = PasswordHasher()
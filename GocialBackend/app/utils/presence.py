@@ -0,0 +1,241 @@
+"""
+Presence - write-behind last_seen / last_login
+
+Every authenticated request used to be able to turn into an UPDATE on
+the users row (get_me, refresh, logout, login...). Now requests only
+note "user X was here at T" in memory (or Redis), the latest timestamp
+per user wins, and a background worker writes them all every
+PRESENCE_FLUSH_SECONDS in one batched UPDATE.
+
+The same data answers "who's online now" (seen in the last
+PRESENCE_ONLINE_SECONDS) without touching the DB. In memory mode that's
+per process - set REDIS_URL when running several workers.
+"""
+
+import threading
+import time
+from datetime import datetime
+
+from flask_jwt_extended import get_jwt_identity
+from sqlalchemy import text
+
+from app import db
+from app.utils.background import PeriodicWorker
+from app.utils.redis_client import get_redis
+
+
+class PresenceTracker:
+    """
+    Usage:
+        presence.touch(user_id)                 # any authenticated request
+        presence.touch(user_id, login=True)     # login
+        presence.online_among(friend_ids)       # -> set of online ids
+        presence.flush()                        # done by the worker
+    """
+
+    ONLINE_KEY = 'presence:online'        # zset user_id -> last seen (epoch)
+    PENDING_KEY = 'presence:pending'      # hash user_id -> last seen, not flushed yet
+    LOGINS_KEY = 'presence:logins'        # hash user_id -> last login, not flushed yet
+
+    TOUCH_RESOLUTION = 15  # seconds - last_seen doesn't need to be more precise
+
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self._recent = {}
+        self._pending = {}
+        self._logins = {}
+        self._redis = None
+        self._worker = None
+        self.online_seconds = 300
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.online_seconds = app.config.get('PRESENCE_ONLINE_SECONDS', 300)
+        self._redis = get_redis(app)
+
+        with self._lock:
+            self._recent.clear()
+            self._pending.clear()
+            self._logins.clear()
+
+        self._worker = PeriodicWorker(
+            app, self.flush,
+            interval=app.config.get('PRESENCE_FLUSH_SECONDS', 60),
+            name='presence',
+        )
+        self._worker.start()
+
+        app.after_request(self._touch_current_user)
+        app.extensions['presence'] = self
+
+    # -------------------------------------------------------------------
+    # Recording
+    # -------------------------------------------------------------------
+
+    def touch(self, user_id, login=False):
+        """
+        Note activity for a user. Never touches the database.
+
+        Repeated touches within TOUCH_RESOLUTION seconds are dropped, so a
+        burst of requests costs one Redis round trip, not one each.
+        """
+        now = time.time()
+
+        with self._lock:
+            if not login and now - self._recent.get(user_id, 0) < self.TOUCH_RESOLUTION:
+                return
+            self._recent[user_id] = now
+
+        if self._redis is not None:
+            try:
+                pipe = self._redis.pipeline(transaction=False)
+                pipe.zadd(self.ONLINE_KEY, {user_id: now})
+                pipe.hset(self.PENDING_KEY, user_id, now)
+                if login:
+                    pipe.hset(self.LOGINS_KEY, user_id, now)
+                pipe.execute()
+                return
+            except Exception:
+                pass  # Redis hiccup - fall back to local buffer
+
+        with self._lock:
+            self._pending[user_id] = now
+            if login:
+                self._logins[user_id] = now
+
+    @property
+    def pending_count(self):
+        """Users with a timestamp waiting for the next flush in this process."""
+        return len(self._pending) + len(self._logins)
+
+    def _touch_current_user(self, response):
+        """after_request: any successful authenticated request counts as activity."""
+        if response.status_code < 400:
+            try:
+                identity = get_jwt_identity()
+            except RuntimeError:
+                identity = None  # route without @jwt_required
+            if identity is not None:
+                self.touch(int(identity))
+        return response
+
+    # -------------------------------------------------------------------
+    # Online now
+    # -------------------------------------------------------------------
+
+    def online_among(self, user_ids):
+        """Subset of user_ids seen in the last online_seconds."""
+        user_ids = list(user_ids)
+        if not user_ids:
+            return set()
+
+        cutoff = time.time() - self.online_seconds
+
+        if self._redis is not None:
+            try:
+                pipe = self._redis.pipeline(transaction=False)
+                for user_id in user_ids:
+                    pipe.zscore(self.ONLINE_KEY, user_id)
+                scores = pipe.execute()
+                return {uid for uid, score in zip(user_ids, scores) if score and score >= cutoff}
+            except Exception:
+                pass
+
+        return {uid for uid in user_ids if self._recent.get(uid, 0) >= cutoff}
+
+    def is_online(self, user_id):
+        return user_id in self.online_among([user_id])
+
+    # -------------------------------------------------------------------
+    # Flushing
+    # -------------------------------------------------------------------
+
+    def flush(self):
+        """
+        Write buffered timestamps to the users table.
+
+        Returns the number of users updated. On failure the timestamps go
+        back in the buffer so the next flush retries them.
+        """
+        seen, logins = self._drain()
+
+        if self._redis is not None:
+            try:
+                redis_seen, redis_logins = self._drain_redis()
+                _merge_latest(seen, redis_seen)
+                _merge_latest(logins, redis_logins)
+            except Exception:
+                pass
+
+        if not seen and not logins:
+            return 0
+
+        try:
+            _apply_timestamps('last_seen', seen)
+            _apply_timestamps('last_login', logins)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            with self._lock:
+                _merge_latest(self._pending, seen)
+                _merge_latest(self._logins, logins)
+            raise
+
+        return len(set(seen) | set(logins))
+
+    def _drain(self):
+        """Swap out the local buffers and forget users gone offline."""
+        cutoff = time.time() - self.online_seconds
+        with self._lock:
+            seen, self._pending = self._pending, {}
+            logins, self._logins = self._logins, {}
+            self._recent = {uid: ts for uid, ts in self._recent.items() if ts >= cutoff}
+        return seen, logins
+
+    def _drain_redis(self):
+        """Grab and clear the shared buffers atomically, trim the online set."""
+        pipe = self._redis.pipeline(transaction=True)
+        pipe.hgetall(self.PENDING_KEY)
+        pipe.hgetall(self.LOGINS_KEY)
+        pipe.delete(self.PENDING_KEY, self.LOGINS_KEY)
+        pipe.zremrangebyscore(self.ONLINE_KEY, '-inf', time.time() - self.online_seconds)
+        seen, logins, _, _ = pipe.execute()
+
+        def decode(raw):
+            return {int(k): float(v) for k, v in raw.items()}
+
+        return decode(seen), decode(logins)
+
+
+def _merge_latest(target, source):
+    """Keep the most recent timestamp per user."""
+    for user_id, ts in source.items():
+        if ts > target.get(user_id, 0):
+            target[user_id] = ts
+
+
+def _apply_timestamps(column, timestamps):
+    """
+    UPDATE users SET <column> = ts for many rows, never moving it backwards.
+
+    Same executemany approach as the view counter - one round trip.
+    """
+    if not timestamps:
+        return
+
+    db.session.execute(
+        text(
+            f'UPDATE users SET {column} = :ts '
+            f'WHERE id = :id AND ({column} IS NULL OR {column} < :ts)'
+        ),
+        [
+            {'id': user_id, 'ts': datetime.utcfromtimestamp(ts)}
+            for user_id, ts in sorted(timestamps.items())
+        ],
+    )
+
+
+# Shared instance - bound to the app in create_app()
+presence = PresenceTracker()
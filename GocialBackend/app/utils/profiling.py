@@ -0,0 +1,206 @@
+"""
+SQL query profiling
+
+SQLALCHEMY_ECHO prints every statement and tells nothing about which
+endpoint sent them. This counts queries per request instead:
+
+- number of queries and total DB time
+- repeated statement shapes (same SQL, different parameters) - the
+  usual N+1 signature, e.g. "SELECT ... FROM users WHERE users.id = ?"
+  fired once per activity of the feed
+- reported in a Server-Timing header (shows up in browser dev tools) and
+  one log line per request: always at DEBUG, at WARNING when a shape
+  repeats QUERY_N_PLUS_ONE_THRESHOLD times or more
+
+The cursor listeners are installed once on Engine and only record while
+a collector is active - a request (QUERY_PROFILING on) or a test using
+count_queries() / assert_max_queries() - so nothing gets attached or
+detached per request.
+
+Tests:
+
+    with assert_max_queries(5):
+        client.get('/api/activities/', headers=headers)
+"""
+
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from flask import current_app, g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+# "IN (?, ?, ?)" and "IN (__[POSTCOMPILE_ids])" expand differently per call
+_IN_LIST_RE = re.compile(r'\bIN \((?:[^()]*)\)', re.I)
+_LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+_SPACES_RE = re.compile(r'\s+')
+
+_local = threading.local()
+
+
+def statement_shape(statement):
+    """SQL with literals and IN lists folded, so calls differing only by values match."""
+    shape = _IN_LIST_RE.sub('IN (?)', statement)
+    shape = _LITERAL_RE.sub('?', shape)
+    return _SPACES_RE.sub(' ', shape).strip()
+
+
+class QueryCollector:
+    """Queries seen while active."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = []
+        self.shapes = Counter()
+
+    def record(self, statement, duration):
+        self.count += 1
+        self.duration += duration
+        self.statements.append(statement)
+        self.shapes[statement_shape(statement)] += 1
+
+    def repeated(self, threshold=2):
+        """[(shape, count)] for shapes run at least threshold times, worst first."""
+        return [(shape, n) for shape, n in self.shapes.most_common() if n >= threshold]
+
+
+def _active_collectors():
+    collectors = getattr(_local, 'collectors', None)
+    if collectors is None:
+        collectors = _local.collectors = []
+    return collectors
+
+
+@contextmanager
+def count_queries():
+    """Record every query run by this thread inside the block."""
+    collector = QueryCollector()
+    collectors = _active_collectors()
+    collectors.append(collector)
+    try:
+        yield collector
+    finally:
+        collectors.remove(collector)
+
+
+@contextmanager
+def assert_max_queries(budget):
+    """Fail if the block runs more than budget queries (test helper)."""
+    with count_queries() as collector:
+        yield collector
+
+    if collector.count > budget:
+        details = '\n'.join(f'  {n}x {shape}' for shape, n in collector.shapes.most_common())
+        raise AssertionError(f'{collector.count} queries, budget is {budget}:\n{details}')
+
+
+# ---------------------------------------------------------------------
+# Engine listeners (installed once, per process)
+# ---------------------------------------------------------------------
+
+_installed = False
+
+
+def _install_listeners():
+    global _installed
+    if _installed:
+        return
+
+    @event.listens_for(Engine, 'before_cursor_execute')
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if getattr(_local, 'collectors', None):
+            conn.info.setdefault('_query_start', []).append(time.perf_counter())
+
+    @event.listens_for(Engine, 'after_cursor_execute')
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        collectors = getattr(_local, 'collectors', None)
+        starts = conn.info.get('_query_start')
+        if not collectors or not starts:
+            return
+        duration = time.perf_counter() - starts.pop()
+        for collector in collectors:
+            collector.record(statement, duration)
+
+    _installed = True
+
+
+# ---------------------------------------------------------------------
+# Per request
+# ---------------------------------------------------------------------
+
+class QueryProfiler:
+    """
+    Usage:
+        query_profiler.init_app(app)      # in create_app(), QUERY_PROFILING on
+    """
+
+    def __init__(self, app=None):
+        self.threshold = 5
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        _install_listeners()
+        app.extensions['query_profiler'] = self
+
+        if not app.config.get('QUERY_PROFILING', False):
+            return
+
+        self.threshold = app.config.get('QUERY_N_PLUS_ONE_THRESHOLD', 5)
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        app.teardown_request(self._cleanup)
+
+    def _start(self):
+        g._query_profile = collector = QueryCollector()
+        g._query_profile_started = time.perf_counter()
+        _active_collectors().append(collector)
+
+    def _finish(self, response):
+        collector = g.pop('_query_profile', None)
+        if collector is None:
+            return response
+        self._detach(collector)
+
+        total_ms = (time.perf_counter() - g.pop('_query_profile_started')) * 1000
+        db_ms = collector.duration * 1000
+
+        response.headers.add(
+            'Server-Timing',
+            f'db;dur={db_ms:.1f};desc="{collector.count} queries", app;dur={total_ms - db_ms:.1f}',
+        )
+
+        repeated = collector.repeated(self.threshold)
+        message = (
+            f'query_profile endpoint={request.endpoint} method={request.method} '
+            f'status={response.status_code} queries={collector.count} '
+            f'db_ms={db_ms:.1f} total_ms={total_ms:.1f}'
+        )
+        if repeated:
+            shapes = '; '.join(f'{n}x {shape[:200]}' for shape, n in repeated)
+            current_app.logger.warning(f'{message} n_plus_one="{shapes}"')
+        else:
+            current_app.logger.debug(message)
+
+        return response
+
+    def _cleanup(self, exc=None):
+        # after_request is skipped on unhandled errors - don't leak the collector
+        collector = g.pop('_query_profile', None)
+        if collector is not None:
+            self._detach(collector)
+
+    @staticmethod
+    def _detach(collector):
+        collectors = _active_collectors()
+        if collector in collectors:
+            collectors.remove(collector)
+
+
+# Shared instance - bound to the app in create_app()
+query_profiler = QueryProfiler()
@@ -0,0 +1,281 @@
+"""
+Rate limiting
+
+GCRA (generic cell rate algorithm) - a token bucket that only needs one
+number per key: the "theoretical arrival time" of the next request.
+Allows bursts up to the full limit, then one request every
+period / limit seconds.
+
+Backends:
+- memory: per process, one dict + a lock held for a few float ops
+- redis: shared between workers, one atomic Lua script per check
+
+Two layers:
+- RATELIMIT_DEFAULT (e.g. "1000/hour") on every request, per user
+  (or per IP when anonymous)
+- @rate_limit(...) on sensitive routes (login, register, messaging...)
+
+Responses carry X-RateLimit-Limit / -Remaining / -Reset (seconds until
+the bucket is full again) for the tightest limit hit, and 429 + Retry-After
+when a limit is exceeded.
+"""
+
+import math
+import re
+import threading
+import time
+from collections import namedtuple
+from functools import wraps
+
+from flask import current_app, g, jsonify, request
+from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+
+from app.utils.redis_client import get_redis
+
+
+RateLimitResult = namedtuple('RateLimitResult', 'allowed limit remaining reset_after retry_after')
+
+PERIODS = {
+    'second': 1,
+    'minute': 60,
+    'hour': 3600,
+    'day': 86400,
+}
+
+# Paths never counted against the default limit. The unread counters are
+# polled by the mobile app all day long - they carry their own per-route
+# limit instead of eating the user's default budget.
+EXEMPT_PATHS = (
+    '/health',
+    '/uploads/',
+    '/metrics',
+    '/api/messages/unread-count',
+    '/api/notifications/unread-count',
+)
+
+_RATE_RE = re.compile(r'^\s*(\d+)\s*(?:/|per)\s*(\d*)\s*(second|minute|hour|day)s?\s*$', re.I)
+
+
+def parse_rate(rate):
+    """
+    "100/hour", "5 per minute", "10/30 seconds" -> (limit, period_seconds)
+    """
+    match = _RATE_RE.match(rate or '')
+    if not match:
+        raise ValueError(f'Invalid rate limit: {rate!r}')
+    limit, multiplier, unit = match.groups()
+    return int(limit), int(multiplier or 1) * PERIODS[unit.lower()]
+
+
+# ---------------------------------------------------------------------
+# Backends
+# ---------------------------------------------------------------------
+
+class MemoryBackend:
+    """Per-process GCRA state. Fine for dev and single-worker setups."""
+
+    PRUNE_EVERY = 1000
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tat = {}
+        self._calls = 0
+
+    def hit(self, key, limit, period):
+        now = time.monotonic()
+        interval = period / limit
+
+        with self._lock:
+            tat = max(self._tat.get(key, now), now)
+            new_tat = tat + interval
+
+            if new_tat - period > now:
+                return _result(False, limit, period, interval, tat - now, new_tat - period - now)
+
+            self._tat[key] = new_tat
+
+            self._calls += 1
+            if self._calls % self.PRUNE_EVERY == 0:
+                self._tat = {k: v for k, v in self._tat.items() if v > now}
+
+        return _result(True, limit, period, interval, new_tat - now, 0.0)
+
+    def reset(self):
+        with self._lock:
+            self._tat.clear()
+
+
+class RedisBackend:
+    """Shared GCRA state - the whole check runs as one Lua script."""
+
+    # Returns {allowed, occupied_seconds, retry_after_seconds} as strings
+    # (Lua numbers would be truncated to integers on the way out).
+    SCRIPT = """
+local key = KEYS[1]
+local interval = tonumber(ARGV[1])
+local period = tonumber(ARGV[2])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+
+local tat = tonumber(redis.call('GET', key) or now)
+if tat < now then tat = now end
+local new_tat = tat + interval
+
+if new_tat - period > now then
+    return {0, tostring(tat - now), tostring(new_tat - period - now)}
+end
+
+redis.call('SET', key, tostring(new_tat), 'PX', math.ceil((new_tat - now) * 1000))
+return {1, tostring(new_tat - now), '0'}
+"""
+
+    PREFIX = 'ratelimit:'
+
+    def __init__(self, client):
+        self._client = client
+        self._script = client.register_script(self.SCRIPT)
+
+    def hit(self, key, limit, period):
+        interval = period / limit
+        allowed, occupied, retry_after = self._script(keys=[self.PREFIX + key], args=[interval, period])
+        return _result(bool(int(allowed)), limit, period, interval, float(occupied), float(retry_after))
+
+    def reset(self):
+        pass  # keys expire on their own
+
+
+def _result(allowed, limit, period, interval, occupied, retry_after):
+    """Build a RateLimitResult from the GCRA state (occupied = tat - now)."""
+    remaining = max(0, int((period - occupied) // interval)) if allowed else 0
+    return RateLimitResult(allowed, limit, remaining, max(0.0, occupied), max(0.0, retry_after))
+
+
+# ---------------------------------------------------------------------
+# Limiter
+# ---------------------------------------------------------------------
+
+class RateLimiter:
+    """
+    Usage:
+        limiter.init_app(app)                 # in create_app()
+
+        @rate_limit(10, 60)                   # per IP
+        @rate_limit(30, 60, per='user')       # per authenticated user
+    """
+
+    def __init__(self, app=None):
+        self._backend = MemoryBackend()
+        self._memory = self._backend
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        client = get_redis(app)
+        self._backend = RedisBackend(client) if client is not None else MemoryBackend()
+        self._memory = MemoryBackend()
+
+        app.before_request(self._check_default)
+        app.after_request(self._add_headers)
+        app.extensions['rate_limiter'] = self
+
+    @property
+    def enabled(self):
+        return current_app.config.get('RATELIMIT_ENABLED', False)
+
+    def reset(self):
+        self._backend.reset()
+        self._memory.reset()
+
+    def hit(self, key, limit, period):
+        """Count one request against key. Redis errors fall back to memory."""
+        try:
+            result = self._backend.hit(key, limit, period)
+        except Exception:
+            result = self._memory.hit(key, limit, period)
+
+        # Headers report whichever limit is closest to tripping
+        current = g.get('_rate_limit')
+        if current is None or result.remaining < current.remaining or not result.allowed:
+            g._rate_limit = result
+        return result
+
+    def check(self, scope, limit, period, per='ip'):
+        """Hit the bucket for scope + caller. Returns a 429 response or None."""
+        result = self.hit(f'{scope}:{_caller_key(per)}', limit, period)
+        if result.allowed:
+            return None
+        return _too_many_requests(result)
+
+    # -----------------------------------------------------------------
+    # Request hooks
+    # -----------------------------------------------------------------
+
+    def _check_default(self):
+        if not self.enabled or request.method == 'OPTIONS' or request.path.startswith(EXEMPT_PATHS):
+            return None
+
+        default = current_app.config.get('RATELIMIT_DEFAULT')
+        if not default:
+            return None
+
+        limit, period = parse_rate(default)
+        return self.check('default', limit, period, per='user')
+
+    def _add_headers(self, response):
+        result = g.get('_rate_limit')
+        if result is not None:
+            response.headers['X-RateLimit-Limit'] = str(result.limit)
+            response.headers['X-RateLimit-Remaining'] = str(result.remaining)
+            response.headers['X-RateLimit-Reset'] = str(math.ceil(result.reset_after))
+            if not result.allowed:
+                response.headers['Retry-After'] = str(max(1, math.ceil(result.retry_after)))
+        return response
+
+
+def _caller_key(per):
+    """
+    'user' -> the JWT identity when there's a valid token, else the IP.
+    'ip'   -> always the client IP (login, register...).
+
+    Behind a load balancer remote_addr is the proxy's address - set
+    PROXY_FIX_HOPS so it's the real client's (see create_app()).
+    """
+    if per == 'user':
+        try:
+            verify_jwt_in_request(optional=True)
+            identity = get_jwt_identity()
+        except Exception:
+            identity = None  # bad/expired token - the route will reject it anyway
+        if identity is not None:
+            return f'user:{identity}'
+    return f'ip:{request.remote_addr}'
+
+
+def _too_many_requests(result):
+    response = jsonify({
+        'error': 'Trop de requêtes, veuillez réessayer plus tard',
+        'code': 'rate_limited',
+        'retry_after': max(1, math.ceil(result.retry_after)),
+    })
+    response.status_code = 429
+    return response
+
+
+def limit_route(max_requests, window_seconds=60, per='ip', scope=None):
+    """Decorator factory behind app.utils.rate_limit."""
+    def decorator(f):
+        route_scope = scope or f'{f.__module__}.{f.__name__}'
+
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            if limiter.enabled:
+                rejected = limiter.check(route_scope, max_requests, window_seconds, per=per)
+                if rejected is not None:
+                    return rejected
+            return f(*args, **kwargs)
+        return decorated
+    return decorator
+
+
+# Shared instance - bound to the app in create_app()
+limiter = RateLimiter()
@@ -0,0 +1,110 @@
+"""
+Rating aggregates - `flask reconcile-ratings`
+
+UserRatingAggregate is updated incrementally as evaluations come in
+(app/models/social.py). This recomputes every user's aggregate from
+the source rows - evaluations still in the hot table plus the
+archived_user_ratings summaries - and fixes the ones that drifted
+(manual SQL, a bug, a restore...).
+
+Users are processed in keyset batches, one transaction each. Their
+existing aggregates are locked first (FOR UPDATE on PostgreSQL), so an
+evaluation submitted mid-batch waits instead of being overwritten.
+Missing aggregates can't be locked: they're written with an upsert, so
+a user getting their first evaluation mid-batch doesn't make the batch
+fail on a duplicate key (if our write lands last, the next run adds
+that evaluation back).
+"""
+
+from collections import namedtuple
+
+from sqlalchemy import case, delete, func, select
+
+from app import db
+from app.models import ArchivedUserRating, Evaluation, User, UserRatingAggregate
+
+
+ReconcileStats = namedtuple('ReconcileStats', 'users fixed removed')
+
+
+def expected_counts(user_ids):
+    """{user_id: {column: value}} recomputed from evaluations + archived summaries."""
+    columns = [
+        func.count(Evaluation.id),
+        func.sum(Evaluation.rating),
+        *(func.sum(case((Evaluation.rating == n, 1), else_=0)) for n in range(1, 6)),
+        func.sum(case((Evaluation.was_present == False, 1), else_=0)),  # noqa: E712
+    ]
+    rows = db.session.execute(
+        select(Evaluation.evaluated_id, *columns)
+        .where(Evaluation.evaluated_id.in_(user_ids))
+        .group_by(Evaluation.evaluated_id)
+    )
+
+    expected = {
+        user_id: dict(zip(UserRatingAggregate.COUNT_COLUMNS, (value or 0 for value in values)))
+        for user_id, *values in rows
+    }
+
+    for archived in db.session.scalars(select(ArchivedUserRating).where(ArchivedUserRating.user_id.in_(user_ids))):
+        counts = expected.setdefault(archived.user_id, dict.fromkeys(UserRatingAggregate.COUNT_COLUMNS, 0))
+        for column, value in archived.counts().items():
+            counts[column] += value
+
+    return expected
+
+
+def reconcile_ratings(batch_size=1000, progress=None):
+    """
+    Rebuild every UserRatingAggregate from scratch.
+
+    progress: optional callable(ReconcileStats so far), called after each batch.
+    Returns ReconcileStats: users checked, aggregates fixed or created,
+    aggregates removed (users without any evaluation).
+    """
+    users = fixed = removed = 0
+    last_id = 0
+
+    while True:
+        user_ids = db.session.scalars(
+            select(User.id).where(User.id > last_id).order_by(User.id).limit(batch_size)
+        ).all()
+        if not user_ids:
+            break
+
+        current = {
+            row.user_id: row
+            for row in db.session.scalars(
+                select(UserRatingAggregate)
+                .where(UserRatingAggregate.user_id.in_(user_ids))
+                .with_for_update()
+            )
+        }
+        expected = expected_counts(user_ids)
+
+        missing = {}
+        for user_id, counts in expected.items():
+            aggregate = current.get(user_id)
+            if aggregate is None:
+                missing[user_id] = counts
+            elif aggregate.counts() != counts:
+                for column, value in counts.items():
+                    setattr(aggregate, column, value)
+                fixed += 1
+
+        UserRatingAggregate.set_counts(missing)
+        fixed += len(missing)
+
+        stale = [user_id for user_id in current if user_id not in expected]
+        if stale:
+            db.session.execute(delete(UserRatingAggregate).where(UserRatingAggregate.user_id.in_(stale)))
+            removed += len(stale)
+
+        db.session.commit()
+
+        users += len(user_ids)
+        last_id = user_ids[-1]
+        if progress:
+            progress(ReconcileStats(users, fixed, removed))
+
+    return ReconcileStats(users, fixed, removed)
@@ -0,0 +1,287 @@
+"""
+"For you" activity recommendations
+
+Built offline (nightly cron: `flask build-recommendations`) and stored in
+UserRecommendation, so GET /api/activities/recommended is one lookup.
+
+How a candidate activity is scored for a user:
+- category affinity: categories they joined (x2) or liked (x1) before
+- passions: category/subcategory mentioned in User.passions
+- friends: how many of their friends are already going
+- distance: close by (coordinates) or at least same city
+- popularity: a pinch of the trending score
+
+Everything is batched: the candidate pool is loaded once, then users are
+processed USER_BATCH_SIZE at a time with a handful of GROUP BY queries per
+batch. Each user only scores a pre-filtered candidate set (their
+categories, their city, their friends' activities, the global top), so
+the cost grows with users x relevant candidates, not users x all activities.
+"""
+
+import heapq
+import math
+from collections import defaultdict
+from datetime import datetime
+
+from sqlalchemy import func, or_
+
+from app import db
+from app.models import Activity, ActivityLike, Friendship, Participation, User, UserRecommendation
+from app.utils import haversine
+
+
+KIND = 'activities'
+TOP_N = 50
+USER_BATCH_SIZE = 500
+POPULAR_POOL_SIZE = 100
+
+# Scoring weights
+AFFINITY_WEIGHT = 3.0
+PASSION_WEIGHT = 1.0
+FRIENDS_WEIGHT = 2.0
+DISTANCE_WEIGHT = 1.5
+CITY_WEIGHT = 0.75
+POPULARITY_WEIGHT = 0.5
+
+DISTANCE_SCALE_KM = 25  # score halves-ish every ~17 km
+FRIENDS_SATURATION = 3  # 3+ friends going = max social signal
+
+JOINED_WEIGHT = 2
+LIKED_WEIGHT = 1
+
+
+class _CandidatePool:
+    """Upcoming joinable activities plus the indexes used to pre-filter them."""
+
+    def __init__(self, now):
+        self.activities = {}
+        self.by_category = defaultdict(set)
+        self.by_city = defaultdict(set)
+        self.by_participant = defaultdict(set)
+        self.participants = defaultdict(set)
+        self.popular = set()
+        self.max_trending = 0.0
+
+        rows = db.session.query(
+            Activity.id,
+            Activity.host_id,
+            Activity.category,
+            Activity.subcategory,
+            Activity.city,
+            Activity.latitude,
+            Activity.longitude,
+            Activity.trending_score,
+            Activity.visibility,
+            Activity.gender_restriction,
+            Activity.min_age,
+            Activity.max_age,
+        ).filter(*self.filters(now)).all()
+
+        for row in rows:
+            self.activities[row.id] = row
+            self.by_category[(row.category or '').lower()].add(row.id)
+            if row.city:
+                self.by_city[row.city.lower()].add(row.id)
+            self.max_trending = max(self.max_trending, row.trending_score or 0)
+
+        self.popular = set(heapq.nlargest(
+            POPULAR_POOL_SIZE, self.activities,
+            key=lambda aid: self.activities[aid].trending_score or 0,
+        ))
+
+        # Who's already going where (validated participants + host)
+        going = db.session.query(Participation.activity_id, Participation.user_id).join(
+            Activity, Activity.id == Participation.activity_id
+        ).filter(Participation.status == 'validated', *self.filters(now))
+
+        for activity_id, user_id in going:
+            self.participants[activity_id].add(user_id)
+            self.by_participant[user_id].add(activity_id)
+
+        for row in rows:
+            self.participants[row.id].add(row.host_id)
+            self.by_participant[row.host_id].add(row.id)
+
+    @staticmethod
+    def filters(now):
+        return (
+            Activity.status == 'published',
+            Activity.visibility.in_(('public', 'friends')),
+            Activity.date >= now,
+        )
+
+
+def build_activity_recommendations(top_n=TOP_N, batch_size=USER_BATCH_SIZE, now=None, progress=None):
+    """
+    Recompute the "for you" list of every active user.
+
+    progress: optional callable(processed_users) for CLI output.
+    Returns the number of users processed.
+    """
+    now = now or datetime.utcnow()
+    pool = _CandidatePool(now)
+
+    processed = 0
+    last_id = 0
+
+    while True:
+        users = db.session.query(
+            User.id, User.city, User.latitude, User.longitude,
+            User.passions, User.gender, User.birth_date,
+        ).filter(
+            User.id > last_id,
+            User.is_active == True,
+        ).order_by(User.id).limit(batch_size).all()
+
+        if not users:
+            break
+
+        _build_batch(users, pool, top_n, now)
+
+        processed += len(users)
+        last_id = users[-1].id
+        if progress:
+            progress(processed)
+
+    return processed
+
+
+def _build_batch(users, pool, top_n, now):
+    """Score one batch of users and replace their stored lists."""
+    user_ids = [u.id for u in users]
+
+    affinity = _category_affinity(user_ids)
+    friends = _friend_sets(user_ids)
+
+    # Activities each user already joined/requested - don't recommend those
+    joined = defaultdict(set)
+    for user_id, activity_id in db.session.query(Participation.user_id, Participation.activity_id).filter(
+        Participation.user_id.in_(user_ids)
+    ):
+        joined[user_id].add(activity_id)
+
+    rows = []
+    for user in users:
+        ranked = _rank_for_user(user, pool, affinity.get(user.id, {}), friends.get(user.id, set()),
+                                joined[user.id], top_n, now)
+        rows.append({
+            'user_id': user.id,
+            'item_ids': [activity_id for _, activity_id in ranked],
+            'scores': [round(score, 4) for score, _ in ranked],
+            'computed_at': now,
+        })
+
+    UserRecommendation.replace_for(KIND, user_ids, rows)
+    db.session.commit()
+
+
+def _category_affinity(user_ids):
+    """user_id -> {category: normalized affinity 0..1}, from joins and likes."""
+    counts = defaultdict(lambda: defaultdict(float))
+
+    joined = db.session.query(
+        Participation.user_id, Activity.category, func.count(Participation.id)
+    ).join(Activity, Activity.id == Participation.activity_id).filter(
+        Participation.user_id.in_(user_ids),
+        Participation.status == 'validated',
+    ).group_by(Participation.user_id, Activity.category)
+
+    liked = db.session.query(
+        ActivityLike.user_id, Activity.category, func.count(ActivityLike.id)
+    ).join(Activity, Activity.id == ActivityLike.activity_id).filter(
+        ActivityLike.user_id.in_(user_ids),
+    ).group_by(ActivityLike.user_id, Activity.category)
+
+    for user_id, category, n in joined:
+        counts[user_id][(category or '').lower()] += n * JOINED_WEIGHT
+    for user_id, category, n in liked:
+        counts[user_id][(category or '').lower()] += n * LIKED_WEIGHT
+
+    affinity = {}
+    for user_id, per_category in counts.items():
+        top = max(per_category.values())
+        affinity[user_id] = {cat: value / top for cat, value in per_category.items()}
+    return affinity
+
+
+def _friend_sets(user_ids):
+    """user_id -> set of accepted friend ids (friendships are stored one way)."""
+    wanted = set(user_ids)
+    friends = defaultdict(set)
+
+    rows = db.session.query(Friendship.user_id, Friendship.friend_id).filter(
+        Friendship.status == 'accepted',
+        or_(Friendship.user_id.in_(user_ids), Friendship.friend_id.in_(user_ids)),
+    )
+    for a, b in rows:
+        if a in wanted:
+            friends[a].add(b)
+        if b in wanted:
+            friends[b].add(a)
+    return friends
+
+
+def _rank_for_user(user, pool, affinity, friends, joined, top_n, now):
+    """Return [(score, activity_id)] best first."""
+    passions = _passion_terms(user.passions)
+    city = (user.city or '').lower()
+    age = _age(user.birth_date, now)
+
+    # Pre-filter: only score activities with at least one reason to be here
+    candidate_ids = set(pool.popular)
+    for category in set(affinity) | passions:
+        candidate_ids |= pool.by_category.get(category, set())
+    if city:
+        candidate_ids |= pool.by_city.get(city, set())
+    for friend_id in friends:
+        candidate_ids |= pool.by_participant.get(friend_id, set())
+
+    candidate_ids -= joined
+
+    scored = []
+    for activity_id in candidate_ids:
+        activity = pool.activities[activity_id]
+
+        if activity.host_id == user.id:
+            continue
+        if activity.visibility == 'friends' and activity.host_id not in friends:
+            continue
+        if activity.gender_restriction == 'female' and user.gender != 'female':
+            continue
+        if age is not None and not (activity.min_age or 0) <= age <= (activity.max_age or 200):
+            continue
+
+        category = (activity.category or '').lower()
+        score = AFFINITY_WEIGHT * affinity.get(category, 0.0)
+
+        if category in passions or (activity.subcategory or '').lower() in passions:
+            score += PASSION_WEIGHT
+
+        friends_going = len(pool.participants[activity_id] & friends)
+        score += FRIENDS_WEIGHT * min(1.0, friends_going / FRIENDS_SATURATION)
+
+        if None not in (user.latitude, user.longitude, activity.latitude, activity.longitude):
+            distance = haversine(user.longitude, user.latitude, activity.longitude, activity.latitude)
+            score += DISTANCE_WEIGHT * math.exp(-distance / DISTANCE_SCALE_KM)
+        elif city and (activity.city or '').lower() == city:
+            score += CITY_WEIGHT
+
+        if pool.max_trending > 0:
+            score += POPULARITY_WEIGHT * (activity.trending_score or 0) / pool.max_trending
+
+        scored.append((score, activity_id))
+
+    return heapq.nlargest(top_n, scored)
+
+
+def _passion_terms(passions):
+    if not passions:
+        return set()
+    return {term.strip().lower() for term in passions.split(',') if term.strip()}
+
+
+def _age(birth_date, now):
+    if not birth_date:
+        return None
+    today = now.date()
+    return today.year - birth_date.year - ((today.month, today.day) < (birth_date.month, birth_date.day))
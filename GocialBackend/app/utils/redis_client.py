@@ -0,0 +1,33 @@
+"""
+Optional Redis connection
+
+Redis is nice-to-have, not required. When REDIS_URL isn't set (or the
+redis package isn't installed) everything falls back to per-process
+in-memory structures, which is fine for dev and single-worker setups.
+"""
+
+try:
+    import redis
+except ImportError:  # pragma: no cover - redis is optional
+    redis = None
+
+
+def get_redis(app):
+    """
+    Return a shared Redis client for this app, or None.
+
+    The client is created once and cached on app.extensions.
+    """
+    if 'redis' in app.extensions:
+        return app.extensions['redis']
+
+    client = None
+    url = app.config.get('REDIS_URL')
+
+    if url and redis is not None:
+        client = redis.Redis.from_url(url, socket_timeout=1, socket_connect_timeout=1)
+    elif url:
+        app.logger.warning('REDIS_URL is set but the redis package is not installed')
+
+    app.extensions['redis'] = client
+    return client
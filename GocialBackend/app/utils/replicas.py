@@ -0,0 +1,241 @@
+"""
+Read replica routing
+
+Almost everything the app does is reading (feed, profiles, conversations,
+notifications, ratings), and all of it went to the primary. With
+REPLICA_DATABASE_URL set, SELECTs are sent to the replica when:
+
+- the request is a GET/HEAD, or
+- the code runs inside read_only() (decorator or `with` block) - for
+  read-only POST endpoints, CLI reports, background jobs...
+
+as long as none of the rules below applies. Always on the primary:
+
+- writes, SELECT ... FOR UPDATE, anything inside primary()
+- the rest of a request once it has written something
+- read-your-writes: for REPLICA_STICKY_SECONDS after a user (or, when
+  anonymous, an IP) wrote, their reads stay on the primary, so a new
+  activity shows up in their own feed right away whatever the lag.
+  A request that hands out tokens (register, login) makes that user
+  sticky as well - their next request comes with the token, not the IP
+- everything while the replica is down: a connection error takes it
+  out of rotation for REPLICA_RETRY_SECONDS (that one query fails, the
+  next ones don't)
+
+Routing happens in a do_orm_execute listener, so models and queries
+don't change. The replica engine lives outside SQLALCHEMY_BINDS on
+purpose: db.create_all() and migrations only ever touch the primary.
+Stickiness is per process, or shared through Redis when configured
+(needed with several gunicorn workers).
+
+Locally: REPLICA_DATABASE_URL=sqlite:///replica.db works - just keep in
+mind nothing copies the data over.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import current_app, g, has_request_context, request
+from flask_jwt_extended import get_jwt_identity
+from sqlalchemy import event
+
+from app import db
+from app.utils.database import create_replica_engine
+from app.utils.redis_client import get_redis
+
+
+READ_METHODS = ('GET', 'HEAD')
+
+_local = threading.local()
+
+
+class ReplicaRouter:
+    """
+    Usage:
+        replica_router.init_app(app)     # in create_app()
+
+        @read_only()                     # route reads to the replica
+        def search_users(): ...
+
+        with primary():                  # must see the latest data
+            ...
+    """
+
+    KEY = 'db:sticky:{key}'
+
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self._sticky = {}
+        self._redis = None
+        self._down_until = 0.0
+        self.engine = None
+        self.sticky_seconds = 5
+        self.retry_seconds = 30
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.sticky_seconds = app.config.get('REPLICA_STICKY_SECONDS', 5)
+        self.retry_seconds = app.config.get('REPLICA_RETRY_SECONDS', 30)
+        self._redis = get_redis(app)
+        self._down_until = 0.0
+        with self._lock:
+            self._sticky.clear()
+
+        app.extensions['replica_router'] = self
+        url = app.config.get('REPLICA_DATABASE_URL')
+        if not url:
+            self.engine = None
+            return
+
+        self.engine = create_replica_engine(app.config, url)
+        event.listen(self.engine, 'handle_error', self._on_error)
+        app.before_request(self._reset)
+        app.after_request(self._remember_writes)
+
+        # db.session is shared by every app instance - listen only once
+        if not event.contains(db.session, 'do_orm_execute', _route_select):
+            event.listen(db.session, 'do_orm_execute', _route_select)
+            event.listen(db.session, 'after_flush', _note_write)
+
+    # -----------------------------------------------------------------
+    # Routing decision
+    # -----------------------------------------------------------------
+
+    @property
+    def available(self):
+        return time.monotonic() >= self._down_until
+
+    def replica_engine(self):
+        """Replica engine if this query may use it, else None."""
+        engine = self.engine
+        if engine is None or getattr(_local, 'primary', 0) or not self.available:
+            return None
+
+        marked = getattr(_local, 'read_only', 0)
+        if not has_request_context():
+            return engine if marked else None
+        if g.get('_db_wrote') or (request.method not in READ_METHODS and not marked):
+            return None
+
+        if '_db_sticky' not in g:
+            g._db_sticky = self.is_sticky(_client_key())
+        return None if g._db_sticky else engine
+
+    def _on_error(self, context):
+        """A replica we can't reach leaves the rotation for a while."""
+        if context.is_disconnect or context.connection is None:
+            self._down_until = time.monotonic() + self.retry_seconds
+            current_app.logger.warning(
+                f'Read replica unavailable, using the primary for {self.retry_seconds}s: '
+                f'{context.original_exception}'
+            )
+
+    # -----------------------------------------------------------------
+    # Read-your-writes
+    # -----------------------------------------------------------------
+
+    def mark_sticky(self, key):
+        if self._redis is not None:
+            try:
+                self._redis.set(self.KEY.format(key=key), 1, ex=self.sticky_seconds)
+                return
+            except Exception:
+                pass
+
+        now = time.monotonic()
+        with self._lock:
+            self._sticky = {k: v for k, v in self._sticky.items() if v > now}
+            self._sticky[key] = now + self.sticky_seconds
+
+    def is_sticky(self, key):
+        if self._redis is not None:
+            try:
+                return bool(self._redis.exists(self.KEY.format(key=key)))
+            except Exception:
+                pass
+
+        return self._sticky.get(key, 0) > time.monotonic()
+
+    def _reset(self):
+        # g lives on the app context, which an outer `with app.app_context()` shares
+        g.pop('_db_wrote', None)
+        g.pop('_db_sticky', None)
+        g.pop('_db_token_user', None)
+
+    def _remember_writes(self, response):
+        if g.get('_db_wrote'):
+            self.mark_sticky(_client_key())
+            issued = g.get('_db_token_user')
+            if issued is not None:
+                self.mark_sticky(f'user:{issued}')
+        return response
+
+
+def remember_token_user(user_id):
+    """Tokens were issued for user_id in this request - their reads stick too."""
+    if has_request_context():
+        g._db_token_user = user_id
+
+
+def _client_key():
+    """
+    Who wrote: the JWT user, or the IP for anonymous requests (register, login).
+
+    remote_addr is the real client's behind a load balancer once
+    PROXY_FIX_HOPS is set (see create_app()).
+    """
+    try:
+        identity = get_jwt_identity()
+    except RuntimeError:  # no JWT checked for this request
+        identity = None
+    if identity is not None:
+        return f'user:{identity}'
+    return f'ip:{request.remote_addr}'
+
+
+def _route_select(orm_execute_state):
+    """do_orm_execute: send plain SELECTs to the replica when allowed."""
+    if not orm_execute_state.is_select or orm_execute_state.bind_arguments.get('bind') is not None:
+        return
+    if orm_execute_state.statement._for_update_arg is not None:
+        return
+
+    engine = replica_router.replica_engine()
+    if engine is not None:
+        orm_execute_state.bind_arguments['bind'] = engine
+
+
+def _note_write(session, flush_context):
+    """after_flush: this request wrote - stay on the primary from now on."""
+    if has_request_context():
+        g._db_wrote = True
+
+
+# ---------------------------------------------------------------------
+# Explicit routing
+# ---------------------------------------------------------------------
+
+@contextmanager
+def read_only():
+    """Reads inside go to the replica (when there is one), whatever the HTTP method."""
+    _local.read_only = getattr(_local, 'read_only', 0) + 1
+    try:
+        yield
+    finally:
+        _local.read_only -= 1
+
+
+@contextmanager
+def primary():
+    """Everything inside hits the primary - wins over read_only()."""
+    _local.primary = getattr(_local, 'primary', 0) + 1
+    try:
+        yield
+    finally:
+        _local.primary -= 1
+
+
+# Shared instance - bound to the app in create_app()
+replica_router = ReplicaRouter()
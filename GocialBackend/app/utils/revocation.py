@@ -0,0 +1,187 @@
+"""
+Token revocation & refresh rotation
+
+Every authenticated request asks "is this token still good?", so the
+check is a handful of key lookups - in-memory TTL dict, or one Redis
+MGET when REDIS_URL is set. Never SQL.
+
+A token is rejected when any of these is revoked:
+- its jti           (logout, refresh token already used)
+- its family        (logout, refresh token reuse detected)
+- its user, for tokens issued before the cutoff (account deactivated,
+  password changed)
+
+Rotation: each login starts a token "family" (the 'fam' claim, shared by
+the access and refresh tokens). /refresh burns the refresh token it got
+and hands out a new pair in the same family. If a burnt refresh token
+shows up again, someone kept a copy - the whole family is revoked and
+everybody (legit client included) has to log in again.
+
+Except within JWT_REFRESH_REUSE_GRACE_SECONDS of the first use: two
+refreshes racing each other (app resumed, several requests hitting 401
+at once) or a response lost on a flaky network would otherwise log the
+user out. The burn time is written once (set-if-absent), so replays
+can't stretch the window.
+
+Entries expire with the tokens they protect, so the store stays small.
+"""
+
+import threading
+import time
+import uuid
+
+from flask import current_app
+from flask_jwt_extended import create_access_token, create_refresh_token, get_jwt
+
+from app.utils.redis_client import get_redis
+from app.utils.replicas import remember_token_user
+
+
+class RevocationStore:
+    """
+    Usage:
+        revocations.revoke_token(jwt_payload)
+        revocations.revoke_family(fam)
+        revocations.revoke_user(user_id)
+        revocations.is_revoked(jwt_payload)     # token_in_blocklist_loader
+    """
+
+    PREFIX = 'revoked:'
+    PRUNE_EVERY = 500
+
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._writes = 0
+        self._redis = None
+        self.max_ttl = 30 * 86400
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        expires = app.config.get('JWT_REFRESH_TOKEN_EXPIRES')
+        self.max_ttl = int(expires.total_seconds()) if expires else 30 * 86400
+        self._redis = get_redis(app)
+        with self._lock:
+            self._entries.clear()
+        app.extensions['revocations'] = self
+
+    # -----------------------------------------------------------------
+    # Revoking
+    # -----------------------------------------------------------------
+
+    def revoke_token(self, jwt_payload):
+        """Burn one token until it would have expired anyway (first burn time wins)."""
+        now = time.time()
+        ttl = int(jwt_payload.get('exp', now + self.max_ttl) - now) + 1
+        self._set(f"jti:{jwt_payload['jti']}", int(now), ttl, only_new=True)
+
+    def revoke_family(self, family):
+        """Kill every access/refresh token of one login session."""
+        if family:
+            self._set(f'fam:{family}', 1, self.max_ttl)
+
+    def revoke_user(self, user_id):
+        """Reject every token of a user issued before now."""
+        self._set(f'user:{user_id}', int(time.time()), self.max_ttl)
+
+    # -----------------------------------------------------------------
+    # Checking
+    # -----------------------------------------------------------------
+
+    def is_revoked(self, jwt_payload):
+        jti_state, family_state, user_cutoff = self._get_many([
+            f"jti:{jwt_payload.get('jti')}",
+            f"fam:{jwt_payload.get('fam')}",
+            f"user:{jwt_payload.get('sub')}",
+        ])
+
+        if family_state is not None:
+            return True
+
+        if user_cutoff is not None and jwt_payload.get('iat', 0) < int(user_cutoff):
+            return True
+
+        if jti_state is not None:
+            if jwt_payload.get('type') == 'refresh' and self._in_grace(jti_state):
+                return False
+
+            if jwt_payload.get('type') == 'refresh' and jwt_payload.get('fam'):
+                # A refresh token used twice - treat the session as stolen
+                current_app.logger.warning(
+                    f"Refresh token reuse for user {jwt_payload.get('sub')}, revoking session"
+                )
+                self.revoke_family(jwt_payload['fam'])
+            return True
+
+        return False
+
+    def _in_grace(self, burnt_at):
+        grace = current_app.config.get('JWT_REFRESH_REUSE_GRACE_SECONDS', 0)
+        return grace > 0 and time.time() - int(burnt_at) < grace
+
+    # -----------------------------------------------------------------
+    # Storage
+    # -----------------------------------------------------------------
+
+    def _set(self, key, value, ttl, only_new=False):
+        if self._redis is not None:
+            try:
+                self._redis.set(self.PREFIX + key, value, ex=max(1, ttl), nx=only_new)
+                return
+            except Exception:
+                pass  # keep it at least in this process
+
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if only_new and entry and entry[1] > now:
+                return
+            self._entries[key] = (value, now + ttl)
+            self._writes += 1
+            if self._writes % self.PRUNE_EVERY == 0:
+                self._entries = {k: v for k, v in self._entries.items() if v[1] > now}
+
+    def _get_many(self, keys):
+        if self._redis is not None:
+            try:
+                return self._redis.mget([self.PREFIX + key for key in keys])
+            except Exception:
+                pass
+
+        now = time.monotonic()
+        values = []
+        for key in keys:
+            entry = self._entries.get(key)
+            values.append(entry[0] if entry and entry[1] > now else None)
+        return values
+
+
+revocations = RevocationStore()
+
+
+def issue_tokens(identity, family=None, claims=None):
+    """
+    New access + refresh pair sharing one family.
+
+    identity: a User (flags claim filled by the claims loader) or an id.
+    claims: extra claims for both tokens (e.g. flags carried over on refresh).
+    """
+    claims = dict(claims or {}, fam=family or uuid.uuid4().hex)
+    remember_token_user(getattr(identity, 'id', identity))
+    return (
+        create_access_token(identity=identity, additional_claims=claims),
+        create_refresh_token(identity=identity, additional_claims=claims),
+    )
+
+
+def reissue_access_token(identity):
+    """
+    New access token for the caller's current session (e.g. after a flag
+    change). Stays in the same family, so /logout with it still kills
+    the session's refresh token.
+    """
+    family = get_jwt().get('fam')
+    remember_token_user(getattr(identity, 'id', identity))
+    return create_access_token(identity=identity, additional_claims={'fam': family} if family else None)
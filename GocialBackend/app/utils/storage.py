@@ -0,0 +1,274 @@
+"""
+Upload storage backends
+
+Everything that used to assume a local UPLOAD_FOLDER (image pipeline,
+save_upload, delete_upload, get_upload_url) goes through one of these,
+so API containers don't need a shared disk:
+
+- LocalStorage: files under UPLOAD_FOLDER (dev, single box)
+- S3Storage: any S3-compatible bucket - AWS, MinIO, R2... (needs boto3)
+
+Pick one with STORAGE_BACKEND=local|s3. Keys are relative paths like
+'avatars/<hash>_full.webp'. Public URLs are built from CDN_URL when set,
+so reads can go through a CDN without touching the API.
+
+Direct uploads: presign_upload() returns what a client needs to send
+the bytes straight to storage (a presigned POST for S3). LocalStorage
+imitates it with a signed PUT URL on the API itself, so the flow is the
+same in dev and tests.
+"""
+
+import os
+import shutil
+from collections import namedtuple
+
+from flask import current_app, url_for
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+
+try:
+    import boto3
+    from botocore.config import Config as BotoConfig
+    from botocore.exceptions import ClientError
+except ImportError:  # pragma: no cover - only needed for STORAGE_BACKEND=s3
+    boto3 = None
+
+
+StoredObject = namedtuple('StoredObject', 'key size modified')
+
+# Written once under a content hash, never modified - cache forever
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+SKIP_DIRS = ('.tmp',)
+
+
+class LocalStorage:
+    """Files under a local folder, served at base_url (or public_url)."""
+
+    name = 'local'
+
+    def __init__(self, root, base_url='/uploads', public_url=None, presign_seconds=900):
+        self.root = root
+        self.base_url = (public_url or base_url).rstrip('/')
+        self.presign_seconds = presign_seconds
+
+    def path(self, key):
+        """Absolute path for key. Refuses keys escaping the root."""
+        root = os.path.abspath(self.root)
+        path = os.path.abspath(os.path.join(root, key))
+        if not path.startswith(root + os.sep):
+            raise ValueError(f'Invalid storage key: {key!r}')
+        return path
+
+    def url(self, key):
+        return f'{self.base_url}/{key}'
+
+    def exists(self, key):
+        return os.path.exists(self.path(key))
+
+    def put_file(self, local_path, key, content_type=None):
+        """Move local_path to key. Atomic when both are on the same disk."""
+        target = self.path(key)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        try:
+            os.replace(local_path, target)
+        except OSError:
+            shutil.move(local_path, target)  # another filesystem
+        return key
+
+    def open(self, key):
+        return open(self.path(key), 'rb')
+
+    def check(self):
+        """Raise if we can't write here (readiness probe)."""
+        probe = os.path.join(self.root, '.tmp', f'.health-{os.getpid()}')
+        os.makedirs(os.path.dirname(probe), exist_ok=True)
+        with open(probe, 'wb') as fh:
+            fh.write(b'ok')
+        os.remove(probe)
+
+    def delete(self, key):
+        try:
+            os.remove(self.path(key))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def iter_objects(self, prefix=''):
+        """Walk the folder lazily, one directory at a time."""
+        start = self.path(prefix) if prefix else os.path.abspath(self.root)
+        if not os.path.isdir(start):
+            return
+        stack = [start]
+        root_len = len(os.path.abspath(self.root)) + 1
+        while stack:
+            with os.scandir(stack.pop()) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        if entry.name not in SKIP_DIRS:
+                            stack.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        stat = entry.stat()
+                        key = entry.path[root_len:].replace(os.sep, '/')
+                        yield StoredObject(key, stat.st_size, stat.st_mtime)
+
+    # -- direct uploads (stand-in for presigned URLs) -----------------
+
+    def _serializer(self):
+        return URLSafeTimedSerializer(current_app.config['SECRET_KEY'], salt='local-storage-upload')
+
+    def presign_upload(self, key, content_type, max_bytes):
+        token = self._serializer().dumps({'key': key, 'type': content_type, 'max': max_bytes})
+        return {
+            'method': 'PUT',
+            'url': url_for('uploads.put_direct', token=token),
+            'fields': {},
+            'headers': {'Content-Type': content_type},
+        }
+
+    def verify_upload(self, token):
+        """(key, content_type, max_bytes) from a presign_upload token, or None."""
+        try:
+            data = self._serializer().loads(token, max_age=self.presign_seconds)
+        except BadSignature:
+            return None
+        return data['key'], data['type'], data['max']
+
+
+class S3Storage:
+    """S3-compatible bucket. endpoint_url for MinIO & co."""
+
+    name = 's3'
+
+    def __init__(self, bucket, endpoint_url=None, region=None, access_key=None,
+                 secret_key=None, public_url=None, presign_seconds=900):
+        if boto3 is None:
+            raise RuntimeError('STORAGE_BACKEND=s3 needs boto3 (pip install boto3)')
+
+        self.bucket = bucket
+        self.presign_seconds = presign_seconds
+        self._client = boto3.client(
+            's3',
+            endpoint_url=endpoint_url,
+            region_name=region,
+            aws_access_key_id=access_key,
+            aws_secret_access_key=secret_key,
+            config=BotoConfig(
+                signature_version='s3v4',
+                s3={'addressing_style': 'path' if endpoint_url else 'auto'},
+            ),
+        )
+
+        if public_url:
+            self.base_url = public_url.rstrip('/')
+        elif endpoint_url:
+            self.base_url = f"{endpoint_url.rstrip('/')}/{bucket}"
+        else:
+            self.base_url = f'https://{bucket}.s3.{region or "us-east-1"}.amazonaws.com'
+
+    def url(self, key):
+        return f'{self.base_url}/{key}'
+
+    def exists(self, key):
+        try:
+            self._client.head_object(Bucket=self.bucket, Key=key)
+            return True
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return False
+            raise
+
+    def put_file(self, local_path, key, content_type=None):
+        """Upload local_path to key, then remove the local copy."""
+        extra = {'CacheControl': IMMUTABLE_CACHE_CONTROL}
+        if content_type:
+            extra['ContentType'] = content_type
+        self._client.upload_file(local_path, self.bucket, key, ExtraArgs=extra)
+        os.remove(local_path)
+        return key
+
+    def open(self, key):
+        return self._client.get_object(Bucket=self.bucket, Key=key)['Body']
+
+    def check(self):
+        """Raise if the bucket isn't reachable (readiness probe)."""
+        self._client.head_bucket(Bucket=self.bucket)
+
+    def delete(self, key):
+        self._client.delete_object(Bucket=self.bucket, Key=key)
+        return True
+
+    def iter_objects(self, prefix=''):
+        """Page through the bucket, 1000 keys at a time."""
+        paginator = self._client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix):
+            for item in page.get('Contents', ()):
+                yield StoredObject(item['Key'], item['Size'], item['LastModified'].timestamp())
+
+    def presign_upload(self, key, content_type, max_bytes):
+        """Presigned POST - the bucket itself enforces type and size."""
+        post = self._client.generate_presigned_post(
+            Bucket=self.bucket,
+            Key=key,
+            Fields={'Content-Type': content_type},
+            Conditions=[
+                {'Content-Type': content_type},
+                ['content-length-range', 1, max_bytes],
+            ],
+            ExpiresIn=self.presign_seconds,
+        )
+        return {'method': 'POST', 'url': post['url'], 'fields': post['fields'], 'headers': {}}
+
+    def verify_upload(self, token):
+        return None  # uploads go to the bucket, never through the API
+
+
+# ---------------------------------------------------------------------
+# Setup
+# ---------------------------------------------------------------------
+
+def create_storage(config):
+    backend = (config.get('STORAGE_BACKEND') or 'local').lower()
+    presign_seconds = config.get('STORAGE_PRESIGN_SECONDS', 900)
+
+    if backend == 's3':
+        return S3Storage(
+            bucket=config['S3_BUCKET'],
+            endpoint_url=config.get('S3_ENDPOINT_URL'),
+            region=config.get('S3_REGION'),
+            access_key=config.get('S3_ACCESS_KEY_ID'),
+            secret_key=config.get('S3_SECRET_ACCESS_KEY'),
+            public_url=config.get('CDN_URL'),
+            presign_seconds=presign_seconds,
+        )
+
+    if backend == 'local':
+        return LocalStorage(
+            root=config.get('UPLOAD_FOLDER', 'uploads'),
+            base_url=config.get('UPLOADS_URL', '/uploads'),
+            public_url=config.get('CDN_URL'),
+            presign_seconds=presign_seconds,
+        )
+
+    raise ValueError(f'Unknown STORAGE_BACKEND: {backend!r}')
+
+
+def init_storage(app):
+    app.extensions['storage'] = create_storage(app.config)
+
+
+def get_storage():
+    """Storage backend of the current app (built once by init_storage)."""
+    return current_app.extensions['storage']
+
+
+def key_from_url(url):
+    """
+    Storage key for a URL we handed out, or None for anything else
+    (external avatars, URLs from a previous CDN...).
+    """
+    if not url:
+        return None
+    prefix = get_storage().base_url + '/'
+    if url.startswith(prefix):
+        return url[len(prefix):]
+    return None
@@ -0,0 +1,198 @@
+"""
+Trending score for activities
+
+The home screen wants "what's hot near me", not just "what's next".
+Computing that at query time (joins on likes, participations...) is way
+too slow, so each activity gets a precomputed Activity.trending_score:
+
+    score = engagement / (age_hours + 2) ^ GRAVITY     # Hacker News style decay
+          + FILL_WEIGHT * fill_rate                   # almost-full = popular
+          + FEATURED_BOOST if is_featured
+
+Scores are refreshed in the background:
+- incrementally, for activities that got a like/view/participant since last pass
+- fully (every TRENDING_FULL_REFRESH_SECONDS, or by hand with
+  `flask refresh-trending`) so the time decay keeps moving for everyone
+"""
+
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import text
+
+from app import db
+from app.models import Activity
+from app.utils.background import PeriodicWorker
+
+
+# Engagement weights - a share is worth way more than a passing view
+LIKE_WEIGHT = 3.0
+SHARE_WEIGHT = 5.0
+VIEW_WEIGHT = 0.1
+GRAVITY = 1.5
+FILL_WEIGHT = 2.0
+FEATURED_BOOST = 5.0
+
+BATCH_SIZE = 500
+
+# Statuses that show up in the feed
+RANKED_STATUSES = ('published', 'full')
+
+
+def compute_trending_score(likes, views, shares, is_featured,
+                           current_participants, max_participants,
+                           published_at, now=None):
+    """Pure scoring function - no DB access, easy to tweak and test."""
+    now = now or datetime.utcnow()
+
+    engagement = (
+        (likes or 0) * LIKE_WEIGHT
+        + (shares or 0) * SHARE_WEIGHT
+        + (views or 0) * VIEW_WEIGHT
+    )
+
+    age_hours = 0.0
+    if published_at:
+        age_hours = max(0.0, (now - published_at).total_seconds() / 3600)
+
+    score = engagement / (age_hours + 2) ** GRAVITY
+
+    if max_participants:
+        score += FILL_WEIGHT * min(1.0, (current_participants or 0) / max_participants)
+
+    if is_featured:
+        score += FEATURED_BOOST
+
+    return round(score, 6)
+
+
+class TrendingRanker:
+    """
+    Keeps Activity.trending_score up to date.
+
+    Routes call mark_dirty() when engagement changes; the background
+    worker recomputes only those rows, plus a periodic full pass.
+    """
+
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self._dirty = set()
+        self._last_full_refresh = 0.0
+        self.full_refresh_seconds = 3600
+        self._worker = None
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.full_refresh_seconds = app.config.get('TRENDING_FULL_REFRESH_SECONDS', 3600)
+        self._last_full_refresh = time.monotonic()
+
+        with self._lock:
+            self._dirty.clear()
+
+        self._worker = PeriodicWorker(
+            app, self.run,
+            interval=app.config.get('TRENDING_REFRESH_SECONDS', 60),
+            name='trending-ranker',
+        )
+        self._worker.start()
+        app.extensions['trending_ranker'] = self
+
+    def mark_dirty(self, *activity_ids):
+        """Flag activities whose score needs a refresh. Cheap, no DB."""
+        with self._lock:
+            self._dirty.update(activity_ids)
+
+    @property
+    def pending_count(self):
+        """Activities waiting for a score refresh in this process."""
+        return len(self._dirty)
+
+    def run(self):
+        """Worker entry point - full pass when due, otherwise incremental."""
+        if time.monotonic() - self._last_full_refresh >= self.full_refresh_seconds:
+            return self.refresh_all()
+        return self.refresh_dirty()
+
+    def refresh_dirty(self):
+        """Recompute scores for activities flagged since the last pass."""
+        with self._lock:
+            ids = sorted(self._dirty)
+            self._dirty.clear()
+
+        updated = 0
+        try:
+            for start in range(0, len(ids), BATCH_SIZE):
+                batch = ids[start:start + BATCH_SIZE]
+                updated += _refresh_scores(Activity.id.in_(batch))
+        except Exception:
+            self.mark_dirty(*ids)  # retry next time
+            raise
+
+        return updated
+
+    def refresh_all(self):
+        """Recompute every upcoming activity, in id-ordered batches."""
+        with self._lock:
+            self._dirty.clear()
+        self._last_full_refresh = time.monotonic()
+
+        updated = 0
+        last_id = 0
+        now = datetime.utcnow()
+
+        while True:
+            batch_ids = [row[0] for row in db.session.query(Activity.id).filter(
+                Activity.id > last_id,
+                Activity.status.in_(RANKED_STATUSES),
+                Activity.date >= now,
+            ).order_by(Activity.id).limit(BATCH_SIZE)]
+
+            if not batch_ids:
+                break
+
+            updated += _refresh_scores(Activity.id.in_(batch_ids), now=now)
+            last_id = batch_ids[-1]
+
+        return updated
+
+
+def _refresh_scores(criterion, now=None):
+    """
+    Load only the columns we need, score them, write back in one executemany.
+
+    Never instantiates Activity objects, so it stays cheap even on big batches.
+    """
+    now = now or datetime.utcnow()
+
+    rows = db.session.query(
+        Activity.id,
+        Activity.likes_count,
+        Activity.views_count,
+        Activity.shares_count,
+        Activity.is_featured,
+        Activity.current_participants,
+        Activity.max_participants,
+        db.func.coalesce(Activity.published_at, Activity.created_at),
+    ).filter(criterion).all()
+
+    if not rows:
+        return 0
+
+    params = [
+        {'id': row[0], 'score': compute_trending_score(*row[1:], now=now)}
+        for row in rows
+    ]
+
+    db.session.execute(
+        text('UPDATE activities SET trending_score = :score WHERE id = :id'),
+        params,
+    )
+    db.session.commit()
+    return len(params)
+
+
+# Shared instance - bound to the app in create_app()
+trending_ranker = TrendingRanker()
@@ -0,0 +1,126 @@
+"""
+Orphaned upload garbage collector
+
+Replacing an avatar or an activity image never deletes the old file, and
+it can't safely do so on the spot: files are content-addressed, so two
+users uploading the same picture share one file. Instead, `flask
+gc-uploads` periodically removes what nothing points to any more:
+
+1. one streamed pass per table (User, Activity, ArchivedActivity,
+   Notification) collects the referenced files - only the URL columns,
+   yield_per batches
+2. the storage is walked lazily (os.scandir / S3 pages), one object at a
+   time, and everything unreferenced and older than the grace period goes
+
+Memory is bounded by the number of referenced images, never by the
+number of files. The grace period covers uploads whose DB row isn't
+committed yet, and abandoned direct uploads (incoming/) age out the
+same way.
+"""
+
+import os
+import re
+import time
+from collections import namedtuple
+from urllib.parse import urlsplit
+
+from app import db
+from app.models import Activity, ArchivedActivity, Notification, User
+from app.utils.database import set_statement_timeout
+from app.utils.storage import get_storage
+from app.utils.uploads import UploadSession, tmp_folder
+
+
+# Model -> columns holding upload URLs (read together, one pass per table)
+REFERENCE_COLUMNS = (
+    (User, ('avatar_url', 'cover_url')),
+    (Activity, ('image_url',)),
+    (ArchivedActivity, ('image_url',)),
+    (Notification, ('image_url',)),
+)
+
+# avatars/<hash>_thumb.webp -> avatars/<hash>: one reference keeps every variant
+_VARIANT_RE = re.compile(r'^(?P<base>.+/[0-9a-f]{32})_[a-z]+\.webp$')
+
+GcStats = namedtuple('GcStats', 'scanned kept deleted freed_bytes')
+
+
+def _group_key(key):
+    match = _VARIANT_RE.match(key)
+    return match.group('base') if match else key
+
+
+def _reference_key(url):
+    """
+    'https://cdn/.../avatars/<hash>_full.webp' -> 'avatars/<hash>'.
+
+    Only the last two path segments count, so URLs written with another
+    base (old CDN_URL, /uploads before S3...) still protect their file.
+    """
+    path = urlsplit(url).path
+    return _group_key('/'.join(path.rsplit('/', 2)[-2:]))
+
+
+def referenced_keys(batch_size=5000):
+    """Group keys of every file still pointed to by the DB."""
+    referenced = set()
+    set_statement_timeout(db.session, 0)  # full-table scans, not API queries
+
+    for model, columns in REFERENCE_COLUMNS:
+        query = (
+            db.session.query(*[getattr(model, column) for column in columns])
+            .execution_options(yield_per=batch_size)
+        )
+        for row in query:
+            for url in row:
+                if url:
+                    referenced.add(_reference_key(url))
+
+    return referenced
+
+
+def collect_garbage(grace_hours=24, dry_run=False, batch_size=5000, progress=None, progress_every=10000):
+    """
+    Delete unreferenced uploads older than grace_hours.
+
+    progress(stats) is called every progress_every objects scanned.
+    Returns GcStats (what would be deleted, with dry_run).
+    """
+    storage = get_storage()
+    cutoff = time.time() - grace_hours * 3600
+    referenced = referenced_keys(batch_size)
+
+    scanned = kept = deleted = freed = 0
+
+    for obj in storage.iter_objects():
+        scanned += 1
+
+        if obj.modified > cutoff or _group_key(obj.key) in referenced:
+            kept += 1
+        else:
+            if not dry_run:
+                storage.delete(obj.key)
+            deleted += 1
+            freed += obj.size
+
+        if progress is not None and scanned % progress_every == 0:
+            progress(GcStats(scanned, kept, deleted, freed))
+
+    if not dry_run:
+        _clean_tmp(cutoff)
+
+    return GcStats(scanned, kept, deleted, freed)
+
+
+def _clean_tmp(cutoff):
+    """Expired resumable sessions and temp files left by crashed requests."""
+    UploadSession.expire_all()
+
+    with os.scandir(tmp_folder()) as entries:
+        for entry in entries:
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                try:
+                    os.remove(entry.path)
+                except FileNotFoundError:
+                    pass
+
@@ -0,0 +1,332 @@
+"""
+Streaming uploads
+
+Uploads used to be read in one go (file.read(), file.seek(0, SEEK_END)
+to measure them), so a 16 MB picture sat in memory for the whole request.
+Now:
+
+- requests announcing a body bigger than the limit are refused from
+  Content-Length, before a single byte is read (@limit_upload_size)
+- the body is copied in CHUNK_SIZE pieces to a temp file under
+  UPLOAD_FOLDER/.tmp, hashed and sniffed on the way, and the copy stops
+  as soon as it goes past the limit (clients can lie about Content-Length)
+- with local storage the temp file sits on the same filesystem as the
+  uploads, so putting it in place is an atomic rename - readers never
+  see half a file
+
+Resumable uploads (for flaky mobile networks) keep their bytes in
+.tmp/sessions/<id>.part between requests: the client sends chunks with
+the offset it thinks it's at, asks for the current offset after a
+dropped connection, and carries on from there. Routes are in
+app/routes/uploads.py.
+
+Note: multipart bodies are still spooled by Werkzeug before the route
+runs (to disk past 500 KB, so memory stays bounded). The chunk endpoint
+reads request.stream directly and never buffers.
+"""
+
+import hashlib
+import json
+import os
+import time
+import uuid
+from datetime import datetime
+from functools import wraps
+
+from flask import current_app, jsonify, request
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+
+CHUNK_SIZE = 64 * 1024
+HEAD_SIZE = 16  # enough for every magic number we sniff
+
+TMP_DIR = '.tmp'
+SESSIONS_DIR = 'sessions'
+
+
+class UploadTooLarge(ValueError):
+    """Body went past the upload limit."""
+
+    def __init__(self, max_bytes):
+        super().__init__(f'Le fichier est trop volumineux (max {max_bytes // (1024 * 1024)} Mo)')
+        self.max_bytes = max_bytes
+
+
+class UploadSessionError(ValueError):
+    """Chunk doesn't fit the session (wrong offset, past the announced size...)."""
+
+    def __init__(self, message, offset=None):
+        super().__init__(message)
+        self.offset = offset
+
+
+def max_upload_bytes():
+    return current_app.config.get('MAX_CONTENT_LENGTH') or 16 * 1024 * 1024
+
+
+def tmp_folder(*parts):
+    folder = os.path.join(current_app.config.get('UPLOAD_FOLDER', 'uploads'), TMP_DIR, *parts)
+    os.makedirs(folder, exist_ok=True)
+    return folder
+
+
+# ---------------------------------------------------------------------
+# Early rejection
+# ---------------------------------------------------------------------
+
+def too_large_response(max_bytes):
+    return jsonify({'error': str(UploadTooLarge(max_bytes)), 'code': 'upload_too_large'}), 413
+
+
+def limit_upload_size(max_bytes=None):
+    """
+    Refuse the request from its Content-Length, before reading the body.
+
+    Requests without Content-Length (chunked transfer) get through and
+    are cut off by stage_stream() instead.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            limit = max_bytes or max_upload_bytes()
+            if request.content_length is not None and request.content_length > limit:
+                return too_large_response(limit)
+            return f(*args, **kwargs)
+        return decorated
+    return decorator
+
+
+# ---------------------------------------------------------------------
+# Staging
+# ---------------------------------------------------------------------
+
+class StagedFile:
+    """
+    An upload copied to a temp file, with its sha256 and first bytes.
+
+    Whoever ends up with it hands path to storage.put_file() or calls
+    discard().
+    """
+
+    def __init__(self, path, size, digest, head):
+        self.path = path
+        self.size = size
+        self.digest = digest
+        self.head = head
+
+    def discard(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def _copy_chunks(stream, out, limit, hasher=None, already=0):
+    """Copy stream to out in CHUNK_SIZE pieces. Returns bytes written."""
+    written = 0
+    while True:
+        chunk = stream.read(CHUNK_SIZE)
+        if not chunk:
+            return written
+        written += len(chunk)
+        if already + written > limit:
+            raise UploadTooLarge(max_upload_bytes())
+        if hasher is not None:
+            hasher.update(chunk)
+        out.write(chunk)
+
+
+def stage_stream(stream, max_bytes=None):
+    """
+    Copy a file-like object to a temp file, hashing as we go.
+
+    Raises UploadTooLarge (and leaves nothing behind) past max_bytes.
+    """
+    max_bytes = max_bytes or max_upload_bytes()
+    path = os.path.join(tmp_folder(), f'{uuid.uuid4().hex}.part')
+    hasher = hashlib.sha256()
+
+    try:
+        with open(path, 'wb') as out:
+            head = stream.read(HEAD_SIZE)
+            if len(head) > max_bytes:
+                raise UploadTooLarge(max_bytes)
+            hasher.update(head)
+            out.write(head)
+            size = len(head) + _copy_chunks(stream, out, max_bytes, hasher, already=len(head))
+    except BaseException:
+        os.remove(path)
+        raise
+
+    return StagedFile(path, size, hasher.hexdigest(), head)
+
+
+def stage_path(path):
+    """Hash an already complete temp file (finished resumable upload)."""
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        head = fh.read(HEAD_SIZE)
+        hasher.update(head)
+        for chunk in iter(lambda: fh.read(CHUNK_SIZE), b''):
+            hasher.update(chunk)
+    return StagedFile(path, os.path.getsize(path), hasher.hexdigest(), head)
+
+
+# ---------------------------------------------------------------------
+# Resumable sessions
+# ---------------------------------------------------------------------
+
+class UploadSession:
+    """
+    One resumable upload: <id>.json (who, what for, how big) + <id>.part.
+
+    The current offset is the size of the .part file - nothing else to
+    keep in sync. Both are on the local disk, so sessions are only
+    offered with local storage (app/routes/uploads.py).
+    """
+
+    def __init__(self, id, user_id, purpose, size, target_id=None, created_at=None):
+        self.id = id
+        self.user_id = user_id
+        self.purpose = purpose
+        self.size = size
+        self.target_id = target_id
+        self.created_at = created_at or time.time()
+
+    # -- storage -------------------------------------------------------
+
+    @staticmethod
+    def _folder():
+        return tmp_folder(SESSIONS_DIR)
+
+    @property
+    def meta_path(self):
+        return os.path.join(self._folder(), f'{self.id}.json')
+
+    @property
+    def part_path(self):
+        return os.path.join(self._folder(), f'{self.id}.part')
+
+    @classmethod
+    def create(cls, user_id, purpose, size, target_id=None):
+        session = cls(uuid.uuid4().hex, user_id, purpose, size, target_id)
+        open(session.part_path, 'wb').close()
+        with open(session.meta_path, 'w') as fh:
+            json.dump(session.to_dict(), fh)
+        return session
+
+    @classmethod
+    def load(cls, session_id):
+        """The session, or None if unknown/expired."""
+        if not session_id.isalnum():
+            return None
+        try:
+            with open(os.path.join(cls._folder(), f'{session_id}.json')) as fh:
+                session = cls(**json.load(fh))
+        except (OSError, ValueError, TypeError):
+            return None
+        if session.expired:
+            session.delete()
+            return None
+        return session
+
+    def delete(self):
+        for path in (self.part_path, self.meta_path):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    @classmethod
+    def expire_all(cls):
+        """Drop abandoned sessions. Returns how many were removed."""
+        removed = 0
+        for entry in os.scandir(cls._folder()):
+            if entry.name.endswith('.json') and cls.load(entry.name[:-5]) is None:
+                removed += 1
+        return removed
+
+    # -- state ---------------------------------------------------------
+
+    @property
+    def offset(self):
+        try:
+            return os.path.getsize(self.part_path)
+        except FileNotFoundError:
+            return 0
+
+    @property
+    def expired(self):
+        ttl = current_app.config.get('UPLOAD_SESSION_HOURS', 24) * 3600
+        return time.time() - self.created_at > ttl
+
+    @property
+    def complete(self):
+        return self.offset == self.size
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'user_id': self.user_id,
+            'purpose': self.purpose,
+            'size': self.size,
+            'target_id': self.target_id,
+            'created_at': self.created_at,
+        }
+
+    def to_public_dict(self):
+        return {
+            'upload_id': self.id,
+            'purpose': self.purpose,
+            'size': self.size,
+            'offset': self.offset,
+            'chunk_size': current_app.config.get('UPLOAD_CHUNK_BYTES', 1024 * 1024),
+            'expires_at': datetime.utcfromtimestamp(
+                self.created_at + current_app.config.get('UPLOAD_SESSION_HOURS', 24) * 3600
+            ).isoformat(),
+        }
+
+    # -- writing -------------------------------------------------------
+
+    def append(self, offset, stream):
+        """
+        Write one chunk at offset. Returns the new offset.
+
+        offset must be where the file currently ends - a client retrying a
+        chunk that did make it gets an UploadSessionError carrying the real
+        offset and picks up from there.
+        """
+        with open(self.part_path, 'r+b') as out:
+            if fcntl is not None:
+                fcntl.flock(out, fcntl.LOCK_EX)  # two retries of the same chunk racing
+
+            current = out.seek(0, os.SEEK_END)
+            if offset != current:
+                raise UploadSessionError('Décalage incorrect', offset=current)
+
+            try:
+                _copy_chunks(stream, out, self.size, already=current)
+            except UploadTooLarge:
+                out.truncate(current)
+                raise UploadSessionError('Le morceau dépasse la taille annoncée', offset=current)
+
+            return out.tell()
+
+    def finish(self):
+        """
+        Hand the complete file over as a StagedFile and forget the session.
+
+        The rename is the lock: when two /complete calls race, the loser
+        finds the part file gone and gets an UploadSessionError.
+        """
+        staged_path = os.path.join(tmp_folder(), f'{self.id}.part')
+        try:
+            os.replace(self.part_path, staged_path)
+        except FileNotFoundError:
+            raise UploadSessionError('Upload déjà finalisé', offset=self.size) from None
+        self.delete()
+        return stage_path(staged_path)
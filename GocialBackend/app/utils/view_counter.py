@@ -0,0 +1,204 @@
+"""
+Buffered view counter for activities
+
+Bumping Activity.views_count on every GET /activities/<id> would turn the
+hottest read in the app into a row lock + commit. Instead we count views
+in memory (or Redis when configured) and flush them every few seconds
+with one batched UPDATE.
+
+Same viewer opening the same activity again within VIEW_DEDUP_SECONDS
+doesn't count twice - refreshing the screen isn't "trending".
+"""
+
+import threading
+import time
+import uuid
+from collections import defaultdict
+
+from sqlalchemy import text
+
+from app import db
+from app.utils.background import PeriodicWorker
+from app.utils.redis_client import get_redis
+from app.utils.trending import trending_ranker
+
+
+class ViewCounter:
+    """
+    Accumulates activity views and flushes them in batches.
+
+    Usage:
+        view_counter.record(activity_id, viewer_id)   # in the route
+        view_counter.flush()                          # done by the worker
+    """
+
+    PENDING_KEY = 'views:pending'
+    SEEN_KEY = 'views:seen:{activity_id}:{viewer_id}'
+
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self._pending = defaultdict(int)
+        self._seen = {}
+        self._redis = None
+        self._worker = None
+        self.dedup_seconds = 1800
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Bind to the app and start the periodic flush."""
+        self.dedup_seconds = app.config.get('VIEW_DEDUP_SECONDS', 1800)
+        self._redis = get_redis(app)
+
+        with self._lock:
+            self._pending.clear()
+            self._seen.clear()
+
+        self._worker = PeriodicWorker(
+            app, self.flush,
+            interval=app.config.get('VIEW_FLUSH_SECONDS', 30),
+            name='view-counter',
+        )
+        self._worker.start()
+        app.extensions['view_counter'] = self
+
+    # -------------------------------------------------------------------
+    # Recording
+    # -------------------------------------------------------------------
+
+    def record(self, activity_id, viewer_id=None):
+        """
+        Count one view. Returns True if it was counted, False if deduped.
+
+        Never touches the database.
+        """
+        if self._redis is not None:
+            try:
+                return self._record_redis(activity_id, viewer_id)
+            except Exception:
+                pass  # Redis hiccup - fall back to local buffer
+
+        now = time.monotonic()
+        key = (activity_id, viewer_id)
+
+        with self._lock:
+            if viewer_id is not None:
+                expires_at = self._seen.get(key)
+                if expires_at and expires_at > now:
+                    return False
+                self._seen[key] = now + self.dedup_seconds
+            self._pending[activity_id] += 1
+
+        return True
+
+    def _record_redis(self, activity_id, viewer_id):
+        if viewer_id is not None:
+            seen_key = self.SEEN_KEY.format(activity_id=activity_id, viewer_id=viewer_id)
+            if not self._redis.set(seen_key, 1, nx=True, ex=self.dedup_seconds):
+                return False
+        self._redis.hincrby(self.PENDING_KEY, activity_id, 1)
+        return True
+
+    @property
+    def pending_count(self):
+        """Number of activities waiting for a flush in this process."""
+        return len(self._pending)
+
+    # -------------------------------------------------------------------
+    # Flushing
+    # -------------------------------------------------------------------
+
+    def flush(self):
+        """
+        Write buffered counts to the activities table in one statement.
+
+        Returns the number of activities updated. On failure the counts
+        are put back in the buffer so the next flush retries them.
+        """
+        deltas = self._drain()
+
+        if self._redis is not None:
+            try:
+                for activity_id, delta in self._drain_redis().items():
+                    deltas[activity_id] = deltas.get(activity_id, 0) + delta
+            except Exception:
+                pass
+
+        if not deltas:
+            return 0
+
+        try:
+            _apply_view_deltas(deltas)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            with self._lock:
+                for activity_id, delta in deltas.items():
+                    self._pending[activity_id] += delta
+            raise
+
+        # More views -> trending score needs a refresh
+        trending_ranker.mark_dirty(*deltas)
+
+        return len(deltas)
+
+    def _drain(self):
+        """Swap out the local buffer and purge expired dedup entries."""
+        now = time.monotonic()
+        with self._lock:
+            deltas = dict(self._pending)
+            self._pending.clear()
+            self._seen = {k: exp for k, exp in self._seen.items() if exp > now}
+        return deltas
+
+    def _drain_redis(self):
+        """
+        Atomically grab the shared Redis buffer.
+
+        RENAME makes sure two workers flushing at once don't both apply
+        the same counts.
+        """
+        flushing_key = f'views:flushing:{uuid.uuid4().hex}'
+        try:
+            self._redis.rename(self.PENDING_KEY, flushing_key)
+        except Exception:
+            return {}  # nothing pending (RENAME fails on missing key)
+
+        raw = self._redis.hgetall(flushing_key)
+        self._redis.delete(flushing_key)
+        return {int(k): int(v) for k, v in raw.items()}
+
+
+def _apply_view_deltas(deltas):
+    """
+    UPDATE activities SET views_count = views_count + delta for many rows.
+
+    PostgreSQL gets a single UPDATE ... FROM (VALUES ...). Other backends
+    (SQLite in dev/tests) don't support that syntax, so they get an
+    executemany of the same statement - still one round trip per batch.
+    """
+    items = sorted(deltas.items())
+
+    if db.engine.dialect.name == 'postgresql':
+        values = ', '.join(f'(:id{i}, :delta{i})' for i in range(len(items)))
+        params = {}
+        for i, (activity_id, delta) in enumerate(items):
+            params[f'id{i}'] = activity_id
+            params[f'delta{i}'] = delta
+
+        db.session.execute(text(
+            'UPDATE activities '
+            'SET views_count = COALESCE(activities.views_count, 0) + v.delta '
+            f'FROM (VALUES {values}) AS v(id, delta) '
+            'WHERE activities.id = v.id'
+        ), params)
+    else:
+        db.session.execute(
+            text('UPDATE activities SET views_count = COALESCE(views_count, 0) + :delta WHERE id = :id'),
+            [{'id': activity_id, 'delta': delta} for activity_id, delta in items],
+        )
+
+
+# Shared instance - bound to the app in create_app()
+view_counter = ViewCounter()
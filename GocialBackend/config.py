@@ -42,10 +42,29 @@ class Config:
     SQLALCHEMY_TRACK_MODIFICATIONS = False  # Saves memory, we don't need this
     SQLALCHEMY_ECHO = False
     
+    # Engine / pool (PostgreSQL) - see app/utils/database.py. Per gunicorn
+    # worker: keep DB_POOL_SIZE >= threads, and workers x (size + overflow)
+    # under the server's max_connections.
+    DB_POOL_SIZE = get_env('DB_POOL_SIZE', 5, int)
+    DB_MAX_OVERFLOW = get_env('DB_MAX_OVERFLOW', 5, int)
+    DB_POOL_TIMEOUT = get_env('DB_POOL_TIMEOUT', 10, int)  # seconds waiting for a connection, then error
+    DB_POOL_RECYCLE = get_env('DB_POOL_RECYCLE', 1800, int)  # reopen connections older than this
+    DB_POOL_PRE_PING = get_env('DB_POOL_PRE_PING', 'true').lower() == 'true'  # survive failovers / idle kills
+    DB_STATEMENT_TIMEOUT_MS = get_env('DB_STATEMENT_TIMEOUT_MS', 0, int)  # 0 = no limit
+    DB_APPLICATION_NAME = get_env('DB_APPLICATION_NAME', 'gocial-api')
+    DB_PGBOUNCER = get_env('DB_PGBOUNCER', 'false').lower() == 'true'  # transaction pooling in front
+    
+    # Read replica - GET requests read from it, see app/utils/replicas.py
+    REPLICA_DATABASE_URL = get_env('REPLICA_DATABASE_URL')
+    REPLICA_STICKY_SECONDS = get_env('REPLICA_STICKY_SECONDS', 5, int)  # a user's GETs stay on the primary after they write
+    REPLICA_RETRY_SECONDS = get_env('REPLICA_RETRY_SECONDS', 30, int)  # replica unreachable = primary only this long
+    
     # JWT tokens
     JWT_SECRET_KEY = get_env('JWT_SECRET_KEY', 'jwt-secret-change-me')
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=get_env('JWT_ACCESS_HOURS', 24, int))
     JWT_REFRESH_TOKEN_EXPIRES = timedelta(days=30)
+    # A burnt refresh token keeps working this long (racing refreshes, lost responses)
+    JWT_REFRESH_REUSE_GRACE_SECONDS = get_env('JWT_REFRESH_REUSE_GRACE_SECONDS', 30, int)
     JWT_TOKEN_LOCATION = ['headers']
     JWT_HEADER_NAME = 'Authorization'
     JWT_HEADER_TYPE = 'Bearer'
@@ -57,6 +76,23 @@ class Config:
     MAX_CONTENT_LENGTH = get_env('MAX_UPLOAD_MB', 16, int) * 1024 * 1024
     UPLOAD_FOLDER = get_env('UPLOAD_FOLDER', str(basedir / 'uploads'))
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
+    IMAGE_WORKERS = get_env('IMAGE_WORKERS', 2, int)  # threads rendering image variants, 0 = inline
+    UPLOAD_CHUNK_BYTES = get_env('UPLOAD_CHUNK_BYTES', 1024 * 1024, int)  # suggested chunk size, resumable uploads
+    UPLOAD_SESSION_HOURS = get_env('UPLOAD_SESSION_HOURS', 24, int)  # unfinished resumable uploads expire
+    
+    # Upload storage - 'local' (UPLOAD_FOLDER) or 's3' (any S3-compatible bucket, needs boto3)
+    STORAGE_BACKEND = get_env('STORAGE_BACKEND', 'local')
+    STORAGE_PRESIGN_SECONDS = get_env('STORAGE_PRESIGN_SECONDS', 900, int)  # direct upload URLs lifetime
+    CDN_URL = get_env('CDN_URL')  # public base URL for reads, e.g. https://cdn.gocial.app
+    S3_BUCKET = get_env('S3_BUCKET')
+    S3_ENDPOINT_URL = get_env('S3_ENDPOINT_URL')  # MinIO & co, empty for AWS
+    S3_REGION = get_env('S3_REGION')
+    S3_ACCESS_KEY_ID = get_env('S3_ACCESS_KEY_ID')
+    S3_SECRET_ACCESS_KEY = get_env('S3_SECRET_ACCESS_KEY')
+    
+    # Serving /uploads - let the web server send the bytes
+    UPLOADS_ACCEL_REDIRECT = get_env('UPLOADS_ACCEL_REDIRECT')  # nginx internal location, e.g. /protected-uploads/
+    USE_X_SENDFILE = get_env('USE_X_SENDFILE', 'false').lower() == 'true'  # Apache / lighttpd
     
     # Email (for password reset, notifications, etc.)
     MAIL_SERVER = get_env('MAIL_SERVER', 'smtp.gmail.com')
@@ -66,9 +102,63 @@ class Config:
     MAIL_PASSWORD = get_env('MAIL_PASSWORD')
     MAIL_DEFAULT_SENDER = get_env('MAIL_SENDER', 'noreply@gocial.app')
     
-    # Rate limiting (implement later with Flask-Limiter)
+    # Redis (optional) - shared buffers across gunicorn workers
+    REDIS_URL = get_env('REDIS_URL')
+    
+    # Activity views are buffered and flushed in batches
+    VIEW_FLUSH_SECONDS = get_env('VIEW_FLUSH_SECONDS', 30, int)
+    VIEW_DEDUP_SECONDS = get_env('VIEW_DEDUP_SECONDS', 1800, int)  # same viewer counts once per 30 min
+    
+    # Trending scores - incremental refresh + periodic full pass (time decay)
+    TRENDING_REFRESH_SECONDS = get_env('TRENDING_REFRESH_SECONDS', 60, int)
+    TRENDING_FULL_REFRESH_SECONDS = get_env('TRENDING_FULL_REFRESH_SECONDS', 3600, int)
+    
+    # Presence - last_seen/last_login written in batches, "online" = seen recently
+    PRESENCE_FLUSH_SECONDS = get_env('PRESENCE_FLUSH_SECONDS', 60, int)
+    PRESENCE_ONLINE_SECONDS = get_env('PRESENCE_ONLINE_SECONDS', 300, int)
+    
+    # Password hashing - werkzeug method string, e.g. "scrypt:32768:8:1" or
+    # "pbkdf2:sha256:600000". Old hashes get upgraded on next login.
+    PASSWORD_HASH_METHOD = get_env('PASSWORD_HASH_METHOD', 'scrypt')
+    PASSWORD_HASH_WORKERS = get_env('PASSWORD_HASH_WORKERS', 0, int)  # >0 = process pool per worker
+    PASSWORD_HASH_MAX_PENDING = get_env('PASSWORD_HASH_MAX_PENDING', 16, int)  # then 503
+    PASSWORD_HASH_TIMEOUT = get_env('PASSWORD_HASH_TIMEOUT', 5.0, float)  # seconds waiting for the pool, then 503
+    
+    # Rate limiting - GCRA, shared through Redis when REDIS_URL is set
     RATELIMIT_ENABLED = True
-    RATELIMIT_DEFAULT = "100/hour"
+    RATELIMIT_DEFAULT = get_env('RATELIMIT_DEFAULT', "1000/hour")  # per user (or IP), all routes but polled ones
+    
+    # Reverse proxies in front of the app (load balancer, nginx...). Their
+    # X-Forwarded-For/-Proto are trusted this many hops deep, so rate limits
+    # and replica stickiness see the real client IP. 0 = clients connect directly.
+    PROXY_FIX_HOPS = get_env('PROXY_FIX_HOPS', 0, int)
+    
+    # Query profiling - count/time per request, Server-Timing header, N+1 warnings
+    QUERY_PROFILING = get_env('QUERY_PROFILING', 'false').lower() == 'true'
+    QUERY_N_PLUS_ONE_THRESHOLD = get_env('QUERY_N_PLUS_ONE_THRESHOLD', 5, int)  # same statement this many times = warning
+    
+    # Prometheus metrics on /metrics (needs prometheus_client). For gunicorn,
+    # also set PROMETHEUS_MULTIPROC_DIR so all workers are added up.
+    METRICS_ENABLED = True
+    METRICS_TOKEN = get_env('METRICS_TOKEN')  # optional Bearer token for the scraper
+    METRICS_SAMPLE_SECONDS = get_env('METRICS_SAMPLE_SECONDS', 15, int)  # pool / queue gauges refresh
+    
+    # Readiness probe (/health/ready) - see app/utils/health.py
+    HEALTH_CHECK_TIMEOUT = get_env('HEALTH_CHECK_TIMEOUT', 2.0, float)  # seconds, per dependency
+    HEALTH_CACHE_SECONDS = get_env('HEALTH_CACHE_SECONDS', 5.0, float)  # reuse the last result this long
+    HEALTH_POOL_SATURATION = get_env('HEALTH_POOL_SATURATION', 1.0, float)  # share of pool + overflow in use = not ready
+    HEALTH_DRAIN_FILE = get_env('HEALTH_DRAIN_FILE')  # exists = draining (k8s preStop hook)
+    HEALTH_DRAIN_ON_SIGTERM = True
+    
+    # Monthly partitions (messages, notifications) - `flask db-partitions`, see app/utils/partitions.py
+    PARTITION_MONTHS_AHEAD = get_env('PARTITION_MONTHS_AHEAD', 3, int)  # future months created in advance
+    NOTIFICATION_RETENTION_MONTHS = get_env('NOTIFICATION_RETENTION_MONTHS', 6, int)  # 0 = keep forever
+    NOTIFICATION_ARCHIVE = get_env('NOTIFICATION_ARCHIVE', 'false').lower() == 'true'  # detach old months instead of dropping
+    MESSAGE_INBOX_MONTHS = get_env('MESSAGE_INBOX_MONTHS', 12, int)  # inbox/unread counts only look this far back, 0 = no bound
+    
+    # Cold storage for finished activities - `flask archive-activities`, see app/utils/archive.py
+    ARCHIVE_AFTER_MONTHS = get_env('ARCHIVE_AFTER_MONTHS', 6, int)  # ended this long ago = archived, 0 = never
+    ARCHIVE_BATCH_SIZE = get_env('ARCHIVE_BATCH_SIZE', 500, int)  # activities per transaction
     
     # Pagination defaults
     DEFAULT_PAGE_SIZE = 20
@@ -76,9 +166,10 @@ class Config:
 
 
 class DevelopmentConfig(Config):
-    """Dev environment - debug mode ON, verbose SQL logging."""
+    """Dev environment - debug mode ON, per-request SQL profiling."""
     DEBUG = True
-    SQLALCHEMY_ECHO = True  # Print SQL queries to console
+    SQLALCHEMY_ECHO = get_env('SQL_ECHO', 'false').lower() == 'true'  # every statement to stdout, if you really want it
+    QUERY_PROFILING = True
     
     # More lenient rate limits for dev
     RATELIMIT_ENABLED = False
@@ -97,6 +188,12 @@ class ProductionConfig(Config):
     
     # Tighter token expiry
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=1)
+    
+    # A runaway query shouldn't hold a connection forever
+    DB_STATEMENT_TIMEOUT_MS = get_env('DB_STATEMENT_TIMEOUT_MS', 30000, int)
+    
+    # Heroku / Render / Railway all put one router in front of the dynos
+    PROXY_FIX_HOPS = get_env('PROXY_FIX_HOPS', 1, int)
 
 
 class TestingConfig(Config):
@@ -104,9 +201,30 @@ class TestingConfig(Config):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
     
+    REPLICA_DATABASE_URL = None
+    
     # Skip rate limits in tests
     RATELIMIT_ENABLED = False
     
+    # Cheap hashes - tests create a lot of users
+    PASSWORD_HASH_METHOD = 'pbkdf2:sha256:1000'
+    PASSWORD_HASH_WORKERS = 0
+    
+    # No background threads or Redis in tests - flush by hand
+    REDIS_URL = None
+    VIEW_FLUSH_SECONDS = 0
+    TRENDING_REFRESH_SECONDS = 0
+    PRESENCE_FLUSH_SECONDS = 0
+    IMAGE_WORKERS = 0
+    METRICS_SAMPLE_SECONDS = 0
+    
+    # Fresh readiness result every call, leave pytest's signal handlers alone
+    HEALTH_CACHE_SECONDS = 0
+    HEALTH_DRAIN_ON_SIGTERM = False
+    
+    # Exercise the query profiler (Server-Timing) in tests too
+    QUERY_PROFILING = True
+    
     # Shorter tokens for faster tests
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(minutes=5)
 
@@ -0,0 +1,14 @@
+"""
+Gunicorn settings picked up automatically (./gunicorn.conf.py).
+
+Command line flags (Procfile, Dockerfile) still win for bind/workers.
+"""
+
+import os
+
+
+def child_exit(server, worker):
+    """Drop a dead worker's live gauges from the shared metrics (see app/utils/metrics.py)."""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
@@ -97,14 +97,29 @@ def run_migrations_online():
     connectable = get_engine()
 
     with connectable.connect() as connection:
+        # Same engine as the app, so DB_STATEMENT_TIMEOUT_MS came along with
+        # it - lift it for the whole session, index builds and backfills
+        # take as long as they take. Committed so alembic starts its own
+        # transaction below; RESET puts the pool's default back afterwards.
+        is_postgres = connection.dialect.name == 'postgresql'
+        if is_postgres:
+            connection.exec_driver_sql('SET statement_timeout = 0')
+            connection.commit()
+
         context.configure(
             connection=connection,
             target_metadata=get_metadata(),
             **conf_args
         )
 
-        with context.begin_transaction():
-            context.run_migrations()
+        try:
+            with context.begin_transaction():
+                context.run_migrations()
+        finally:
+            if is_postgres:
+                connection.rollback()
+                connection.exec_driver_sql('RESET statement_timeout')
+                connection.commit()
 
 
 if context.is_offline_mode():
@@ -0,0 +1,65 @@
+"""add composite indexes for hot query shapes
+
+Revision ID: 7a3e9d41c2b6
+Revises: e5a91c3b7d28
+Create Date: 2026-10-19 18:02:44.917203
+
+Built CONCURRENTLY on PostgreSQL (no write lock on big tables), which
+can't run inside a transaction - hence the autocommit block. The
+single-column indexes these replace are dropped last.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7a3e9d41c2b6'
+down_revision = 'e5a91c3b7d28'
+branch_labels = None
+depends_on = None
+
+
+PUBLISHED = sa.text("status = 'published'")
+
+# name, table, columns, extra kwargs
+INDEXES = [
+    ('ix_activities_status_type_date', 'activities', ['status', 'activity_type', 'date'], {}),
+    ('ix_activities_published_date', 'activities', ['date'],
+     {'postgresql_where': PUBLISHED, 'sqlite_where': PUBLISHED}),
+    ('ix_activities_host_date', 'activities', ['host_id', 'date'], {}),
+    ('ix_messages_recipient_unread', 'messages', ['recipient_id', 'is_read', 'deleted_by_recipient'], {}),
+    ('ix_messages_thread', 'messages', ['sender_id', 'recipient_id', 'created_at'], {}),
+    ('ix_notifications_user_read_created', 'notifications', ['user_id', 'is_read', 'created_at'], {}),
+    ('ix_participations_activity_status', 'participations', ['activity_id', 'status'], {}),
+    ('ix_friendships_user_status', 'friendships', ['user_id', 'status'], {}),
+    ('ix_friendships_friend_status', 'friendships', ['friend_id', 'status'], {}),
+]
+
+# Now leading columns of the composites above
+REPLACED = [
+    ('ix_activities_status', 'activities', ['status']),
+    ('ix_messages_recipient_id', 'messages', ['recipient_id']),
+    ('ix_notifications_user_id', 'notifications', ['user_id']),
+    ('ix_participations_activity_id', 'participations', ['activity_id']),
+    ('ix_friendships_user_id', 'friendships', ['user_id']),
+    ('ix_friendships_friend_id', 'friendships', ['friend_id']),
+]
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        for name, table, columns, kwargs in INDEXES:
+            op.create_index(name, table, columns, unique=False, postgresql_concurrently=True, **kwargs)
+
+        for name, table, _ in REPLACED:
+            op.drop_index(name, table_name=table, postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, columns in REPLACED:
+            op.create_index(name, table, columns, unique=False, postgresql_concurrently=True)
+
+        for name, table, _, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True)
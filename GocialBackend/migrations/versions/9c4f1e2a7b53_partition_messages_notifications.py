@@ -0,0 +1,153 @@
+"""partition messages and notifications by month
+
+Revision ID: 9c4f1e2a7b53
+Revises: 7a3e9d41c2b6
+Create Date: 2026-10-19 19:11:05.284671
+
+Every database:
+- created_at becomes NOT NULL (it's the partition key, part of the
+  primary key on PostgreSQL) - NULLs are backfilled first
+- reports.reported_message_id loses its foreign key: PostgreSQL can't
+  reference a partitioned table by id alone
+
+PostgreSQL only: both tables are rebuilt as RANGE (created_at)
+partitioned tables, one partition per month from the oldest row to
+three months ahead, plus a default partition. Rows are copied, the id
+sequences kept. This rewrites the tables under an exclusive lock - run
+it in a maintenance window. Later months are created by
+`flask db-partitions` (app/utils/partitions.py).
+
+"""
+from datetime import datetime
+
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9c4f1e2a7b53'
+down_revision = '7a3e9d41c2b6'
+branch_labels = None
+depends_on = None
+
+
+MONTHS_AHEAD = 3
+
+# Indexes and foreign keys to rebuild on the new tables (state after 7a3e9d41c2b6)
+TABLES = {
+    'messages': {
+        'indexes': [
+            ('ix_messages_sender_id', ['sender_id']),
+            ('ix_messages_activity_id', ['activity_id']),
+            ('ix_messages_is_read', ['is_read']),
+            ('ix_messages_recipient_unread', ['recipient_id', 'is_read', 'deleted_by_recipient']),
+            ('ix_messages_thread', ['sender_id', 'recipient_id', 'created_at']),
+        ],
+        'foreign_keys': [
+            ('sender_id', 'users'),
+            ('recipient_id', 'users'),
+            ('activity_id', 'activities'),
+        ],
+    },
+    'notifications': {
+        'indexes': [
+            ('ix_notifications_actor_id', ['actor_id']),
+            ('ix_notifications_notif_type', ['notif_type']),
+            ('ix_notifications_is_read', ['is_read']),
+            ('ix_notifications_user_read_created', ['user_id', 'is_read', 'created_at']),
+        ],
+        'foreign_keys': [
+            ('user_id', 'users'),
+            ('actor_id', 'users'),
+        ],
+    },
+}
+
+REPORTS_FK = 'fk_reports_reported_message_id_messages'
+NAMING = {'fk': 'fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s'}
+
+
+def _is_postgres():
+    return op.get_context().dialect.name == 'postgresql'
+
+
+def _add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+
+def _this_month():
+    return datetime.utcnow().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _first_month(table):
+    """Month of the oldest row (this month when empty, or generating SQL offline)."""
+    now = _this_month()
+    if context.is_offline_mode():
+        return now
+    oldest = op.get_bind().execute(sa.text(f'SELECT min(created_at) FROM {table}')).scalar()
+    if oldest is None:
+        return now
+    return min(now, oldest.replace(day=1, hour=0, minute=0, second=0, microsecond=0))
+
+
+def _rebuild(table, partitioned):
+    """Copy table into a new (partitioned or plain) table of the same name."""
+    spec = TABLES[table]
+    old = f'{table}_old'
+
+    op.execute(f'ALTER TABLE {table} RENAME TO {old}')
+    if partitioned:
+        op.execute(f'CREATE TABLE {table} (LIKE {old} INCLUDING DEFAULTS) PARTITION BY RANGE (created_at)')
+        month = _first_month(old)
+        last = _add_months(_this_month(), MONTHS_AHEAD)
+        while month <= last:
+            end = _add_months(month, 1)
+            op.execute(
+                f"CREATE TABLE {table}_p{month:%Y_%m} PARTITION OF {table} "
+                f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{end:%Y-%m-%d}')"
+            )
+            month = end
+        op.execute(f'CREATE TABLE {table}_default PARTITION OF {table} DEFAULT')
+    else:
+        op.execute(f'CREATE TABLE {table} (LIKE {old} INCLUDING DEFAULTS)')
+
+    op.execute(f'INSERT INTO {table} SELECT * FROM {old}')
+    op.execute(f'ALTER SEQUENCE {table}_id_seq OWNED BY {table}.id')
+    op.execute(f'DROP TABLE {old}')
+
+    # Built once the data is in - faster than maintaining them row by row
+    op.create_primary_key(f'{table}_pkey', table, ['id', 'created_at'] if partitioned else ['id'])
+    for name, columns in spec['indexes']:
+        op.create_index(name, table, columns, unique=False)
+    for column, referred in spec['foreign_keys']:
+        op.create_foreign_key(f'{table}_{column}_fkey', table, referred, [column], ['id'])
+
+
+def upgrade():
+    for table in TABLES:
+        op.execute(f'UPDATE {table} SET created_at = CURRENT_TIMESTAMP WHERE created_at IS NULL')
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.alter_column('created_at', existing_type=sa.DateTime(), nullable=False)
+
+    if _is_postgres():
+        op.drop_constraint('reports_reported_message_id_fkey', 'reports', type_='foreignkey')
+        for table in TABLES:
+            _rebuild(table, partitioned=True)
+    else:
+        with op.batch_alter_table('reports', schema=None, naming_convention=NAMING) as batch_op:
+            batch_op.drop_constraint(REPORTS_FK, type_='foreignkey')
+
+
+def downgrade():
+    if _is_postgres():
+        for table in TABLES:
+            _rebuild(table, partitioned=False)
+        op.create_foreign_key('reports_reported_message_id_fkey', 'reports', 'messages', ['reported_message_id'], ['id'])
+    else:
+        with op.batch_alter_table('reports', schema=None, naming_convention=NAMING) as batch_op:
+            batch_op.create_foreign_key(REPORTS_FK, 'messages', ['reported_message_id'], ['id'])
+
+    for table in TABLES:
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.alter_column('created_at', existing_type=sa.DateTime(), nullable=True)
@@ -0,0 +1,30 @@
+"""add activity trending score
+
+Revision ID: b41f7c2d9e10
+Revises: 3d53ad26234f
+Create Date: 2026-10-19 10:12:31.482913
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b41f7c2d9e10'
+down_revision = '3d53ad26234f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('activities', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('trending_score', sa.Float(), server_default='0', nullable=False))
+        batch_op.create_index(batch_op.f('ix_activities_trending_score'), ['trending_score'], unique=False)
+        batch_op.create_index('ix_activities_city_category_trending', ['city', 'category', 'trending_score'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('activities', schema=None) as batch_op:
+        batch_op.drop_index('ix_activities_city_category_trending')
+        batch_op.drop_index(batch_op.f('ix_activities_trending_score'))
+        batch_op.drop_column('trending_score')
@@ -0,0 +1,84 @@
+"""add activity archive tables
+
+Revision ID: b7e2c9d4f816
+Revises: 9c4f1e2a7b53
+Create Date: 2026-10-19 20:26:37.640118
+
+archived_activities / archived_user_ratings for `flask archive-activities`
+(app/utils/archive.py). messages.activity_id and reports.reported_activity_id
+lose their foreign keys: they keep pointing at activities once archived.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e2c9d4f816'
+down_revision = '9c4f1e2a7b53'
+branch_labels = None
+depends_on = None
+
+
+# table, column - foreign keys to activities.id dropped
+ACTIVITY_REFERENCES = [
+    ('messages', 'activity_id'),
+    ('reports', 'reported_activity_id'),
+]
+
+NAMING = {'fk': 'fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s'}
+
+
+def _fk_name(table, column):
+    # PostgreSQL's default name, or the naming convention for batch mode elsewhere
+    if op.get_context().dialect.name == 'postgresql':
+        return f'{table}_{column}_fkey'
+    return f'fk_{table}_{column}_activities'
+
+
+def upgrade():
+    op.create_table('archived_activities',
+    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('host_id', sa.Integer(), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=True),
+    sa.Column('date', sa.DateTime(), nullable=False),
+    sa.Column('image_url', sa.String(length=500), nullable=True),
+    sa.Column('archived_at', sa.DateTime(), nullable=False),
+    sa.Column('activity', sa.JSON(), nullable=False),
+    sa.Column('participations', sa.JSON(), nullable=False),
+    sa.Column('likes', sa.JSON(), nullable=False),
+    sa.Column('evaluations', sa.JSON(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('archived_activities', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_archived_activities_host_id'), ['host_id'], unique=False)
+
+    op.create_table('archived_user_ratings',
+    sa.Column('user_id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('rating_count', sa.Integer(), nullable=False),
+    sa.Column('rating_sum', sa.Integer(), nullable=False),
+    sa.Column('stars_1', sa.Integer(), nullable=False),
+    sa.Column('stars_2', sa.Integer(), nullable=False),
+    sa.Column('stars_3', sa.Integer(), nullable=False),
+    sa.Column('stars_4', sa.Integer(), nullable=False),
+    sa.Column('stars_5', sa.Integer(), nullable=False),
+    sa.Column('absent_count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+
+    for table, column in ACTIVITY_REFERENCES:
+        with op.batch_alter_table(table, schema=None, naming_convention=NAMING) as batch_op:
+            batch_op.drop_constraint(_fk_name(table, column), type_='foreignkey')
+
+
+def downgrade():
+    # Only valid once nothing points at an archived activity any more
+    for table, column in ACTIVITY_REFERENCES:
+        with op.batch_alter_table(table, schema=None, naming_convention=NAMING) as batch_op:
+            batch_op.create_foreign_key(_fk_name(table, column), 'activities', [column], ['id'])
+
+    op.drop_table('archived_user_ratings')
+    with op.batch_alter_table('archived_activities', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_archived_activities_host_id'))
+
+    op.drop_table('archived_activities')
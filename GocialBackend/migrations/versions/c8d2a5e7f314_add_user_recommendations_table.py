@@ -0,0 +1,34 @@
+"""add user recommendations table
+
+Revision ID: c8d2a5e7f314
+Revises: b41f7c2d9e10
+Create Date: 2026-10-19 14:03:52.117406
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c8d2a5e7f314'
+down_revision = 'b41f7c2d9e10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('user_recommendations',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('kind', sa.String(length=20), nullable=False),
+    sa.Column('item_ids', sa.JSON(), nullable=False),
+    sa.Column('scores', sa.JSON(), nullable=False),
+    sa.Column('computed_at', sa.DateTime(), nullable=True),
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('user_id', 'kind', name='uq_user_recommendation')
+    )
+
+
+def downgrade():
+    op.drop_table('user_recommendations')
@@ -0,0 +1,60 @@
+"""add user rating aggregates
+
+Revision ID: d83f5a1c6e29
+Revises: b7e2c9d4f816
+Create Date: 2026-10-19 21:14:52.306817
+
+Backfilled from evaluations + archived_user_ratings in the same go;
+`flask reconcile-ratings` does the same computation later on.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd83f5a1c6e29'
+down_revision = 'b7e2c9d4f816'
+branch_labels = None
+depends_on = None
+
+
+COUNT_COLUMNS = ['rating_count', 'rating_sum', 'stars_1', 'stars_2', 'stars_3', 'stars_4', 'stars_5', 'absent_count']
+
+BACKFILL = f"""
+INSERT INTO user_rating_aggregates (user_id, {', '.join(COUNT_COLUMNS)}, updated_at)
+SELECT user_id, {', '.join(f'SUM({c})' for c in COUNT_COLUMNS)}, CURRENT_TIMESTAMP
+FROM (
+    SELECT evaluated_id AS user_id, 1 AS rating_count, rating AS rating_sum,
+           {', '.join(f'CASE WHEN rating = {n} THEN 1 ELSE 0 END AS stars_{n}' for n in range(1, 6))},
+           CASE WHEN was_present = false THEN 1 ELSE 0 END AS absent_count
+    FROM evaluations
+    UNION ALL
+    SELECT user_id, {', '.join(COUNT_COLUMNS)}
+    FROM archived_user_ratings
+) AS counts
+WHERE user_id IN (SELECT id FROM users)
+GROUP BY user_id
+"""
+
+
+def upgrade():
+    op.create_table('user_rating_aggregates',
+    sa.Column('user_id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.Column('rating_count', sa.Integer(), nullable=False),
+    sa.Column('rating_sum', sa.Integer(), nullable=False),
+    sa.Column('stars_1', sa.Integer(), nullable=False),
+    sa.Column('stars_2', sa.Integer(), nullable=False),
+    sa.Column('stars_3', sa.Integer(), nullable=False),
+    sa.Column('stars_4', sa.Integer(), nullable=False),
+    sa.Column('stars_5', sa.Integer(), nullable=False),
+    sa.Column('absent_count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+    op.execute(BACKFILL)
+
+
+def downgrade():
+    op.drop_table('user_rating_aggregates')
@@ -0,0 +1,28 @@
+"""add friend suggestion columns to user recommendations
+
+Revision ID: e5a91c3b7d28
+Revises: c8d2a5e7f314
+Create Date: 2026-10-19 15:21:07.482913
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5a91c3b7d28'
+down_revision = 'c8d2a5e7f314'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user_recommendations', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('details', sa.JSON(), nullable=True))
+        batch_op.add_column(sa.Column('is_stale', sa.Boolean(), server_default='0', nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('user_recommendations', schema=None) as batch_op:
+        batch_op.drop_column('is_stale')
+        batch_op.drop_column('details')
@@ -112,6 +112,29 @@ def admin_user(app):
         return user
 
 
+def bearer_headers(user, **extra):
+    """
+    Authorization headers for user, plus any extra headers.
+    
+    Needs an app context. For tests that make their own users:
+        from tests.conftest import bearer_headers
+        client.get('/api/auth/me', headers=bearer_headers(user))
+    """
+    token = create_access_token(identity=str(user.id))
+    return {'Authorization': f'Bearer {token}', **extra}
+
+
+def use_upload_folder(app, folder):
+    """
+    Point UPLOAD_FOLDER at folder (usually tmp_path) and rebuild the
+    storage backend - it reads the setting once, like in production.
+    """
+    from app.utils.storage import init_storage
+
+    app.config['UPLOAD_FOLDER'] = str(folder)
+    init_storage(app)
+
+
 @pytest.fixture
 def auth_headers(app, user):
     """
@@ -122,16 +145,14 @@ def auth_headers(app, user):
             response = client.get('/api/users/me', headers=auth_headers)
     """
     with app.app_context():
-        token = create_access_token(identity=user.id)
-        return {'Authorization': f'Bearer {token}'}
+        return bearer_headers(user)
 
 
 @pytest.fixture
 def admin_auth_headers(app, admin_user):
     """Authorization headers with admin JWT token."""
     with app.app_context():
-        token = create_access_token(identity=admin_user.id)
-        return {'Authorization': f'Bearer {token}'}
+        return bearer_headers(admin_user)
 
 
 # -----------------------------------------------------------------------
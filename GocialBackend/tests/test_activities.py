@@ -0,0 +1,255 @@
+"""
+Tests pour l'API des activités.
+"""
+from datetime import datetime, timedelta
+
+from app import db
+from app.models import Activity, ActivityLike, Evaluation, Participation, UserRatingAggregate
+from app.utils.archive import ArchiveStats, archive_activities
+from app.utils.profiling import assert_max_queries
+from app.utils.ratings import reconcile_ratings
+from app.utils.recommendations import build_activity_recommendations
+from app.utils.trending import trending_ranker
+from app.utils.view_counter import view_counter
+from tests.conftest import bearer_headers
+from tests.factories import UserFactory, ActivityFactory
+
+
+def test_views_are_buffered_and_deduplicated(client):
+    """Les vues sont bufferisées, dédupliquées par viewer et flushées en batch."""
+    activity = ActivityFactory()
+    viewer = UserFactory()
+    other = UserFactory()
+
+    for _ in range(3):
+        assert client.get(f'/api/activities/{activity.id}', headers=bearer_headers(viewer)).status_code == 200
+    client.get(f'/api/activities/{activity.id}', headers=bearer_headers(other))
+
+    # Rien n'est écrit tant que le buffer n'est pas flushé
+    db.session.refresh(activity)
+    assert (activity.views_count or 0) == 0
+
+    assert view_counter.flush() == 1
+    db.session.refresh(activity)
+    assert activity.views_count == 2
+
+
+def test_host_views_are_not_counted(client):
+    """L'hôte qui consulte sa propre activité ne compte pas comme une vue."""
+    activity = ActivityFactory()
+
+    client.get(f'/api/activities/{activity.id}', headers=bearer_headers(activity.host))
+
+    assert view_counter.flush() == 0
+    assert (Activity.query.get(activity.id).views_count or 0) == 0
+
+
+def test_trending_sort_uses_precomputed_score(client):
+    """sort=trending classe par score précalculé, filtrable par ville."""
+    viewer = UserFactory()
+    quiet = ActivityFactory(city='Lyon', category='sport')
+    hot = ActivityFactory(city='Lyon', category='sport', likes_count=40)
+    ActivityFactory(city='Paris', category='sport', likes_count=100)
+
+    trending_ranker.refresh_all()
+
+    response = client.get(
+        '/api/activities/?sort=trending&city=Lyon&category=sport',
+        headers=bearer_headers(viewer),
+    )
+    ids = [a['id'] for a in response.get_json()['activities']]
+    assert ids == [hot.id, quiet.id]
+
+
+def test_recommended_activities_follow_category_affinity(client):
+    """Les recommandations précalculées suivent les catégories déjà pratiquées."""
+    user = UserFactory(city='Lyon')
+    past = ActivityFactory(category='sport', date=datetime.utcnow() - timedelta(days=3))
+    db.session.add(Participation(user_id=user.id, activity_id=past.id, status='validated'))
+    db.session.commit()
+
+    sport = ActivityFactory(category='sport', city='Marseille')
+    ActivityFactory(category='culture', city='Marseille')
+
+    assert build_activity_recommendations(top_n=1) >= 1
+
+    response = client.get('/api/activities/recommended', headers=bearer_headers(user))
+    data = response.get_json()
+    assert data['source'] == 'personalized'
+    assert [a['id'] for a in data['activities']] == [sport.id]
+
+
+def test_recommended_rechecks_visibility_and_gender(client):
+    """Une liste précalculée périmée ne sert pas une activité passée entre-temps en amis ou réservée aux femmes."""
+    user = UserFactory(city='Lyon', gender='male')
+    past = ActivityFactory(category='sport', date=datetime.utcnow() - timedelta(days=3))
+    db.session.add(Participation(user_id=user.id, activity_id=past.id, status='validated'))
+    db.session.commit()
+
+    kept, friends_only, women_only = (ActivityFactory(category='sport', city='Marseille') for _ in range(3))
+    assert build_activity_recommendations(top_n=3) >= 1
+
+    friends_only.visibility = 'friends'
+    women_only.gender_restriction = 'female'
+    db.session.commit()
+
+    data = client.get('/api/activities/recommended', headers=bearer_headers(user)).get_json()
+    assert data['source'] == 'personalized'
+    assert [a['id'] for a in data['activities']] == [kept.id]
+
+
+def test_recommended_fallback_honours_girls_only_mode(client):
+    """Le mode « entre filles » s'applique aussi aux tendances de repli."""
+    user = UserFactory(city='Nantes', gender='female', girls_only_mode=True)
+    women_only = ActivityFactory(city='Nantes', gender_restriction='female')
+    ActivityFactory(city='Nantes', gender_restriction='all')
+
+    data = client.get('/api/activities/recommended', headers=bearer_headers(user)).get_json()
+    assert data['source'] == 'trending'
+    assert [a['id'] for a in data['activities']] == [women_only.id]
+
+
+def test_recommended_falls_back_to_trending(client):
+    """Sans liste précalculée, on renvoie les tendances de la ville."""
+    user = UserFactory(city='Nantes')
+    local = ActivityFactory(city='Nantes')
+    ActivityFactory(city='Lille')
+
+    data = client.get('/api/activities/recommended', headers=bearer_headers(user)).get_json()
+    assert data['source'] == 'trending'
+    assert [a['id'] for a in data['activities']] == [local.id]
+
+
+def test_feed_query_budget(client):
+    """Le fil d'activités reste sous 5 requêtes SQL, quel que soit le nombre d'hôtes."""
+    viewer = UserFactory()
+    for _ in range(10):
+        ActivityFactory()
+    headers = bearer_headers(viewer)
+
+    with assert_max_queries(5):
+        response = client.get('/api/activities/', headers=headers)
+
+    assert len(response.get_json()['activities']) == 10
+    assert 'db;dur=' in response.headers['Server-Timing']
+
+
+def test_old_activities_are_archived(client):
+    """Les activités terminées depuis longtemps passent en archive, détails et notes restent accessibles."""
+    old = ActivityFactory(date=datetime.utcnow() - timedelta(days=400))
+    recent = ActivityFactory(date=datetime.utcnow() - timedelta(days=3))
+    participant = UserFactory()
+    db.session.add_all([
+        Participation(activity_id=old.id, user_id=participant.id, status='validated'),
+        ActivityLike(activity_id=old.id, user_id=participant.id),
+        Evaluation(activity_id=old.id, evaluator_id=old.host_id, evaluated_id=participant.id, rating=4),
+        Evaluation(activity_id=recent.id, evaluator_id=recent.host_id, evaluated_id=participant.id, rating=2),
+    ])
+    db.session.commit()
+    old_id, host_headers = old.id, bearer_headers(old.host)
+
+    stats = archive_activities(months=6, batch_size=1)
+    assert stats == ArchiveStats(activities=1, participations=1, likes=1, evaluations=1)
+    assert archive_activities(months=6) == ArchiveStats(0, 0, 0, 0)  # reprise : rien à refaire
+
+    assert db.session.get(Activity, old_id) is None
+    assert Participation.query.filter_by(activity_id=old_id).count() == 0
+    assert db.session.get(Activity, recent.id) is not None
+
+    data = client.get(f'/api/activities/{old_id}', headers=host_headers).get_json()
+    assert data['archived'] is True
+    assert [p['user']['id'] for p in data['participants']] == [participant.id]
+
+    evaluations = client.get(f'/api/activities/{old_id}/evaluations', headers=host_headers).get_json()
+    assert [ev['rating'] for ev in evaluations['evaluations']] == [4]
+
+    # Les agrégats recalculés comptent toujours les évaluations archivées
+    reconcile_ratings()
+    rating = client.get(f'/api/users/{participant.id}/rating', headers=host_headers).get_json()
+    assert rating['total_evaluations'] == 2
+    assert rating['avg_rating'] == 3.0
+
+
+def test_evaluations_update_rating_aggregates(client):
+    """Les évaluations mettent à jour l'agrégat de note, que reconcile-ratings sait reconstruire."""
+    activity = ActivityFactory(date=datetime.utcnow() - timedelta(days=1))
+    participant = UserFactory()
+    db.session.add(Participation(activity_id=activity.id, user_id=participant.id, status='validated'))
+    db.session.commit()
+    host_headers, participant_id = bearer_headers(activity.host), participant.id
+
+    response = client.post(f'/api/activities/{activity.id}/evaluate', headers=host_headers, json={
+        'evaluations': [{'user_id': participant_id, 'rating': 4, 'was_present': False}],
+    })
+    assert response.status_code == 201
+
+    rating = client.get(f'/api/users/{participant_id}/rating', headers=host_headers).get_json()
+    assert rating['avg_rating'] == 4.0
+    assert rating['total_evaluations'] == 1
+    assert rating['histogram'] == {'1': 0, '2': 0, '3': 0, '4': 1, '5': 0}
+    assert rating['no_show_rate'] == 1.0
+
+    participants = client.get(f'/api/activities/{activity.id}/participants', headers=host_headers).get_json()
+    assert participants['validated'][0]['user']['rating']['avg_rating'] == 4.0
+
+    # Dérive (SQL manuel...) : reconcile-ratings repart des évaluations
+    db.session.get(UserRatingAggregate, participant_id).rating_sum = 99
+    db.session.commit()
+    assert reconcile_ratings().fixed == 1
+    assert db.session.get(UserRatingAggregate, participant_id).rating_sum == 4
+
+
+def test_reconcile_survives_aggregate_created_mid_batch(client, monkeypatch):
+    """Un agrégat créé par une évaluation pendant le lot n'interrompt pas reconcile-ratings."""
+    from app.utils import ratings
+
+    activity = ActivityFactory(date=datetime.utcnow() - timedelta(days=1))
+    participant = UserFactory()
+    db.session.add(Evaluation(activity_id=activity.id, evaluator_id=activity.host_id,
+                              evaluated_id=participant.id, rating=5, was_present=True))
+    db.session.commit()
+    participant_id = participant.id
+    assert db.session.get(UserRatingAggregate, participant_id) is None
+
+    # evaluate_activity inserts the row right after reconcile locked the existing ones
+    expected_counts = ratings.expected_counts
+
+    def racing_expected_counts(user_ids):
+        db.session.add(UserRatingAggregate(user_id=participant_id, rating_count=1, rating_sum=1, stars_1=1))
+        db.session.flush()
+        return expected_counts(user_ids)
+
+    monkeypatch.setattr(ratings, 'expected_counts', racing_expected_counts)
+
+    assert reconcile_ratings().fixed >= 1
+    db.session.expire_all()
+    aggregate = db.session.get(UserRatingAggregate, participant_id)
+    assert (aggregate.rating_count, aggregate.rating_sum, aggregate.stars_5) == (1, 5, 1)
+
+
+def test_bulk_evaluation_query_budget(client):
+    """Évaluer 20 participants coûte un nombre fixe de requêtes, et un doublon est refusé sans rien écrire."""
+    activity = ActivityFactory(date=datetime.utcnow() - timedelta(days=1))
+    participants = [UserFactory() for _ in range(20)]
+    db.session.add_all([
+        Participation(activity_id=activity.id, user_id=p.id, status='validated') for p in participants
+    ])
+    db.session.commit()
+    activity_id, host_headers = activity.id, bearer_headers(activity.host)
+    participant_ids = [p.id for p in participants]
+
+    with assert_max_queries(6):
+        response = client.post(f'/api/activities/{activity_id}/evaluate', headers=host_headers, json={
+            'evaluations': [{'user_id': user_id, 'rating': 5} for user_id in participant_ids],
+        })
+    assert response.status_code == 201
+    assert len(response.get_json()['evaluations']) == 20
+    assert response.get_json()['evaluations'][0]['evaluated_pseudo'] is not None
+    assert {a.rating_sum for a in UserRatingAggregate.for_users(participant_ids).values()} == {5}
+
+    again = client.post(f'/api/activities/{activity_id}/evaluate', headers=host_headers, json={
+        'evaluations': [{'user_id': participant_ids[0], 'rating': 1}],
+    })
+    assert again.status_code == 409
+    assert Evaluation.query.filter_by(activity_id=activity_id).count() == 20
+    assert db.session.get(UserRatingAggregate, participant_ids[0]).rating_count == 1
@@ -2,6 +2,12 @@
 Tests pour l'API d'authentification.
 """
 import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
 
 
 def test_health_check(client):
@@ -104,3 +110,167 @@ def test_login_wrong_password(client):
     )
     
     assert response.status_code == 401
+
+
+def test_flag_change_revokes_old_access_token(client):
+    """Changer un flag porté par le token invalide l'ancien token."""
+    from flask_jwt_extended import create_access_token
+    from tests.factories import UserFactory
+
+    user = UserFactory(girls_only_mode=False)
+    old_headers = {'Authorization': f'Bearer {create_access_token(identity=user)}'}
+
+    response = client.patch('/api/users/profile', json={'girls_only_mode': True}, headers=old_headers)
+    assert response.status_code == 200
+    new_token = json.loads(response.data)['access_token']
+
+    revoked = client.get('/api/auth/me', headers=old_headers)
+    assert revoked.status_code == 401
+    assert json.loads(revoked.data)['code'] == 'token_revoked'
+
+    fresh = client.get('/api/auth/me', headers={'Authorization': f'Bearer {new_token}'})
+    assert fresh.status_code == 200
+
+
+def test_login_rehashes_password_with_new_settings(app, client):
+    """Un hash créé avec d'anciens paramètres est mis à jour au login."""
+    from app import db
+    from tests.factories import UserFactory
+
+    user = UserFactory(email='rehash@example.com', password='Secret123!')
+    assert user.password_hash.startswith('pbkdf2:sha256:1000$')
+
+    app.config['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:2000'
+    response = client.post('/api/auth/login', json={'email': 'rehash@example.com', 'password': 'Secret123!'})
+    assert response.status_code == 200
+
+    db.session.refresh(user)
+    assert user.password_hash.startswith('pbkdf2:sha256:2000$')
+    assert user.check_password('Secret123!')
+
+
+def test_slow_hash_is_busy_and_keeps_its_slot(app):
+    """Un hash trop lent donne PasswordHasherBusy (503), et sa place n'est libérée qu'à la fin du calcul."""
+    from app.utils.passwords import PasswordHasher, PasswordHasherBusy
+
+    app.config.update(PASSWORD_HASH_WORKERS=1, PASSWORD_HASH_TIMEOUT=0.01)
+    hasher = PasswordHasher()
+    pool = ThreadPoolExecutor(1)
+    hasher._pool, hasher._pool_pid, hasher._slots = pool, os.getpid(), threading.BoundedSemaphore(1)
+
+    with pytest.raises(PasswordHasherBusy):
+        hasher._run(time.sleep, 0.2)
+
+    # Still hashing - the only slot is taken
+    with pytest.raises(PasswordHasherBusy):
+        hasher._run(str, 'ok')
+
+    pool.shutdown(wait=True)  # the slow job finishes, its slot comes back
+    hasher._pool = ThreadPoolExecutor(1)
+    assert hasher._run(str, 'ok') == 'ok'
+    hasher._pool.shutdown()
+
+
+def test_refresh_rotation_detects_reuse(app, client):
+    """Un refresh token est à usage unique ; le rejouer révoque toute la session."""
+    from app.utils.revocation import issue_tokens
+    from tests.factories import UserFactory
+
+    app.config['JWT_REFRESH_REUSE_GRACE_SECONDS'] = 0
+    user = UserFactory()
+    _, refresh = issue_tokens(user)
+    old = {'Authorization': f'Bearer {refresh}'}
+
+    rotated = client.post('/api/auth/refresh', headers=old)
+    assert rotated.status_code == 200
+    new_refresh = json.loads(rotated.data)['refresh_token']
+
+    # Replaying the burnt token is rejected and kills the new pair as well
+    assert client.post('/api/auth/refresh', headers=old).status_code == 401
+    assert client.post('/api/auth/refresh', headers={'Authorization': f'Bearer {new_refresh}'}).status_code == 401
+
+
+def test_refresh_reuse_grace_window(app, client):
+    """Deux refresh concurrents avec le même token ne déconnectent pas l'utilisateur."""
+    from app.utils.revocation import issue_tokens
+    from tests.factories import UserFactory
+
+    app.config['JWT_REFRESH_REUSE_GRACE_SECONDS'] = 30
+    _, refresh = issue_tokens(UserFactory())
+    old = {'Authorization': f'Bearer {refresh}'}
+
+    first = client.post('/api/auth/refresh', headers=old)
+    second = client.post('/api/auth/refresh', headers=old)
+    assert first.status_code == 200 and second.status_code == 200
+
+    # Both new pairs are still good
+    for response in (first, second):
+        new_refresh = json.loads(response.data)['refresh_token']
+        assert client.post('/api/auth/refresh', headers={'Authorization': f'Bearer {new_refresh}'}).status_code == 200
+
+
+def test_refresh_rejects_inactive_user(client):
+    """Un compte désactivé ou supprimé ne peut plus rafraîchir ses tokens."""
+    from app import db
+    from app.utils.revocation import issue_tokens
+    from tests.factories import UserFactory
+
+    inactive = UserFactory()
+    _, refresh = issue_tokens(inactive)
+    inactive.is_active = False
+    db.session.commit()
+    assert client.post('/api/auth/refresh', headers={'Authorization': f'Bearer {refresh}'}).status_code == 401
+
+    deleted = UserFactory()
+    _, refresh = issue_tokens(deleted)
+    db.session.delete(deleted)
+    db.session.commit()
+    assert client.post('/api/auth/refresh', headers={'Authorization': f'Bearer {refresh}'}).status_code == 401
+
+
+def test_logout_revokes_tokens(client):
+    """Après logout, le token d'accès et le refresh token sont refusés."""
+    from app.utils.revocation import issue_tokens
+    from tests.factories import UserFactory
+
+    access, refresh = issue_tokens(UserFactory())
+    headers = {'Authorization': f'Bearer {access}'}
+
+    assert client.post('/api/auth/logout', headers=headers).status_code == 200
+    assert client.get('/api/auth/me', headers=headers).status_code == 401
+    assert client.post('/api/auth/refresh', headers={'Authorization': f'Bearer {refresh}'}).status_code == 401
+
+
+def test_logout_after_profile_update_revokes_session(client):
+    """Le token renvoyé après un changement de flag reste dans la session : logout révoque le refresh token."""
+    from app.utils.revocation import issue_tokens
+    from tests.factories import UserFactory
+
+    access, refresh = issue_tokens(UserFactory(girls_only_mode=False))
+
+    response = client.patch('/api/users/profile', json={'girls_only_mode': True},
+                            headers={'Authorization': f'Bearer {access}'})
+    assert response.status_code == 200
+    new_access = json.loads(response.data)['access_token']
+
+    assert client.post('/api/auth/logout', headers={'Authorization': f'Bearer {new_access}'}).status_code == 200
+    assert client.post('/api/auth/refresh', headers={'Authorization': f'Bearer {refresh}'}).status_code == 401
+
+
+def test_presence_is_written_behind(client):
+    """last_seen est bufferisé puis écrit en batch ; le statut en ligne ne touche pas la DB."""
+    from app import db
+    from app.utils.presence import presence
+    from tests.factories import UserFactory
+
+    user = UserFactory(email='presence@example.com', password='Secret123!', last_seen=None)
+    response = client.post('/api/auth/login', json={'email': 'presence@example.com', 'password': 'Secret123!'})
+    assert response.status_code == 200
+
+    db.session.refresh(user)
+    assert user.last_login is None and user.last_seen is None
+    assert presence.online_among([user.id, user.id + 1]) == {user.id}
+
+    assert presence.flush() == 1
+    db.session.refresh(user)
+    assert user.last_login is not None and user.last_seen is not None
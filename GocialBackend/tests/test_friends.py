@@ -0,0 +1,82 @@
+"""
+Tests pour l'API des amis.
+"""
+from app import db
+from app.models import Friendship, UserRecommendation
+from app.utils.friend_graph import FriendGraph, build_friend_suggestions
+from tests.conftest import bearer_headers
+from tests.factories import UserFactory
+
+
+def _befriend(a, b):
+    db.session.add(Friendship(user_id=a.id, friend_id=b.id, status='accepted'))
+    db.session.commit()
+
+
+def test_friend_graph_counts_mutual_friends():
+    """L'index d'adjacence compte les amis communs et ignore les amis directs."""
+    graph = FriendGraph([(1, 2), (1, 3), (2, 4), (3, 4), (4, 5)])
+
+    assert list(graph.friends_of(4)) == [2, 3, 5]
+    assert list(graph.friends_of(42)) == []
+    assert dict(graph.mutual_counts(1)) == {4: 2}
+
+
+def test_suggestions_skip_blocked_and_ghost_users(client):
+    """Les amis d'amis sont suggérés, sauf bloqués et mode fantôme."""
+    me, friend = UserFactory(), UserFactory()
+    suggested, blocked, ghost = UserFactory(), UserFactory(), UserFactory(is_ghost_mode=True)
+
+    _befriend(me, friend)
+    for other in (suggested, blocked, ghost):
+        _befriend(friend, other)
+    db.session.add(Friendship(user_id=blocked.id, friend_id=me.id, status='blocked'))
+    db.session.commit()
+
+    build_friend_suggestions()
+
+    data = client.get('/api/friends/suggestions', headers=bearer_headers(me)).get_json()
+    assert [s['user']['id'] for s in data['suggestions']] == [suggested.id]
+    assert data['suggestions'][0]['mutual_friends'] == 1
+
+
+def test_friendship_change_marks_suggestions_stale(client):
+    """Accepter une demande rend les suggestions concernées obsolètes."""
+    me, friend, newcomer = UserFactory(), UserFactory(), UserFactory()
+    _befriend(me, friend)
+    build_friend_suggestions()
+
+    request = Friendship(user_id=newcomer.id, friend_id=friend.id, status='pending')
+    db.session.add(request)
+    db.session.commit()
+
+    client.post(f'/api/friends/request/{request.id}/accept', headers=bearer_headers(friend))
+
+    stale = {r.user_id for r in UserRecommendation.query.filter_by(kind='friends', is_stale=True)}
+    assert {me.id, friend.id} <= stale
+
+    assert build_friend_suggestions(incremental=True) == len(stale | {newcomer.id})
+    assert UserRecommendation.ids_for(me.id, 'friends') == [newcomer.id]
+
+
+def test_batch_status_returns_status_and_mutual_friends(client):
+    """Le statut en lot renvoie statut et amis communs pour chaque utilisateur."""
+    me, friend, stranger, pending = UserFactory(), UserFactory(), UserFactory(), UserFactory()
+    _befriend(me, friend)
+    _befriend(stranger, friend)
+    db.session.add(Friendship(user_id=pending.id, friend_id=me.id, status='pending'))
+    db.session.commit()
+
+    response = client.post(
+        '/api/friends/status',
+        json={'user_ids': [friend.id, stranger.id, pending.id]},
+        headers=bearer_headers(me),
+    )
+    statuses = response.get_json()['statuses']
+
+    assert statuses[str(friend.id)]['status'] == 'friends'
+    assert statuses[str(stranger.id)] == {'status': 'none', 'friendship_id': None, 'mutual_friends': 1}
+    assert statuses[str(pending.id)]['status'] == 'pending_received'
+
+    too_many = client.post('/api/friends/status', json={'user_ids': list(range(101))}, headers=bearer_headers(me))
+    assert too_many.status_code == 400
@@ -0,0 +1,101 @@
+"""
+Tests pour la supervision (métriques, santé).
+"""
+from app.utils.health import health_checker
+from app.utils.metrics import metrics
+from tests.conftest import bearer_headers, use_upload_folder
+from tests.factories import ActivityFactory, UserFactory
+
+
+def test_metrics_endpoint(client):
+    """/metrics expose latences, codes HTTP, pool et files d'attente au format Prometheus."""
+    user = UserFactory()
+    ActivityFactory()
+    client.get('/api/activities/', headers=bearer_headers(user))
+    metrics.sample()
+
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+
+    body = response.get_data(as_text=True)
+    assert 'gocial_http_request_duration_seconds_bucket{blueprint="activities",endpoint="activities.get_activities"' in body
+    assert 'gocial_http_requests_total{blueprint="activities",endpoint="activities.get_activities",method="GET",status="200"}' in body
+    assert 'gocial_db_pool_checkouts_total' in body
+    assert 'gocial_worker_queue_depth{queue="views"}' in body
+    assert 'gocial_cache_requests_total{cache="jwt_flags",result="miss"}' in body
+
+
+def test_metrics_token(app, client):
+    """Avec METRICS_TOKEN, le scraper doit s'authentifier."""
+    app.config['METRICS_TOKEN'] = 'scrape-me'
+
+    assert client.get('/metrics').status_code == 401
+    assert client.get('/metrics', headers={'Authorization': 'Bearer scrape-me'}).status_code == 200
+
+
+def test_liveness(client):
+    """/health/live répond sans vérifier les dépendances."""
+    response = client.get('/health/live')
+    assert response.status_code == 200
+    assert response.get_json()['status'] == 'alive'
+
+
+def test_readiness_ok(app, client, tmp_path):
+    """/health/ready vérifie la base, le pool et le stockage."""
+    use_upload_folder(app, tmp_path)
+
+    response = client.get('/health/ready')
+    assert response.status_code == 200
+
+    data = response.get_json()
+    assert data['status'] == 'ready'
+    assert data['checks']['database']['ok'] is True
+    assert data['checks']['storage']['ok'] is True
+    assert data['checks']['redis']['configured'] is False
+
+
+def test_readiness_storage_not_writable(app, client, tmp_path):
+    """Stockage inaccessible : le pod n'est plus prêt (503)."""
+    blocker = tmp_path / 'not-a-dir'
+    blocker.write_text('x')
+    use_upload_folder(app, blocker)
+
+    response = client.get('/health/ready')
+    assert response.status_code == 503
+
+    data = response.get_json()
+    assert data['status'] == 'not_ready'
+    assert data['checks']['storage']['ok'] is False
+    assert data['checks']['database']['ok'] is True
+
+
+def test_readiness_draining(app, client, tmp_path):
+    """Pendant l'arrêt (SIGTERM ou fichier de drain), /health/ready répond 503."""
+    use_upload_folder(app, tmp_path)
+    drain_file = tmp_path / 'drain'
+    health_checker.drain_file = str(drain_file)
+
+    assert client.get('/health/ready').status_code == 200
+    drain_file.write_text('')
+    response = client.get('/health/ready')
+    assert response.status_code == 503
+    assert response.get_json()['status'] == 'draining'
+    drain_file.unlink()
+
+    health_checker.start_draining()
+    assert client.get('/health/ready').status_code == 503
+    # La liveness ne bouge pas : on ne veut pas de redémarrage
+    assert client.get('/health/live').status_code == 200
+    assert client.get('/health').get_json()['status'] == 'healthy'
+
+
+def test_readiness_cached(app, client, tmp_path):
+    """Le résultat est réutilisé pendant HEALTH_CACHE_SECONDS."""
+    use_upload_folder(app, tmp_path)
+    health_checker.cache_seconds = 60
+
+    assert client.get('/health/ready').status_code == 200
+    use_upload_folder(app, tmp_path / 'missing' / 'x')
+    (tmp_path / 'missing').write_text('x')
+    assert client.get('/health/ready').status_code == 200
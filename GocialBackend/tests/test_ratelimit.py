@@ -0,0 +1,70 @@
+"""
+Tests pour le rate limiting.
+"""
+from app.utils.ratelimit import MemoryBackend, limiter, parse_rate
+
+
+def test_parse_rate():
+    """Les limites textuelles sont converties en (requêtes, secondes)."""
+    assert parse_rate('100/hour') == (100, 3600)
+    assert parse_rate('5 per minute') == (5, 60)
+    assert parse_rate('10/30 seconds') == (10, 30)
+
+
+def test_memory_backend_allows_burst_then_blocks():
+    """Le bucket laisse passer la rafale puis bloque avec un Retry-After."""
+    backend = MemoryBackend()
+
+    results = [backend.hit('k', 3, 60) for _ in range(4)]
+
+    assert [r.allowed for r in results] == [True, True, True, False]
+    assert [r.remaining for r in results[:3]] == [2, 1, 0]
+    assert 0 < results[3].retry_after <= 20
+
+
+def test_login_is_rate_limited_per_ip(app, client):
+    """Le login renvoie 429 avec les en-têtes standards une fois la limite atteinte."""
+    app.config['RATELIMIT_ENABLED'] = True
+    app.config['RATELIMIT_DEFAULT'] = None
+    limiter.reset()
+
+    payload = {'email': 'nobody@example.com', 'password': 'Wrong123!'}
+    for _ in range(10):
+        response = client.post('/api/auth/login', json=payload)
+        assert response.status_code == 401
+    assert response.headers['X-RateLimit-Limit'] == '10'
+    assert response.headers['X-RateLimit-Remaining'] == '0'
+
+    blocked = client.post('/api/auth/login', json=payload)
+    assert blocked.status_code == 429
+    assert int(blocked.headers['Retry-After']) >= 1
+
+
+def test_default_limit_applies_to_all_routes(app, client):
+    """RATELIMIT_DEFAULT s'applique à toutes les routes sauf /health."""
+    app.config['RATELIMIT_ENABLED'] = True
+    app.config['RATELIMIT_DEFAULT'] = '2/minute'
+    limiter.reset()
+
+    assert client.get('/').status_code == 200
+    assert client.get('/').status_code == 200
+    assert client.get('/').status_code == 429
+    assert client.get('/health').status_code == 200
+
+
+def test_proxy_fix_uses_forwarded_client_ip(app, client):
+    """Derrière un proxy, la limite par IP porte sur l'IP du client (X-Forwarded-For)."""
+    from werkzeug.middleware.proxy_fix import ProxyFix
+    from app import _apply_proxy_fix
+
+    app.config['PROXY_FIX_HOPS'] = 1
+    _apply_proxy_fix(app)
+    assert isinstance(app.wsgi_app, ProxyFix)
+
+    app.config['RATELIMIT_ENABLED'] = True
+    app.config['RATELIMIT_DEFAULT'] = '1/minute'
+    limiter.reset()
+
+    assert client.get('/', headers={'X-Forwarded-For': '203.0.113.1'}).status_code == 200
+    assert client.get('/', headers={'X-Forwarded-For': '203.0.113.1'}).status_code == 429
+    assert client.get('/', headers={'X-Forwarded-For': '203.0.113.2'}).status_code == 200
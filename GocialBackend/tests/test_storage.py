@@ -0,0 +1,94 @@
+"""
+Tests pour le stockage S3 (bucket simulé avec moto, ignorés sans boto3/moto).
+"""
+import base64
+import json
+
+import pytest
+
+boto3 = pytest.importorskip('boto3')
+moto = pytest.importorskip('moto')
+
+from botocore.exceptions import ClientError  # noqa: E402
+
+from app.utils.storage import IMMUTABLE_CACHE_CONTROL, S3Storage  # noqa: E402
+from tests.conftest import bearer_headers  # noqa: E402
+from tests.factories import UserFactory  # noqa: E402
+
+
+BUCKET = 'gocial-test'
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    """S3Storage branché sur un bucket moto vide."""
+    for name in ('AWS_ACCESS_KEY_ID', 'AWS_SECRET_ACCESS_KEY', 'AWS_SESSION_TOKEN'):
+        monkeypatch.setenv(name, 'testing')
+
+    with moto.mock_aws():
+        boto3.client('s3', region_name='us-east-1').create_bucket(Bucket=BUCKET)
+        yield S3Storage(BUCKET, region='us-east-1', access_key='testing', secret_key='testing')
+
+
+def _local_file(tmp_path, data=b'image bytes'):
+    path = tmp_path / 'upload.webp'
+    path.write_bytes(data)
+    return path
+
+
+def test_put_file_and_open(s3, tmp_path):
+    """put_file envoie le fichier (type + cache immuable) et supprime la copie locale."""
+    path = _local_file(tmp_path)
+
+    assert s3.put_file(str(path), 'avatars/a.webp', content_type='image/webp') == 'avatars/a.webp'
+    assert not path.exists()
+
+    assert s3.open('avatars/a.webp').read() == b'image bytes'
+    head = s3._client.head_object(Bucket=BUCKET, Key='avatars/a.webp')
+    assert head['ContentType'] == 'image/webp'
+    assert head['CacheControl'] == IMMUTABLE_CACHE_CONTROL
+
+
+def test_exists_and_delete(s3, tmp_path):
+    """exists suit put_file / delete ; une clé absente n'est pas une erreur."""
+    assert s3.exists('avatars/missing.webp') is False
+
+    s3.put_file(str(_local_file(tmp_path)), 'avatars/b.webp')
+    assert s3.exists('avatars/b.webp') is True
+    assert [obj.key for obj in s3.iter_objects('avatars/')] == ['avatars/b.webp']
+
+    assert s3.delete('avatars/b.webp') is True
+    assert s3.exists('avatars/b.webp') is False
+
+
+def test_presign_upload_enforces_type_and_size(s3):
+    """Le POST présigné vise la clé demandée et impose type et taille côté bucket."""
+    upload = s3.presign_upload('activities/c.jpg', 'image/jpeg', 5 * 1024 * 1024)
+
+    assert upload['method'] == 'POST'
+    assert BUCKET in upload['url']
+    assert upload['fields']['key'] == 'activities/c.jpg'
+    assert upload['fields']['Content-Type'] == 'image/jpeg'
+
+    policy = json.loads(base64.b64decode(upload['fields']['policy']))
+    assert {'Content-Type': 'image/jpeg'} in policy['conditions']
+    assert ['content-length-range', 1, 5 * 1024 * 1024] in policy['conditions']
+
+
+def test_check_bucket(s3):
+    """check passe sur un bucket existant et lève sinon (sonde de readiness)."""
+    s3.check()
+
+    missing = S3Storage('no-such-bucket', region='us-east-1', access_key='testing', secret_key='testing')
+    with pytest.raises(ClientError):
+        missing.check()
+
+
+def test_resumable_sessions_refused_with_s3(app, client, s3):
+    """Avec S3, les sessions d'upload (disque local) sont refusées au profit de l'upload direct."""
+    app.extensions['storage'] = s3
+    response = client.post('/api/uploads/', json={'purpose': 'avatar', 'size': 10},
+                           headers=bearer_headers(UserFactory()))
+
+    assert response.status_code == 409
+    assert response.get_json()['code'] == 'direct_upload_required'
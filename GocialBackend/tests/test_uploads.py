@@ -0,0 +1,268 @@
+"""
+Tests pour les uploads (streaming, reprise après coupure).
+"""
+import io
+import os
+import time
+
+from PIL import Image
+
+from tests.conftest import bearer_headers, use_upload_folder
+from tests.factories import UserFactory
+
+
+def _png():
+    buffer = io.BytesIO()
+    Image.new('RGB', (300, 200), 'blue').save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def test_oversized_upload_rejected_before_reading(app, client, tmp_path):
+    """Un Content-Length trop grand est refusé sans lire le corps."""
+    use_upload_folder(app, tmp_path)
+    app.config['MAX_CONTENT_LENGTH'] = 1024
+    user = UserFactory()
+
+    response = client.post(
+        '/api/users/profile/avatar',
+        data={'file': (io.BytesIO(b'\x89PNG\r\n\x1a\n' + b'0' * 4096), 'big.png')},
+        headers=bearer_headers(user),
+        content_type='multipart/form-data',
+    )
+    assert response.status_code == 413
+    assert response.get_json()['code'] == 'upload_too_large'
+    assert not os.path.exists(tmp_path / '.tmp') or not os.listdir(tmp_path / '.tmp')
+
+
+def test_resumable_avatar_upload(app, client, tmp_path):
+    """Upload en morceaux, reprise au bon décalage, puis finalisation."""
+    use_upload_folder(app, tmp_path)
+    user = UserFactory()
+    data = _png()
+    half = len(data) // 2
+
+    created = client.post('/api/uploads/', json={'purpose': 'avatar', 'size': len(data)}, headers=bearer_headers(user))
+    assert created.status_code == 201
+    upload_id = created.get_json()['upload_id']
+
+    first = client.patch(
+        f'/api/uploads/{upload_id}', data=data[:half],
+        headers=bearer_headers(user, **{'Upload-Offset': '0'}),
+    )
+    assert first.get_json()['offset'] == half
+
+    # Client lost the response and resends the first chunk
+    retry = client.patch(
+        f'/api/uploads/{upload_id}', data=data[:half],
+        headers=bearer_headers(user, **{'Upload-Offset': '0'}),
+    )
+    assert retry.status_code == 409
+    assert retry.headers['Upload-Offset'] == str(half)
+
+    # Too early to finish
+    assert client.post(f'/api/uploads/{upload_id}/complete', headers=bearer_headers(user)).status_code == 409
+
+    client.patch(
+        f'/api/uploads/{upload_id}', data=data[half:],
+        headers=bearer_headers(user, **{'Upload-Offset': str(half)}),
+    )
+    assert client.get(f'/api/uploads/{upload_id}', headers=bearer_headers(user)).get_json()['offset'] == len(data)
+
+    done = client.post(f'/api/uploads/{upload_id}/complete', headers=bearer_headers(user))
+    assert done.status_code == 200
+    variants = done.get_json()['avatar_variants']
+    assert os.path.exists(tmp_path / 'avatars' / os.path.basename(variants['card']))
+
+    # Session is gone, and so are the temp files
+    assert client.get(f'/api/uploads/{upload_id}', headers=bearer_headers(user)).status_code == 404
+    assert not [name for _, _, files in os.walk(tmp_path / '.tmp') for name in files]
+
+
+def test_concurrent_complete_conflicts(app, client, tmp_path, monkeypatch):
+    """Deux /complete simultanés : le second reçoit un 409, pas une erreur 500."""
+    from app.routes import uploads as upload_routes
+    from app.utils.uploads import UploadSession
+
+    use_upload_folder(app, tmp_path)
+    user = UserFactory()
+    data = _png()
+
+    upload_id = client.post(
+        '/api/uploads/', json={'purpose': 'avatar', 'size': len(data)}, headers=bearer_headers(user),
+    ).get_json()['upload_id']
+    client.patch(f'/api/uploads/{upload_id}', data=data, headers=bearer_headers(user, **{'Upload-Offset': '0'}))
+
+    # The other request loaded the session too, then won the race
+    loser = UploadSession.load(upload_id)
+    UploadSession.load(upload_id).finish().discard()
+    monkeypatch.setattr(upload_routes.UploadSession, 'load', classmethod(lambda cls, _: loser))
+
+    response = client.post(f'/api/uploads/{upload_id}/complete', headers=bearer_headers(user))
+    assert response.status_code == 409
+
+
+def test_upload_activity_id_must_be_an_integer(app, client, tmp_path):
+    """Un activity_id non numérique est une requête invalide (400), pas une erreur serveur."""
+    use_upload_folder(app, tmp_path)
+    user = UserFactory()
+
+    for activity_id in ('abc', None, [1]):
+        response = client.post(
+            '/api/uploads/', json={'purpose': 'activity', 'size': 10, 'activity_id': activity_id},
+            headers=bearer_headers(user),
+        )
+        assert response.status_code == 400
+
+
+def test_upload_session_is_private(app, client, tmp_path):
+    """On ne peut pas écrire dans la session d'un autre utilisateur."""
+    use_upload_folder(app, tmp_path)
+    owner, other = UserFactory(), UserFactory()
+
+    created = client.post('/api/uploads/', json={'purpose': 'avatar', 'size': 10}, headers=bearer_headers(owner))
+    upload_id = created.get_json()['upload_id']
+
+    response = client.patch(
+        f'/api/uploads/{upload_id}', data=b'0123456789',
+        headers=bearer_headers(other, **{'Upload-Offset': '0'}),
+    )
+    assert response.status_code == 404
+
+
+def test_direct_upload_to_storage(app, client, tmp_path):
+    """Upload direct vers le stockage (URL signée), puis finalisation."""
+    use_upload_folder(app, tmp_path)
+    user = UserFactory()
+    data = _png()
+
+    created = client.post(
+        '/api/uploads/direct',
+        json={'purpose': 'avatar', 'size': len(data), 'content_type': 'image/png'},
+        headers=bearer_headers(user),
+    )
+    assert created.status_code == 201
+    payload = created.get_json()
+    upload = payload['upload']
+
+    # Not sent yet
+    early = client.post('/api/uploads/direct/complete', json={'upload_token': payload['upload_token']}, headers=bearer_headers(user))
+    assert early.status_code == 409
+
+    # Signed URL - no JWT needed, a tampered one is refused
+    assert client.put(upload['url'] + 'x', data=data, headers=upload['headers']).status_code == 403
+    assert client.put(upload['url'], data=data, headers=upload['headers']).status_code == 204
+
+    done = client.post('/api/uploads/direct/complete', json={'upload_token': payload['upload_token']}, headers=bearer_headers(user))
+    assert done.status_code == 200
+    assert os.path.exists(tmp_path / 'avatars' / os.path.basename(done.get_json()['avatar_variants']['thumb']))
+
+    # The incoming copy is gone
+    assert not os.listdir(tmp_path / 'incoming' / str(user.id))
+
+
+def test_cdn_url_for_uploads(app, client, tmp_path):
+    """Avec CDN_URL, les URLs publiques pointent vers le CDN."""
+    from app.utils.storage import init_storage
+
+    app.config.update(UPLOAD_FOLDER=str(tmp_path), CDN_URL='https://cdn.example.com')
+    init_storage(app)
+    user = UserFactory()
+
+    response = client.post(
+        '/api/users/profile/avatar',
+        data={'file': (io.BytesIO(_png()), 'me.png')},
+        headers=bearer_headers(user),
+        content_type='multipart/form-data',
+    )
+    assert response.get_json()['avatar_url'].startswith('https://cdn.example.com/avatars/')
+
+
+def test_serving_uploads_with_cache_headers(app, client, tmp_path):
+    """Fichiers servis avec cache immuable, ETag, 304 et Range."""
+    use_upload_folder(app, tmp_path)
+    user = UserFactory()
+
+    avatar_url = client.post(
+        '/api/users/profile/avatar',
+        data={'file': (io.BytesIO(_png()), 'me.png')},
+        headers=bearer_headers(user),
+        content_type='multipart/form-data',
+    ).get_json()['avatar_url']
+
+    response = client.get(avatar_url)
+    assert response.status_code == 200
+    assert response.mimetype == 'image/webp'
+    assert 'immutable' in response.headers['Cache-Control']
+    etag = response.headers['ETag']
+
+    assert client.get(avatar_url, headers={'If-None-Match': etag}).status_code == 304
+
+    partial = client.get(avatar_url, headers={'Range': 'bytes=0-9'})
+    assert partial.status_code == 206
+    assert len(partial.data) == 10
+
+    # Legacy names can still change - revalidate instead
+    (tmp_path / 'avatars' / 'legacy.jpg').write_bytes(b'\xff\xd8\xff' + b'0' * 10)
+    assert 'immutable' not in client.get('/uploads/avatars/legacy.jpg').headers['Cache-Control']
+
+    # Nothing outside the public folders
+    assert client.get('/uploads/../config.py').status_code == 404
+    assert client.get('/uploads/.tmp/anything').status_code == 404
+
+
+def test_serving_uploads_through_nginx(app, client, tmp_path):
+    """Avec UPLOADS_ACCEL_REDIRECT, nginx envoie le fichier."""
+    use_upload_folder(app, tmp_path)
+    app.config['UPLOADS_ACCEL_REDIRECT'] = '/protected-uploads/'
+    os.makedirs(tmp_path / 'avatars', exist_ok=True)
+    (tmp_path / 'avatars' / 'legacy.jpg').write_bytes(b'\xff\xd8\xff')
+
+    response = client.get('/uploads/avatars/legacy.jpg')
+    assert response.headers['X-Accel-Redirect'] == '/protected-uploads/avatars/legacy.jpg'
+    assert response.mimetype == 'image/jpeg'
+    assert response.data == b''
+
+
+def test_gc_uploads_removes_only_old_orphans(app, runner, tmp_path):
+    """Le GC supprime les fichiers orphelins anciens, garde le reste."""
+    use_upload_folder(app, tmp_path)
+    avatars = tmp_path / 'avatars'
+    os.makedirs(avatars, exist_ok=True)
+
+    kept_hash, old_hash = 'a' * 32, 'b' * 32
+    UserFactory(avatar_url=f'https://old-cdn.example.com/avatars/{kept_hash}_full.webp')
+
+    for name in (f'{kept_hash}_thumb.webp', f'{kept_hash}_full.webp', f'{old_hash}_full.webp', 'fresh.jpg'):
+        (avatars / name).write_bytes(b'x' * 100)
+
+    two_days_ago = time.time() - 48 * 3600
+    for name in (f'{kept_hash}_thumb.webp', f'{kept_hash}_full.webp', f'{old_hash}_full.webp'):
+        os.utime(avatars / name, (two_days_ago, two_days_ago))
+
+    dry = runner.invoke(args=['gc-uploads', '--dry-run'])
+    assert 'Would delete 1 of 4 files' in dry.output
+    assert (avatars / f'{old_hash}_full.webp').exists()
+
+    result = runner.invoke(args=['gc-uploads'])
+    assert 'Deleted 1 of 4 files' in result.output
+    assert sorted(os.listdir(avatars)) == sorted([f'{kept_hash}_thumb.webp', f'{kept_hash}_full.webp', 'fresh.jpg'])
+
+
+def test_private_uploads_not_served_through_traversal(app, client, tmp_path):
+    """Les fichiers en attente (.tmp/, incoming/) restent privés, même via ../ ou ./."""
+    use_upload_folder(app, tmp_path)
+    for folder in ('.tmp/sessions', 'incoming', 'avatars'):
+        os.makedirs(tmp_path / folder, exist_ok=True)
+    (tmp_path / '.tmp' / 'sessions' / 'abc.part').write_bytes(b'secret')
+    (tmp_path / 'incoming' / 'abc').write_bytes(b'secret')
+
+    for url in (
+        '/uploads/avatars/../.tmp/sessions/abc.part',
+        '/uploads/avatars/%2e%2e/.tmp/sessions/abc.part',
+        '/uploads/./.tmp/sessions/abc.part',
+        '/uploads/avatars/../incoming/abc',
+        '/uploads/avatars/%2E%2E/incoming/abc',
+        '/uploads/.tmp',
+    ):
+        assert client.get(url).status_code == 404, url
+
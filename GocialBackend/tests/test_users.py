@@ -0,0 +1,84 @@
+"""
+Tests pour l'API des utilisateurs.
+"""
+import io
+import os
+
+from PIL import Image
+
+from app import db
+from app.models import UserRatingAggregate
+from app.utils.profiling import assert_max_queries
+from tests.conftest import bearer_headers, use_upload_folder
+from tests.factories import UserFactory
+
+
+def _jpeg(size=(2000, 1000)):
+    exif = Image.Exif()
+    exif[0x010F] = 'SecretCam'  # Make
+    buffer = io.BytesIO()
+    Image.new('RGB', size, 'red').save(buffer, 'JPEG', exif=exif)
+    return buffer.getvalue()
+
+
+def test_avatar_upload_generates_stripped_variants(app, client, tmp_path):
+    """L'avatar est décliné en variantes WebP sans EXIF, nommées par hash."""
+    use_upload_folder(app, tmp_path)
+    user = UserFactory()
+
+    response = client.post(
+        '/api/users/profile/avatar',
+        data={'file': (io.BytesIO(_jpeg()), 'me.jpg')},
+        headers=bearer_headers(user),
+        content_type='multipart/form-data',
+    )
+    assert response.status_code == 200
+    variants = response.get_json()['avatar_variants']
+
+    thumb_path = os.path.join(tmp_path, 'avatars', os.path.basename(variants['thumb']))
+    with Image.open(thumb_path) as thumb:
+        assert thumb.format == 'WEBP'
+        assert max(thumb.size) == 160
+        assert not thumb.getexif()
+
+    # Same picture again: same URL, nothing new on disk
+    files_before = sorted(os.listdir(tmp_path / 'avatars'))
+    again = client.post(
+        '/api/users/profile/avatar',
+        data={'file': (io.BytesIO(_jpeg()), 'again.jpg')},
+        headers=bearer_headers(user),
+        content_type='multipart/form-data',
+    )
+    assert again.get_json()['avatar_url'] == response.get_json()['avatar_url']
+    assert sorted(os.listdir(tmp_path / 'avatars')) == files_before
+
+
+def test_avatar_upload_checks_content_not_extension(app, client, tmp_path):
+    """Un fichier qui n'est pas une image est refusé même avec une extension .png."""
+    use_upload_folder(app, tmp_path)
+    user = UserFactory()
+
+    response = client.post(
+        '/api/users/profile/avatar',
+        data={'file': (io.BytesIO(b'<?php echo "hi"; ?>'), 'evil.png')},
+        headers=bearer_headers(user),
+        content_type='multipart/form-data',
+    )
+    assert response.status_code == 400
+
+
+def test_search_includes_ratings_without_extra_queries(client):
+    """Les notes arrivent avec les résultats de recherche, sans requête par utilisateur."""
+    viewer = UserFactory()
+    rated = [UserFactory(pseudo=f'noteur{n}') for n in range(5)]
+    for user in rated:
+        db.session.add(UserRatingAggregate(user_id=user.id, rating_count=2, rating_sum=9, stars_4=1, stars_5=1))
+    db.session.commit()
+    headers = bearer_headers(viewer)
+
+    with assert_max_queries(3):
+        response = client.get('/api/users/search?q=noteur', headers=headers)
+
+    users = response.get_json()['users']
+    assert len(users) == 5
+    assert {u['rating']['avg_rating'] for u in users} == {4.5}
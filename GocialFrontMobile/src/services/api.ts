@@ -87,8 +87,14 @@ api.interceptors.response.use(
           headers: { Authorization: `Bearer ${refreshToken}` },
         });
 
-        const { access_token } = response.data;
-        await AsyncStorage.setItem(STORAGE_KEYS.ACCESS_TOKEN, access_token);
+        // Refresh tokens are single use - keep the new one for next time
+        const { access_token, refresh_token } = response.data;
+        await Promise.all([
+          AsyncStorage.setItem(STORAGE_KEYS.ACCESS_TOKEN, access_token),
+          refresh_token
+            ? AsyncStorage.setItem(STORAGE_KEYS.REFRESH_TOKEN, refresh_token)
+            : Promise.resolve(),
+        ]);
 
         processQueue(null, access_token);
 
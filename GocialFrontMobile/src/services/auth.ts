@@ -1,4 +1,6 @@
+import AsyncStorage from '@react-native-async-storage/async-storage';
 import api from './api';
+import { STORAGE_KEYS } from '../config';
 import type { AuthResponse, LoginData, RegisterData, User } from '../types';
 
 export const authService = {
@@ -29,6 +31,14 @@ export const authService = {
       old_password: oldPassword,
       new_password: newPassword,
     });
+    // Every other session (old tokens included) is revoked - switch to the new pair
+    const { access_token, refresh_token } = response.data;
+    if (access_token && refresh_token) {
+      await Promise.all([
+        AsyncStorage.setItem(STORAGE_KEYS.ACCESS_TOKEN, access_token),
+        AsyncStorage.setItem(STORAGE_KEYS.REFRESH_TOKEN, refresh_token),
+      ]);
+    }
     return response.data;
   },
 